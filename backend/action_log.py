@@ -0,0 +1,177 @@
+# Append-only log of GameManager mutations, for crash recovery.
+#
+# Every commit appends one JSON line naming the GameManager method and its
+# arguments. Lines are buffered and fsynced in batches. Every
+# SNAPSHOT_EVERY records all games are written to a snapshot and a new log
+# segment starts; older files are then deleted. Recovery loads the newest
+# snapshot and replays the segments after it. Shuffles derive from each
+# game's logged seed and version, so a replay deals the same cards.
+#
+# Files in the log directory:
+#   snapshot-<n>.jsonl  every game, one per line, as of the start of segment n
+#   segment-<n>.log     records committed after that snapshot
+import asyncio
+import glob
+import json
+import logging
+import os
+import re
+import time
+
+from .cards.definitions import CardType
+from .game_store import dump_game, load_game
+from .models import Player
+
+FSYNC_EVERY = 256  # records buffered before an fsync
+FSYNC_INTERVAL = 0.05  # seconds an unsynced record may wait
+SNAPSHOT_EVERY = 50000  # records per segment
+
+logger = logging.getLogger(__name__)
+
+# GameManager attachments that react to commits; recovery replays without
+# them, so old moves don't start timers, bot moves or count twice
+HOOKS = ("log", "evictor", "engine", "bots", "metrics", "analytics")
+
+REPLAYABLE = {"create_game", "join_game", "draw_cards", "play_card", "resolve_round", "next_round",
+              "restore_game", "start_game", "begin_play", "begin_resolve", "pass_turn"}
+
+
+def _files(directory: str, kind: str):
+    # [(n, path)] for snapshot-<n>.jsonl or segment-<n>.log, oldest first
+    found = []
+    for path in glob.glob(os.path.join(directory, f"{kind}-*")):
+        match = re.search(r"-(\d+)\.(jsonl|log)$", path)
+        if match:
+            found.append((int(match.group(1)), path))
+    return sorted(found)
+
+
+class ActionLog:
+    def __init__(self, directory: str, games, snapshot_every: int = SNAPSHOT_EVERY,
+                 fsync_every: int = FSYNC_EVERY, fsync_interval: float = FSYNC_INTERVAL):
+        # `games` is the GameManager's store, read when taking snapshots
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.games = games
+        self.snapshot_every = snapshot_every
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.file = None
+        self.pending = 0
+        self.records = 0
+        self.last_sync = time.monotonic()
+        segments = _files(directory, "segment") + _files(directory, "snapshot")
+        self.segment = max((n for n, _ in segments), default=0)
+        # Start from a fresh snapshot of whatever was recovered
+        self.snapshot()
+
+    def append(self, record: tuple):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.pending += 1
+        self.records += 1
+        if self.pending >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+        if self.records >= self.snapshot_every:
+            self.snapshot()
+
+    def sync(self):
+        if self.pending:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+        self.last_sync = time.monotonic()
+
+    async def sync_forever(self):
+        # Bounds how long a record waits for its fsync when traffic is idle
+        while self.file is not None:
+            await asyncio.sleep(self.fsync_interval)
+            if self.file is not None:
+                self.sync()
+
+    def snapshot(self):
+        segment = self.segment + 1
+        path = os.path.join(self.directory, f"snapshot-{segment:08d}.jsonl")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            for code in self.games:
+                game = self.games.get(code)
+                if game is not None:
+                    f.write(dump_game(game) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+        self.segment = segment
+        self.records = 0
+        self.file = open(os.path.join(self.directory, f"segment-{segment:08d}.log"), "a", encoding="utf-8")
+        # Everything older is covered by the snapshot just written
+        for kind in ("snapshot", "segment"):
+            for n, old in _files(self.directory, kind):
+                if n < segment:
+                    os.remove(old)
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+def replay(manager, record):
+    # Calls go through the class, past any per-instance wrappers such as
+    # metrics.instrument and tracing.trace_methods
+    op, code, *args = record
+    if op not in REPLAYABLE:
+        raise ValueError(f"Unknown logged action: {op}")
+    methods = type(manager)
+    if op == "create_game":
+        host, counts, seed = args
+        counts = {CardType(name): n for name, n in counts.items()} if counts else None
+        methods.create_game(manager, code, Player(**host), counts, seed)
+    elif op == "restore_game":
+        # Reloaded from the eviction spill directory (eviction.py)
+        manager.games[code] = load_game(args[0])
+    elif op == "join_game":
+        methods.join_game(manager, code, Player(**args[0]))
+    else:
+        getattr(methods, op)(manager, code, *args)
+
+
+def recover(manager, directory: str) -> int:
+    # Rebuild manager.games from the newest snapshot plus the log after it.
+    # The manager's HOOKS are detached while replaying and put back after;
+    # a record that fails to replay is logged and skipped
+    hooks = {name: getattr(manager, name, None) for name in HOOKS}
+    for name in hooks:
+        setattr(manager, name, None)
+    try:
+        return _recover(manager, directory)
+    finally:
+        for name, hook in hooks.items():
+            setattr(manager, name, hook)
+
+
+def _recover(manager, directory: str) -> int:
+    snapshots = _files(directory, "snapshot")
+    start = 0
+    if snapshots:
+        start, path = snapshots[-1]
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                game = load_game(line)
+                manager.games[game.code] = game
+    for n, path in _files(directory, "segment"):
+        if n < start:
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn write at the tail of the last segment
+                try:
+                    replay(manager, record)
+                except Exception:
+                    logger.exception("Skipping log record that failed to replay: %.200s", line.rstrip())
+    return len(manager.games)
@@ -0,0 +1,444 @@
+# Analytics over finished games: columnar chunk files and running stats.
+#
+# Attached as GameManager.analytics, GameAnalytics notes every card played
+# (round, seat, card, target) while a game runs. When the game ends, the
+# whole record goes on a queue. Nothing else happens on the request path.
+# A writer thread takes records off the queue and folds them into an
+# Aggregate: games, draws and rounds, wins by seat counted from the crown
+# per table size, plays per card, and plays by the eventual winner. It also
+# buffers them as columns. Every CHUNK_GAMES games, or FLUSH_INTERVAL
+# seconds, it writes a chunk file, plus aggregate.json with the running
+# totals, so a restart picks those up without reading the chunks again.
+#
+# A chunk is one JSON header line, then each column as raw little-endian
+# values, one after another:
+#
+#   games  players, winner (seat from the crown at start_game, -1 if
+#          none), rounds, that crown, finished (unix time)
+#   plays  game (row in this chunk), round, seat and target (from that
+#          round's crown; target -1 if not a player), card code, priority,
+#          by_winner
+#
+# Writing needs only the standard library. Scanning the chunks needs numpy
+# and takes a few seconds for millions of games:
+#
+#   python -m backend.analytics $ANALYTICS_DIR
+#   python -m backend.analytics --bench 1000000   # synthetic chunks, timed scan
+import argparse
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from .cards.definitions import CARD_CODES, CARD_DEFS
+from shared.config import ANALYTICS_DIR, ANALYTICS_CHUNK_GAMES
+
+FORMAT = 1
+FLUSH_INTERVAL = 60.0  # seconds a finished game may wait for its chunk
+GAME_COLUMNS = (("players", "B"), ("winner", "b"), ("rounds", "H"), ("crown", "B"), ("finished", "d"))
+PLAY_COLUMNS = (("game", "I"), ("round", "H"), ("seat", "B"), ("target", "b"), ("card", "B"),
+                ("priority", "B"), ("by_winner", "B"))
+DTYPES = {"B": "<u1", "b": "<i1", "H": "<u2", "I": "<u4", "d": "<f8"}
+PRIORITY = [d.priority for d in CARD_DEFS]
+MAX_SEATS = 8  # seat counters per table size
+
+logger = logging.getLogger(__name__)
+
+
+class Aggregate:
+    # Running totals; add() takes one finished-game record, merge() another
+    # Aggregate's totals
+    def __init__(self):
+        self.games = 0
+        self.draws = 0
+        self.rounds = 0
+        self.max_rounds = 0
+        self.plays = 0
+        # Per table size: games, and wins by seat counted from the crown
+        self.table_games: Dict[int, int] = {}
+        self.seat_wins: Dict[int, List[int]] = {}
+        self.card_plays = [0] * len(CARD_DEFS)
+        self.winner_card_plays = [0] * len(CARD_DEFS)
+        self.lock = threading.Lock()
+
+    def add(self, record: dict):
+        players, winner = record["players"], record["winner"]
+        with self.lock:
+            self.games += 1
+            self.rounds += record["rounds"]
+            self.max_rounds = max(self.max_rounds, record["rounds"])
+            self.table_games[players] = self.table_games.get(players, 0) + 1
+            wins = self.seat_wins.setdefault(players, [0] * MAX_SEATS)
+            if winner < 0:
+                self.draws += 1
+            else:
+                wins[winner] += 1
+            for _, _, _, card, by_winner in record["plays"]:
+                self.card_plays[card] += 1
+                self.winner_card_plays[card] += by_winner
+            self.plays += len(record["plays"])
+
+    def merge(self, other: dict):
+        # `other` as returned by totals()
+        with self.lock:
+            for key in ("games", "draws", "rounds", "plays"):
+                setattr(self, key, getattr(self, key) + other[key])
+            self.max_rounds = max(self.max_rounds, other["max_rounds"])
+            for players, games in other["table_games"].items():
+                players = int(players)
+                self.table_games[players] = self.table_games.get(players, 0) + games
+                wins = self.seat_wins.setdefault(players, [0] * MAX_SEATS)
+                for seat, count in enumerate(other["seat_wins"][str(players)]):
+                    wins[seat] += count
+            for i, count in enumerate(other["card_plays"]):
+                self.card_plays[i] += count
+            for i, count in enumerate(other["winner_card_plays"]):
+                self.winner_card_plays[i] += count
+
+    def totals(self) -> dict:
+        # Plain counters, as saved in aggregate.json
+        with self.lock:
+            return {
+                "games": self.games, "draws": self.draws, "rounds": self.rounds,
+                "max_rounds": self.max_rounds, "plays": self.plays,
+                "table_games": {str(k): v for k, v in self.table_games.items()},
+                "seat_wins": {str(k): list(v) for k, v in self.seat_wins.items()},
+                "card_plays": list(self.card_plays),
+                "winner_card_plays": list(self.winner_card_plays),
+            }
+
+    def summary(self) -> dict:
+        totals = self.totals()
+        games = totals["games"] or 1
+        return {
+            "games": totals["games"],
+            "draw_rate": totals["draws"] / games,
+            "rounds": {"mean": totals["rounds"] / games, "max": totals["max_rounds"]},
+            # Win rate by seat, clockwise from whoever held the crown at the start
+            "seat_win_rate": {
+                players: [wins / totals["table_games"][players] for wins in seat_wins[:int(players)]]
+                for players, seat_wins in sorted(totals["seat_wins"].items(), key=lambda item: int(item[0]))
+            },
+            # winner_share: fraction of a card's plays made by the eventual
+            # winner, as in simulation.py
+            "cards": {
+                d.type.value: {
+                    "plays": totals["card_plays"][i],
+                    "share": totals["card_plays"][i] / (totals["plays"] or 1),
+                    "winner_share": totals["winner_card_plays"][i] / (totals["card_plays"][i] or 1),
+                }
+                for i, d in enumerate(CARD_DEFS)
+            },
+        }
+
+
+def _chunks(directory: str):
+    # [(n, path)] for chunk-<n>.syfa, oldest first
+    found = []
+    for path in glob.glob(os.path.join(directory, "chunk-*.syfa")):
+        match = re.search(r"chunk-(\d+)\.syfa$", path)
+        if match:
+            found.append((int(match.group(1)), path))
+    return sorted(found)
+
+
+def write_chunk(path: str, games: Dict[str, object], plays: Dict[str, object]):
+    # Columns are array.array or numpy arrays of the types in GAME_COLUMNS
+    # and PLAY_COLUMNS; written to a temporary file and renamed into place
+    columns = [(name, code, games[name]) for name, code in GAME_COLUMNS] + \
+              [(name, code, plays[name]) for name, code in PLAY_COLUMNS]
+    header = {
+        "format": FORMAT,
+        "games": len(games["players"]),
+        "plays": len(plays["game"]),
+        "columns": [[name, code] for name, code, _ in columns],
+    }
+    with open(path + ".tmp", "wb") as f:
+        f.write(json.dumps(header).encode() + b"\n")
+        for _, _, values in columns:
+            if isinstance(values, array) and sys.byteorder != "little":
+                values = array(values.typecode, values)
+                values.byteswap()
+            f.write(values.tobytes())
+    os.replace(path + ".tmp", path)
+
+
+def read_chunk(path: str) -> dict:
+    # {column name: numpy array}
+    import numpy as np
+
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+        data = f.read()
+    if header["format"] != FORMAT:
+        raise ValueError(f"Unsupported analytics chunk format {header['format']}")
+    columns, offset = {}, 0
+    for name, code in header["columns"]:
+        count = header["games"] if name in dict(GAME_COLUMNS) else header["plays"]
+        dtype = np.dtype(DTYPES[code])
+        columns[name] = np.frombuffer(data, dtype, count, offset)
+        offset += count * dtype.itemsize
+    return columns
+
+
+def scan(directory: str) -> Aggregate:
+    # Totals over every chunk in the directory, computed column-wise
+    import numpy as np
+
+    total = Aggregate()
+    cards = len(CARD_DEFS)
+    for _, path in _chunks(directory):
+        c = read_chunk(path)
+        players, winner, rounds = c["players"].astype(np.int64), c["winner"], c["rounds"]
+        won = winner >= 0
+        table_games = np.bincount(players, minlength=MAX_SEATS + 1)
+        seat_wins = np.bincount(players[won] * MAX_SEATS + winner[won], minlength=(MAX_SEATS + 1) * MAX_SEATS)
+        seat_wins = seat_wins.reshape(MAX_SEATS + 1, MAX_SEATS)
+        by_winner = c["by_winner"].astype(bool)
+        total.merge({
+            "games": len(players),
+            "draws": int((~won).sum()),
+            "rounds": int(rounds.sum(dtype=np.int64)),
+            "max_rounds": int(rounds.max(initial=0)),
+            "plays": len(c["card"]),
+            "table_games": {str(n): int(table_games[n]) for n in np.flatnonzero(table_games)},
+            "seat_wins": {str(n): seat_wins[n].tolist() for n in np.flatnonzero(table_games)},
+            "card_plays": np.bincount(c["card"], minlength=cards).tolist(),
+            "winner_card_plays": np.bincount(c["card"][by_winner], minlength=cards).tolist(),
+        })
+    return total
+
+
+class ChunkWriter(threading.Thread):
+    # Background thread: records in, aggregate updated, chunks out
+    def __init__(self, records: "queue.SimpleQueue", aggregate: Aggregate, directory: Optional[str],
+                 chunk_games: int, flush_interval: float = FLUSH_INTERVAL):
+        super().__init__(name="analytics-writer", daemon=True)
+        self.records = records
+        self.aggregate = aggregate
+        self.directory = directory
+        self.chunk_games = chunk_games
+        self.flush_interval = flush_interval
+        self.chunk = max((n for n, _ in _chunks(directory)), default=0) if directory else 0
+        self.written = 0  # games in chunk files, this process
+        self._reset()
+
+    def _reset(self):
+        self.games = {name: array(code) for name, code in GAME_COLUMNS}
+        self.plays = {name: array(code) for name, code in PLAY_COLUMNS}
+        self.since = time.monotonic()
+
+    def run(self):
+        while True:
+            timeout = max(self.since + self.flush_interval - time.monotonic(), 0.001)
+            try:
+                record = self.records.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+            if record is not None and record is not STOP:
+                try:
+                    self.add(record)
+                except Exception:
+                    logger.exception("Dropping analytics record for game %s", record.get("code"))
+            buffered = len(self.games["players"])
+            if buffered and (record is STOP or buffered >= self.chunk_games
+                             or time.monotonic() - self.since >= self.flush_interval):
+                self.flush()
+            elif not buffered:
+                self.since = time.monotonic()
+            if record is STOP:
+                return
+
+    def add(self, record: dict):
+        self.aggregate.add(record)
+        if not self.directory:
+            return
+        row = len(self.games["players"])
+        for name, _ in GAME_COLUMNS:
+            self.games[name].append(record[name])
+        plays = self.plays
+        for round_no, seat, target, card, by_winner in record["plays"]:
+            plays["game"].append(row)
+            plays["round"].append(round_no)
+            plays["seat"].append(seat)
+            plays["target"].append(target)
+            plays["card"].append(card)
+            plays["priority"].append(PRIORITY[card])
+            plays["by_winner"].append(by_winner)
+
+    def flush(self):
+        self.chunk += 1
+        try:
+            write_chunk(os.path.join(self.directory, f"chunk-{self.chunk:08d}.syfa"), self.games, self.plays)
+            self.written += len(self.games["players"])
+            path = os.path.join(self.directory, "aggregate.json")
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.aggregate.totals(), f)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            logger.exception("Could not write analytics chunk %d", self.chunk)
+        self._reset()
+
+
+STOP = object()
+
+
+class RunningGame:
+    # What analytics keeps for a game between start_game and its end
+    __slots__ = ("crown", "plays")
+
+    def __init__(self, crown: int):
+        self.crown = crown  # crown_index at start_game; the winner's seat counts from it
+        self.plays: list = []
+
+
+def rounds_played(game) -> int:
+    # resolve_round and next_round both bump game.round, so it starts at 1
+    # and gains two per round; this is the round in progress (or the last
+    # one, once the game has ended)
+    return (game.round + 1) // 2
+
+
+class GameAnalytics:
+    # Attached as GameManager.analytics and told about every commit
+    def __init__(self, directory: Optional[str] = ANALYTICS_DIR, chunk_games: int = ANALYTICS_CHUNK_GAMES,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.directory = directory
+        self.playing: Dict[str, RunningGame] = {}
+        self.aggregate = Aggregate()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, "aggregate.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    self.aggregate.merge(json.load(f))
+        self.chunk_games = chunk_games
+        self.flush_interval = flush_interval
+        # Records wait here until start() runs the writer
+        self.records: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.writer = None
+        self.finished = 0
+
+    def start(self):
+        if self.writer is None or not self.writer.is_alive():
+            self.writer = ChunkWriter(self.records, self.aggregate, self.directory, self.chunk_games,
+                                      self.flush_interval)
+            self.writer.start()
+
+    def committed(self, game, record: tuple):
+        op = record[0]
+        if op == "start_game":
+            self.playing[game.code] = RunningGame(game.crown_index)
+            return
+        running = self.playing.get(game.code)
+        if running is None:
+            if game.phase == "setup":
+                return
+            # A game this process didn't see start: rebuilt by recover() or
+            # restored from a spill file. create_game puts the crown on seat
+            # 0 and start_game leaves it there; plays made before are lost.
+            running = self.playing[game.code] = RunningGame(0)
+        if op == "play_card":
+            _, _, player_id, _, target_id = record
+            card = game.played_cards[player_id][-1]["card"]
+            n, crown = len(game.players), game.crown_index
+            target = game.seat(target_id)
+            running.plays.append((rounds_played(game), (game.seat(player_id) - crown) % n,
+                                  -1 if target is None else (target - crown) % n,
+                                  CARD_CODES[card.type], game.seat(player_id)))
+        if game.phase == "end":
+            self.finish(game, self.playing.pop(game.code))
+
+    def finish(self, game, running: "RunningGame"):
+        n, crown, plays = len(game.players), running.crown, running.plays
+        winner = next((seat for seat, p in enumerate(game.players) if p.username == game.winner), None)
+        self.records.put({
+            "code": game.code,
+            "players": n,
+            "winner": -1 if winner is None else (winner - crown) % n,
+            "rounds": rounds_played(game),
+            "crown": crown,
+            "finished": time.time(),
+            # The last field becomes by_winner: was the player's raw seat the winner's
+            "plays": [(r, seat, target, card, int(raw == winner)) for r, seat, target, card, raw in plays],
+        })
+        self.finished += 1
+
+    def forget(self, code: str):
+        self.playing.pop(code, None)
+
+    def close(self):
+        # Writes out whatever is buffered
+        if self.writer is not None and self.writer.is_alive():
+            self.records.put(STOP)
+            self.writer.join()
+
+
+def bench(games: int, directory: str, chunk_games: int, seed: int = 0) -> dict:
+    # Synthetic chunks of `games` random games, then a timed scan()
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    written, chunk = 0, 0
+    while written < games:
+        count = min(chunk_games, games - written)
+        players = rng.integers(2, 6, count).astype(np.uint8)
+        per_game = rng.integers(20, 80, count)
+        game_index = np.repeat(np.arange(count, dtype=np.uint32), per_game)
+        plays = len(game_index)
+        winner = (rng.integers(0, 1 << 16, count) % players).astype(np.int8)
+        chunk += 1
+        write_chunk(os.path.join(directory, f"chunk-{chunk:08d}.syfa"), {
+            "players": players,
+            "winner": winner,
+            "rounds": rng.integers(1, 40, count).astype(np.uint16),
+            "crown": np.zeros(count, np.uint8),
+            "finished": np.full(count, time.time()),
+        }, {
+            "game": game_index,
+            "round": rng.integers(1, 40, plays).astype(np.uint16),
+            "seat": (rng.integers(0, 1 << 16, plays) % players[game_index]).astype(np.uint8),
+            "target": rng.integers(0, 4, plays).astype(np.int8),
+            "card": rng.integers(0, len(CARD_DEFS), plays).astype(np.uint8),
+            "priority": np.zeros(plays, np.uint8),
+            "by_winner": rng.integers(0, 2, plays).astype(np.uint8),
+        })
+        written += count
+    generated = time.perf_counter() - started
+    started = time.perf_counter()
+    total = scan(directory)
+    scanned = time.perf_counter() - started
+    return {"games": total.games, "plays": total.plays, "generate_s": round(generated, 2),
+            "scan_s": round(scanned, 3), "games_per_sec": round(total.games / scanned)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan finished-game analytics chunks")
+    parser.add_argument("directory", nargs="?", default=ANALYTICS_DIR)
+    parser.add_argument("--bench", type=int, default=0, help="write this many synthetic games and time a scan")
+    parser.add_argument("--chunk-games", type=int, default=ANALYTICS_CHUNK_GAMES)
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        with tempfile.TemporaryDirectory() as directory:
+            print(json.dumps(bench(args.bench, directory, args.chunk_games)))
+        return
+    if not args.directory:
+        parser.error("no directory given and ANALYTICS_DIR is unset")
+    started = time.perf_counter()
+    summary = scan(args.directory).summary()
+    summary["scan_s"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
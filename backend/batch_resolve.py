@@ -0,0 +1,357 @@
+# Vectorized round resolution for batches of games, for deck-tuning sweeps.
+#
+# A batch of N games with P seats each is a set of (N, P) NumPy arrays, and
+# one round's plays are (N, A) arrays of card codes, player seats and target
+# seats. resolve_batch applies them in the same order and with the same
+# effects as GameManager.resolve_round + apply_card_effect, one action slot
+# at a time for all N games. Each card code gets a kernel compiled from its
+# CardDef, like cards/effects.py does for single games. Hands are tracked as
+# counts only.
+#
+# Needs numpy (pip install numpy); the web app never imports this module.
+#
+#   python -m backend.batch_resolve --check 2000 --bench 1000000
+import argparse
+import random
+import time
+
+import numpy as np
+
+from .cards.definitions import CARD_CODES, CARD_DEFS
+from shared.config import MAX_LIVES
+
+PRIORITY = np.array([d.priority for d in CARD_DEFS], dtype=np.int32)
+NO_ACTION = -1  # padding in the action arrays
+
+
+class BatchState:
+    # One row per game, one column per seat
+    FLAGS = ("snakebit", "entranced")  # player flags a status card can set
+
+    def __init__(self, games: int, players: int):
+        self.health = np.full((games, players), MAX_LIVES, dtype=np.int16)
+        self.shield = np.zeros((games, players), dtype=np.int16)
+        self.snakebit = np.zeros((games, players), dtype=bool)
+        self.entranced = np.zeros((games, players), dtype=bool)
+        self.eliminated = np.zeros((games, players), dtype=bool)
+        self.hand = np.zeros((games, players), dtype=np.int16)
+        self.deck = np.zeros(games, dtype=np.int16)
+        self.discard = np.zeros(games, dtype=np.int16)
+        self.crown = np.zeros(games, dtype=np.int16)
+        self.winner = np.full(games, -1, dtype=np.int16)  # seat, -1 while running
+
+    @classmethod
+    def from_games(cls, games):
+        # Batch up GameStates that are in their resolve phase
+        state = cls(len(games), len(games[0].players))
+        for i, game in enumerate(games):
+            for seat, p in enumerate(game.players):
+                state.health[i, seat] = p.health
+                state.shield[i, seat] = p.shield
+                state.snakebit[i, seat] = p.snakebit
+                state.entranced[i, seat] = p.entranced
+                state.eliminated[i, seat] = p.eliminated
+                state.hand[i, seat] = len(p.hand)
+            state.deck[i] = len(game.deck)
+            state.discard[i] = len(game.discard)
+            state.crown[i] = game.crown_index
+        return state
+
+
+def actions_from_games(games):
+    # (cards, players, targets), in played_cards order like resolve_round
+    width = max(sum(len(plays) for plays in g.played_cards.values()) for g in games) or 1
+    shape = (len(games), width)
+    cards = np.full(shape, NO_ACTION, dtype=np.int16)
+    players = np.zeros(shape, dtype=np.int16)
+    targets = np.zeros(shape, dtype=np.int16)
+    for i, game in enumerate(games):
+        k = 0
+        for pid, plays in game.played_cards.items():
+            for play in plays:
+                cards[i, k] = CARD_CODES[play["card"].type]
+                players[i, k] = game.seat(pid)
+                targets[i, k] = game.seat(play["target_id"])
+                k += 1
+    return cards, players, targets
+
+
+def sort_actions(state, cards, players, targets):
+    # Priority first, then seat order from the crown. The sort is stable, so
+    # ties keep their played order exactly like the scalar sort.
+    n_players = state.health.shape[1]
+    seat_order = (players - state.crown[:, None]) % n_players
+    key = PRIORITY[cards] * n_players + seat_order
+    key[cards == NO_ACTION] = np.iinfo(np.int32).max
+    order = np.argsort(key, axis=1, kind="stable")
+    return (
+        np.take_along_axis(cards, order, axis=1),
+        np.take_along_axis(players, order, axis=1),
+        np.take_along_axis(targets, order, axis=1),
+    )
+
+
+def resolve_batch(state: BatchState, cards, players, targets):
+    # Resolve one round for every game in place
+    cards, players, targets = sort_actions(state, cards, players, targets)
+    n_games, n_players = state.health.shape
+    rows = np.arange(n_games)
+    for k in range(cards.shape[1]):
+        card = cards[:, k]
+        live = (card != NO_ACTION) & (state.winner < 0)
+        if not live.any():
+            break
+        target = targets[:, k]
+        # Effects on eliminated targets fizzle, but the card is still discarded
+        act = live & ~state.eliminated[rows, target]
+        for code, effect in enumerate(BATCH_EFFECTS):
+            m = act & (card == code)
+            if m.any():
+                effect(state, target, m, rows, n_players)
+
+        state.discard[live] += 1
+        state.eliminated[live] |= state.health[live] <= 0
+        alive = ~state.eliminated
+        won = live & (alive.sum(axis=1) == 1)
+        state.winner[won] = alive[won].argmax(axis=1)
+
+
+# Card effects on the arrays, one kernel per effect kind in cards/effects.py.
+# Each turns a CardDef into effect(state, target, m, rows, n_players), which
+# applies the card to the target seat of every game where the mask m is set.
+
+def _strike(card):
+    damage, shield_only = card.damage, card.shield_only
+
+    def effect(state, target, m, rows, n_players):
+        health, shield = state.health, state.shield
+        blocked = m & (shield[rows, target] > 0)
+        shield[rows[blocked], target[blocked]] -= 1
+        hit = blocked if shield_only else m & ~blocked
+        health[rows[hit], target[hit]] -= damage
+    return effect
+
+
+def _burn(card):
+    damage, bounce = card.damage, card.bounce
+
+    def effect(state, target, m, rows, n_players):
+        health, eliminated = state.health, state.eliminated
+        r, t = rows[m], target[m]
+        health[r, t] -= damage
+        dead = health[r, t] <= 0
+        eliminated[r[dead], t[dead]] = True
+        if not bounce:
+            return
+        # Bounce to the next player clockwise who isn't eliminated
+        rb, tb = r[~dead], t[~dead]
+        candidates = (tb[:, None] + np.arange(1, n_players)) % n_players
+        open_seats = ~eliminated[rb[:, None], candidates]
+        has = open_seats.any(axis=1)
+        bounced = candidates[np.arange(len(rb)), open_seats.argmax(axis=1)]
+        rb, bounced = rb[has], bounced[has]
+        health[rb, bounced] -= damage
+        eliminated[rb, bounced] |= health[rb, bounced] <= 0
+    return effect
+
+
+def _shield(card):
+    def effect(state, target, m, rows, n_players):
+        state.shield[rows[m], target[m]] += 1
+    return effect
+
+
+def _heal(card):
+    amount = card.heal
+
+    def effect(state, target, m, rows, n_players):
+        m = m & (state.health[rows, target] < MAX_LIVES)
+        state.health[rows[m], target[m]] += amount
+    return effect
+
+
+def _status(card):
+    flag = card.status
+    if flag not in BatchState.FLAGS:
+        raise ValueError(f"{card.type.value}: no batch array for status {flag!r}")
+
+    def effect(state, target, m, rows, n_players):
+        getattr(state, flag)[rows[m], target[m]] = True
+    return effect
+
+
+def _prime(card):
+    # Priming only marks the played card, which is discarded either way
+    def effect(state, target, m, rows, n_players):
+        pass
+    return effect
+
+
+def _draw(card):
+    def effect(state, target, m, rows, n_players):
+        m = m & (state.deck > 0)
+        state.hand[rows[m], target[m]] += 1
+        state.deck[m] -= 1
+    return effect
+
+
+def _swap_left(card):
+    def effect(state, target, m, rows, n_players):
+        hand = state.hand
+        r, t, left = rows[m], target[m], (target[m] + 1) % n_players
+        hand[r, t], hand[r, left] = hand[r, left], hand[r, t].copy()
+    return effect
+
+
+def _pass_left(card):
+    def effect(state, target, m, rows, n_players):
+        hand = state.hand
+        m = m & (hand[rows, target] > 0)
+        hand[rows[m], target[m]] -= 1
+        hand[rows[m], (target[m] + 1) % n_players] += 1
+    return effect
+
+
+def _discard_random(card):
+    def effect(state, target, m, rows, n_players):
+        m = m & (state.hand[rows, target] > 0)
+        state.hand[rows[m], target[m]] -= 1
+        state.discard[m] += 1
+    return effect
+
+
+def _refunded(effect, refund):
+    # Shield correction pass, as in cards/effects.with_shield_refund
+    def refunded(state, target, m, rows, n_players):
+        effect(state, target, m, rows, n_players)
+        r, t = rows[m], target[m]
+        shielded = state.shield[r, t] > 0
+        state.health[r[shielded], t[shielded]] += refund
+        state.shield[r[shielded], t[shielded]] -= 1
+    return refunded
+
+
+BATCH_KINDS = {
+    "strike": _strike,
+    "burn": _burn,
+    "shield": _shield,
+    "heal": _heal,
+    "status": _status,
+    "prime": _prime,
+    "draw": _draw,
+    "swap_left": _swap_left,
+    "pass_left": _pass_left,
+    "discard_random": _discard_random,
+}
+
+
+def compile_batch_effect(card):
+    # A card whose kind has no kernel here fails at import, not mid-sweep
+    if card.effect not in BATCH_KINDS:
+        raise ValueError(f"{card.type.value}: effect kind {card.effect!r} has no batch kernel")
+    effect = BATCH_KINDS[card.effect](card)
+    if card.shield_refund:
+        effect = _refunded(effect, card.shield_refund)
+    return effect
+
+
+# Indexed by card code
+BATCH_EFFECTS = [compile_batch_effect(card) for card in CARD_DEFS]
+
+
+def random_batch(games: int, players: int, rng: np.random.Generator):
+    # Synthetic mid-game rounds: every seat alive and playing two cards
+    state = BatchState(games, players)
+    state.health[:] = rng.integers(1, MAX_LIVES + 1, size=state.health.shape)
+    state.shield[:] = rng.integers(0, 2, size=state.shield.shape)
+    state.hand[:] = 2
+    state.deck[:] = rng.integers(0, 20, size=games)
+    state.crown[:] = rng.integers(0, players, size=games)
+    counts = np.array([d.count for d in CARD_DEFS], dtype=float)
+    shape = (games, 2 * players)
+    cards = rng.choice(len(CARD_DEFS), size=shape, p=counts / counts.sum()).astype(np.int16)
+    seats = np.tile(np.arange(players, dtype=np.int16), 2)
+    play_players = np.broadcast_to(seats, shape).copy()
+    targets = rng.integers(0, players, size=shape).astype(np.int16)
+    return state, cards, play_players, targets
+
+
+def games_in_play(seed: int, players: int):
+    # A game from the simulator, stopped in the resolve phase of a random round
+    from .models import Player
+    from .simulation import HeadlessGameManager, random_policy
+    from .utils.helpers import get_next_drawer, get_next_player
+
+    rng = random.Random(seed)
+    manager = HeadlessGameManager()
+    manager.create_game("SIM", Player(id="p0", username="p0"), seed=seed)
+    for i in range(1, players):
+        manager.join_game("SIM", Player(id=f"p{i}", username=f"p{i}"))
+    game = manager.get_game("SIM")
+    for round_no in range(rng.randrange(1, 8)):
+        if round_no:
+            manager.resolve_round("SIM")
+            if game.phase == "end":
+                return None
+            manager.next_round("SIM")
+        game.phase = "draw"
+        drawer = get_next_drawer(game)
+        while drawer:
+            manager.draw_cards("SIM", drawer.id)
+            drawer = get_next_drawer(game)
+        game.phase = "play"
+        player = get_next_player(game)
+        while player:
+            manager.play_card("SIM", player.id, *random_policy(game, player, rng))
+            player = get_next_player(game)
+    game.phase = "resolve"
+    return manager, game
+
+
+def cross_check(games: int, players: int = 4, seed: int = 0) -> int:
+    # Resolve the same rounds both ways; returns how many games disagreed
+    pairs = [pair for pair in (games_in_play(seed + i, players) for i in range(games)) if pair]
+    state = BatchState.from_games([game for _, game in pairs])
+    resolve_batch(state, *actions_from_games([game for _, game in pairs]))
+    mismatches = 0
+    for i, (manager, game) in enumerate(pairs):
+        manager.resolve_round(game.code)
+        winner = next((s for s, p in enumerate(game.players) if p.username == game.winner), -1)
+        expected = (
+            [p.health for p in game.players], [p.shield for p in game.players],
+            [p.snakebit for p in game.players], [p.entranced for p in game.players],
+            [p.eliminated for p in game.players], [len(p.hand) for p in game.players],
+            len(game.deck), len(game.discard), winner,
+        )
+        got = (
+            state.health[i].tolist(), state.shield[i].tolist(),
+            state.snakebit[i].tolist(), state.entranced[i].tolist(),
+            state.eliminated[i].tolist(), state.hand[i].tolist(),
+            int(state.deck[i]), int(state.discard[i]), int(state.winner[i]),
+        )
+        if expected != got:
+            mismatches += 1
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vectorized round resolution")
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", type=int, default=0, help="cross-check this many games against resolve_round")
+    parser.add_argument("--bench", type=int, default=0, help="time resolving this many synthetic rounds")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        mismatches = cross_check(args.check, args.players, args.seed)
+        print(f"cross-check: {mismatches} mismatches in {args.check} games")
+    if args.bench:
+        batch = random_batch(args.bench, args.players, np.random.default_rng(args.seed))
+        started = time.perf_counter()
+        resolve_batch(*batch)
+        elapsed = time.perf_counter() - started
+        print(f"resolved {args.bench} rounds in {elapsed:.3f}s ({args.bench / elapsed:,.0f} rounds/s)")
+
+
+if __name__ == "__main__":
+    main()
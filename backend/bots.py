@@ -0,0 +1,463 @@
+# Server-side bot players and the lookahead search they play with.
+#
+# On its play turn a bot tries each distinct card in its hand against each
+# target and resolves the round for every one: the cards it can't see
+# (other players' face-down plays, and the plays still to come this round)
+# are sampled from the cards unaccounted for, and the outcome is scored
+# from the bot's seat. Each pass of sampling is shared by every candidate,
+# so they are compared on the same luck. Passes repeat until BOT_THINK_MS
+# is used up; the best average wins.
+#
+# The position is shipped to the search as a flat list of ints per seat
+# (health, shield, flags, eliminated, hand size) plus deck and discard
+# sizes. Each rollout unpacks it into a Table, a stand-in for the GameState
+# that the compiled handlers in cards/effects.py run on directly, so bots
+# play by the same card rules as the server. resolve() follows
+# resolve_round's order, and
+#
+#   python -m backend.bots --check 2000 --bench 200
+#
+# cross-checks the two and times the search. Searches run in a process pool
+# of BOT_WORKERS, so a bot thinking never holds up the event loop; with
+# BOT_WORKERS=0 they run on the loop's default thread pool instead.
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .cards.definitions import CARD_CODES, CARD_DEFS
+from .cards.effects import EFFECTS
+from .tracing import tracer
+from .utils.helpers import PLAYS_PER_ROUND, can_play
+from shared.config import BOT_THINK_MS, BOT_WORKERS
+
+MIN_PASSES = 8  # samples per candidate, however tight the budget
+MAX_PASSES = 2000
+UNKNOWN = -1  # card code of a face-down play
+BOT_NAME = "🤖 Bot {}"
+
+logger = logging.getLogger(__name__)
+
+PRIORITY = [d.priority for d in CARD_DEFS]
+
+# Offsets into the flat state, as multiples of the player count
+HEALTH, SHIELD, SNAKEBIT, ENTRANCED, ELIMINATED, HAND = range(6)
+
+
+def state_from_game(game) -> List[int]:
+    players = game.players
+    return (
+        [p.health for p in players] + [p.shield for p in players]
+        + [int(p.snakebit) for p in players] + [int(p.entranced) for p in players]
+        + [int(p.eliminated) for p in players] + [len(p.hand) for p in players]
+        + [len(game.deck), len(game.discard)]
+    )
+
+
+def plays_from_game(game, viewer_id: Optional[str] = None) -> List[Tuple[int, int, int]]:
+    # (seat, card code, target seat) in played order; with a viewer, other
+    # players' cards are UNKNOWN. A target that isn't at the table is -1.
+    plays = []
+    for pid, played in game.played_cards.items():
+        seat = game.seat(pid)
+        for play in played:
+            code = CARD_CODES[play["card"].type] if viewer_id in (None, pid) else UNKNOWN
+            target = game.seat(play["target_id"])
+            plays.append((seat, code, -1 if target is None else target))
+    return plays
+
+
+class Seat:
+    # A player in a rollout: the fields card effects touch, with the hand
+    # as placeholders since only its size is known
+    __slots__ = ("id", "health", "shield", "snakebit", "entranced", "eliminated", "hand")
+
+
+class Table:
+    # Stands in for the GameState in a rollout, so rollouts run the
+    # compiled handlers in cards/effects.py; seat numbers double as ids
+    __slots__ = ("players", "deck", "discard", "_rng")
+
+    def __init__(self, s: List[int], n: int, rng: random.Random):
+        players = []
+        for i in range(n):
+            seat = Seat()
+            seat.id = i
+            seat.health = s[i]
+            seat.shield = s[SHIELD * n + i]
+            seat.snakebit = s[SNAKEBIT * n + i]
+            seat.entranced = s[ENTRANCED * n + i]
+            seat.eliminated = s[ELIMINATED * n + i]
+            seat.hand = [None] * s[HAND * n + i]
+            players.append(seat)
+        self.players = players
+        self.deck = s[6 * n]
+        self.discard = s[6 * n + 1]
+        self._rng = rng
+
+    def state(self) -> List[int]:
+        # Back to the flat state_from_game layout
+        players = self.players
+        return (
+            [p.health for p in players] + [p.shield for p in players]
+            + [int(p.snakebit) for p in players] + [int(p.entranced) for p in players]
+            + [int(p.eliminated) for p in players] + [len(p.hand) for p in players]
+            + [self.deck, self.discard]
+        )
+
+    def seat(self, player_id: int) -> int:
+        return player_id
+
+    def rng(self) -> random.Random:
+        return self._rng
+
+    def draw_card(self, player: Seat):
+        if self.deck:
+            self.deck -= 1
+            player.hand.append(None)
+
+    def discard_from_hand(self, player: Seat, index: int):
+        player.hand.pop(index)
+        self.discard += 1
+
+    def pass_card(self, giver: Seat, receiver: Seat, index: int = 0):
+        receiver.hand.append(giver.hand.pop(index))
+
+    def swap_hands(self, a: Seat, b: Seat):
+        a.hand, b.hand = b.hand, a.hand
+
+
+class FaceDown:
+    # The played card an effect sees; only a bomb's priming touches it
+    __slots__ = ("is_primed",)
+
+
+# Handlers by card code
+CODE_EFFECTS = [EFFECTS[d.type] for d in CARD_DEFS]
+
+
+def resolve(table: Table, crown: int, plays: List[Tuple[int, int, int]]) -> int:
+    # Resolve one round on the table in place, in resolve_round's order;
+    # returns the winner's seat, or -1 if the game goes on
+    players = table.players
+    n = len(players)
+    order = sorted(plays, key=lambda play: (PRIORITY[play[1]], (play[0] - crown) % n))
+    for seat, code, target in order:
+        if target >= 0 and not players[target].eliminated:
+            CODE_EFFECTS[code](table, {"card": FaceDown()}, players[target])
+        table.discard += 1
+        alive = -1
+        for p in players:
+            if p.health <= 0:
+                p.eliminated = True
+            if not p.eliminated:
+                alive = p.id if alive == -1 else -2
+        if alive >= 0:
+            return alive
+    return -1
+
+
+def score(table: Table, seat: int, winner: int) -> float:
+    # How good the end of the round looks from `seat`
+    if winner == seat:
+        return 100.0
+    me = table.players[seat]
+    if me.eliminated or winner >= 0:
+        return -100.0
+    value = 2.0 * me.health + me.shield - 1.5 * (me.snakebit + me.entranced)
+    for p in table.players:
+        if p is me:
+            continue
+        if p.eliminated:
+            value += 8.0
+        else:
+            value -= p.health + 0.5 * p.shield
+    return value
+
+
+def search_input(game, player_id: str) -> dict:
+    # Everything the bot is allowed to know, as plain data for the pool
+    me = game.player(player_id)
+    return {
+        "players": len(game.players),
+        "seat": game.seat(player_id),
+        "crown": game.crown_index,
+        "state": state_from_game(game),
+        "hand": [(card.id, CARD_CODES[card.type]) for card in me.hand],
+        "plays": plays_from_game(game, player_id),
+        # Plays each seat still has this round, counting the bot's current one
+        "remaining": [
+            PLAYS_PER_ROUND - len(game.played_cards.get(p.id, [])) if can_play(game, p) else 0
+            for p in game.players
+        ],
+    }
+
+
+def choose_play(view: dict, budget: float, seed: int) -> Tuple[str, int, dict]:
+    # Returns (card id, target seat, search stats)
+    rng = random.Random(seed)
+    n, seat, crown, base = view["players"], view["seat"], view["crown"], view["state"]
+    alive = [i for i in range(n) if not base[ELIMINATED * n + i]]
+    by_code: Dict[int, str] = {}
+    for card_id, code in view["hand"]:
+        by_code.setdefault(code, card_id)
+    candidates = [(code, target) for code in by_code for target in alive]
+    # Cards the bot hasn't seen: the standard deck less its own hand and plays
+    unseen = [d.count for d in CARD_DEFS]
+    for _, code in view["hand"]:
+        unseen[code] -= 1
+    for _, code, _ in view["plays"]:
+        if code != UNKNOWN:
+            unseen[code] -= 1
+    pool = [code for code, count in enumerate(unseen) for _ in range(max(count, 0))] or list(range(len(CARD_DEFS)))
+    own_later = view["remaining"][seat] - 1
+
+    totals = [0.0] * len(candidates)
+    deadline = time.perf_counter() + budget
+    passes = 0
+    while passes < MAX_PASSES and (passes < MIN_PASSES or time.perf_counter() < deadline):
+        passes += 1
+        # One draw of everyone else's cards, shared by every candidate
+        others = [
+            (player_seat, rng.choice(pool) if code == UNKNOWN else code, target)
+            for player_seat, code, target in view["plays"]
+        ]
+        for other_seat, left in enumerate(view["remaining"]):
+            if other_seat != seat:
+                others += [(other_seat, rng.choice(pool), rng.choice(alive)) for _ in range(left)]
+        for i, (code, target) in enumerate(candidates):
+            plays = others + [(seat, code, target)]
+            if own_later > 0:
+                rest = [c for _, c in view["hand"]]
+                rest.remove(code)
+                plays += [(seat, rng.choice(rest), rng.choice(alive)) for _ in range(min(own_later, len(rest)))]
+            table = Table(base, n, rng)
+            totals[i] += score(table, seat, resolve(table, crown, plays))
+    best = max(range(len(candidates)), key=totals.__getitem__)
+    code, target = candidates[best]
+    stats = {"candidates": len(candidates), "passes": passes, "rollouts": passes * len(candidates)}
+    return by_code[code], target, stats
+
+
+def _warm():
+    return None
+
+
+class Bots:
+    # Attached as GameManager.bots and told about every commit; plays for
+    # every player with is_bot set whose turn it is
+    def __init__(self, manager, think_ms: float = BOT_THINK_MS, workers: int = BOT_WORKERS):
+        self.manager = manager
+        self.budget = think_ms / 1000
+        self.workers = workers
+        self.pool = None
+        self.due: Set[str] = set()  # games where a bot is to move
+        self.thinking: Set[str] = set()  # games with a bot task running
+        # Called with the game code after a bot moved
+        self.on_move: List[Callable[[str], None]] = []
+        self.moves = 0
+        self.rollouts = 0
+
+    def add(self, code: str, count: int = 1) -> List[str]:
+        # Seat `count` bots at a game still in setup; returns their ids
+        from .models import Player
+
+        game = self.manager.get_game(code)
+        if not game:
+            raise ValueError("Game not found")
+        if game.phase != "setup":
+            raise ValueError("Game has already started")
+        taken = {p.username for p in game.players}
+        added = []
+        number = 1
+        for _ in range(count):
+            while BOT_NAME.format(number) in taken:
+                number += 1
+            name = BOT_NAME.format(number)
+            taken.add(name)
+            player = Player(id=f"{code}_{name}", username=name, is_bot=True)
+            self.manager.join_game(code, player)
+            added.append(player.id)
+        return added
+
+    def track_all(self):
+        # Pick up bot turns in games recovered after a restart
+        for code in self.manager.games:
+            self.changed(code)
+
+    def changed(self, code: str):
+        # Called by GameManager on every commit
+        game = self.manager.get_game(code)
+        player = game.player(game.current_turn_player_id) if game.current_turn_player_id else None
+        if player is not None and player.is_bot:
+            self.schedule(code)
+
+    def schedule(self, code: str):
+        self.due.add(code)
+        if code in self.thinking:
+            return  # the running task picks it up
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.thinking.add(code)
+        loop.create_task(self._run(code))
+
+    def play_for(self, code: str, player_id: str):
+        # Move for a human who ran out of time, as if a bot held their seat
+        asyncio.get_running_loop().create_task(self._move_guarded(code, player_id))
+
+    async def _run(self, code: str):
+        try:
+            while code in self.due:
+                self.due.discard(code)
+                game = self.manager.get_game(code)
+                player = game.player(game.current_turn_player_id) if game and game.current_turn_player_id else None
+                if player is not None and player.is_bot:
+                    await self._move_guarded(code, player.id)
+        finally:
+            self.thinking.discard(code)
+
+    async def _move_guarded(self, code: str, player_id: str):
+        with tracer.trace("bot move", code):
+            try:
+                moved = await self.move(code, player_id)
+            except Exception:
+                logger.exception("Bot move failed in game %s", code)
+                moved = await self._fallback(code, player_id)
+        if moved:
+            self.moves += 1
+            for callback in self.on_move:
+                callback(code)
+
+    async def move(self, code: str, player_id: str) -> bool:
+        game = self.manager.get_game(code)
+        if game is None or game.current_turn_player_id != player_id:
+            return False
+        if game.phase == "draw":
+            async with self.manager.lock(code):
+                if self._still_turn(code, player_id, "draw"):
+                    self.manager.draw_cards(code, player_id)
+                    return True
+            return False
+        if game.phase != "play":
+            return False
+        version = game.version
+        view = search_input(game, player_id)
+        card_id, target_seat, stats = await self.search(view, version)
+        self.rollouts += stats["rollouts"]
+        async with self.manager.lock(code):
+            game = self.manager.get_game(code)
+            if game is None or game.version != version:
+                return False  # the game moved on while we were thinking
+            self.manager.play_card(code, player_id, card_id, game.players[target_seat].id)
+        return True
+
+    async def search(self, view: dict, seed: int):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(), choose_play, view, self.budget, seed)
+
+    async def _fallback(self, code: str, player_id: str) -> bool:
+        # Keep the game moving even if the search broke
+        async with self.manager.lock(code):
+            if self._still_turn(code, player_id, "play"):
+                self.manager.pass_turn(code, player_id)
+                return True
+        return False
+
+    def _still_turn(self, code: str, player_id: str, phase: str) -> bool:
+        game = self.manager.get_game(code)
+        return game is not None and game.phase == phase and game.current_turn_player_id == player_id
+
+    def _pool(self):
+        if self.workers <= 0:
+            return None  # the loop's default thread pool
+        if self.pool is None:
+            # Spawned rather than forked: workers shouldn't inherit the event loop
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            for _ in range(self.workers):
+                self.pool.submit(_warm)
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+def cross_check(games: int, players: int = 4, seed: int = 0) -> int:
+    # Resolve the same rounds both ways; returns how many games disagreed
+    from .batch_resolve import games_in_play
+
+    mismatches = 0
+    for i in range(games):
+        pair = games_in_play(seed + i, players)
+        if not pair:
+            continue
+        manager, game = pair
+        table = Table(state_from_game(game), players, random.Random(i))
+        got_winner = resolve(table, game.crown_index, plays_from_game(game))
+        manager.resolve_round(game.code)
+        winner = next((seat for seat, p in enumerate(game.players) if p.username == game.winner), -1)
+        if state_from_game(game) != table.state() or winner != got_winner:
+            mismatches += 1
+    return mismatches
+
+
+def bench(turns: int, players: int, budget: float, seed: int = 0) -> dict:
+    # Searches from real mid-round positions, on this thread
+    from .batch_resolve import games_in_play
+    from .utils.helpers import get_next_player
+
+    rollouts, elapsed, searched = 0, 0.0, 0
+    for i in range(turns * 3):
+        pair = games_in_play(seed + i, players)
+        if not pair:
+            continue
+        _, game = pair
+        # Take back the last player's plays so there is a decision to make
+        last = next(reversed(game.played_cards))
+        for play in game.played_cards.pop(last):
+            game.player(last).hand.append(play["card"])
+        game.reindex()
+        game.phase = "play"
+        player = get_next_player(game)
+        if player is None:
+            continue
+        started = time.perf_counter()
+        _, _, stats = choose_play(search_input(game, player.id), budget, i)
+        elapsed += time.perf_counter() - started
+        rollouts += stats["rollouts"]
+        searched += 1
+        if searched == turns:
+            break
+    return {
+        "turns": searched,
+        "ms_per_turn": round(elapsed / max(searched, 1) * 1e3, 2),
+        "rollouts_per_turn": rollouts // max(searched, 1),
+        "rollouts_per_sec": round(rollouts / elapsed) if elapsed else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bot search: cross-check and timing")
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", type=int, default=0, help="cross-check this many games against resolve_round")
+    parser.add_argument("--bench", type=int, default=0, help="time this many bot turns")
+    parser.add_argument("--think-ms", type=float, default=BOT_THINK_MS)
+    args = parser.parse_args(argv)
+
+    if args.check:
+        mismatches = cross_check(args.check, args.players, args.seed)
+        print(f"cross-check: {mismatches} mismatches in {args.check} games")
+    if args.bench:
+        print(bench(args.bench, args.players, args.think_ms / 1000, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,71 @@
-# Card metadata (name, priority, type) will be defined here.
\ No newline at end of file
+# Card metadata (name, priority, type), one immutable entry per card type.
+#
+# Decks and discard piles only hold card codes (indexes into CARD_DEFS);
+# a Card object is built from the catalogue when a card is drawn into a hand
+# (see models.card_from_code).
+from typing import Dict, List, NamedTuple, Optional
+import enum
+
+
+class CardType(str, enum.Enum):
+    GOLDEN_LEFT_POTION = "Golden Left Potion"
+    LEFT_POTION = "Left Potion"
+    GOBLIN_HANDS = "Goblin Hands"
+    SHIELD = "Shield"
+    BATTLE_AXE = "Battle Axe"
+    BOW = "Bow"
+    FIREBALL = "Fireball"
+    DAGGER = "Dagger"
+    BOMB = "Bomb"
+    LOVE_POTION = "Love Potion"
+    SNAKE = "Snake"
+    CRYSTAL = "Crystal"
+    DRINK = "Drink"
+
+
+class CardDef(NamedTuple):
+    type: CardType
+    symbol: str
+    priority: int
+    count: int  # copies in the standard deck
+    description: str
+    # How the card resolves: an effect kind from cards/effects.py plus the
+    # properties that kind reads
+    effect: str
+    damage: int = 0
+    heal: int = 0
+    status: Optional[str] = None  # Player flag the card sets
+    bounce: bool = False  # Damage carries on to the next player clockwise
+    shield_only: bool = False  # Only hurts a target that has a shield
+    shield_refund: int = 0  # Health the shield correction pass gives back
+
+
+# Based on card descriptions and expected frequency
+CARD_DEFS = (
+    CardDef(CardType.DAGGER, "🔪", 5, 8, "Get stabbed.", "strike", damage=1),
+    CardDef(CardType.SHIELD, "🛡️", 3, 5, "Block once.", "shield"),
+    CardDef(CardType.FIREBALL, "🔥", 6, 4, "Fireball someone and get burned.", "burn",
+            damage=1, bounce=True, shield_refund=2),
+    CardDef(CardType.BOW, "🏹", 4, 4, "Shoot someone.", "strike", damage=1),
+    CardDef(CardType.LOVE_POTION, "💖", 2, 4, "Heal one life.", "status", status="entranced"),
+    CardDef(CardType.BOMB, "💣", 7, 3, "Explodes next turn.", "prime"),
+    CardDef(CardType.SNAKE, "🐍", 8, 3, "Play no cards next turn.", "status", status="snakebit"),
+    CardDef(CardType.CRYSTAL, "🔮", 9, 3, "Show what you play next turn.", "draw"),
+    CardDef(CardType.GOBLIN_HANDS, "👐", 1, 4, "Move a card.", "discard_random"),
+    CardDef(CardType.BATTLE_AXE, "🪓", 10, 4, "Get slashed twice if you have a shield.", "strike",
+            damage=2, shield_only=True, shield_refund=2),
+    CardDef(CardType.LEFT_POTION, "🥤", 11, 2, "Rotates nearby cards left.", "pass_left"),
+    CardDef(CardType.GOLDEN_LEFT_POTION, "🥇", 0, 1, "Rotates all cards left.", "swap_left"),
+    CardDef(CardType.DRINK, "🍺", 12, 2, "Regain one life.", "heal", heal=1),
+)
+
+CARD_CODES: Dict[CardType, int] = {d.type: code for code, d in enumerate(CARD_DEFS)}
+
+
+def deck_codes(counts: Optional[Dict[CardType, int]] = None) -> List[int]:
+    # Unshuffled deck as card codes; `counts` overrides the standard copies
+    deck = []
+    for code, d in enumerate(CARD_DEFS):
+        copies = d.count if counts is None else counts.get(d.type, 0)
+        deck.extend([code] * copies)
+    return deck
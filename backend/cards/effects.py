@@ -1 +1,144 @@
-# Card effect logic (damage, healing, shield, etc.) will be implemented here.
\ No newline at end of file
+# Card effect logic (damage, healing, shield, etc.), compiled per card type.
+#
+# Each effect kind turns a CardDef into a handler(game, action, target) with
+# the card's properties bound in. EFFECTS is built once at import, so
+# resolving a card is a single dict lookup; a new card only needs a row in
+# CARD_DEFS using one of these kinds.
+from shared.config import MAX_LIVES
+from .definitions import CARD_DEFS
+
+
+def choose_bounce_target(game, exclude):
+    # simplest: next alive clockwise that’s not in exclude
+    players = game.players
+    start_idx = game.seat(exclude[0])
+    for i in range(1, len(players)):
+        idx = (start_idx + i) % len(players)
+        if players[idx].id not in exclude and not players[idx].eliminated:
+            return players[idx]
+    return None
+
+
+def left_of(game, player):
+    return game.players[(game.seat(player.id) + 1) % len(game.players)]
+
+
+def strike(card):
+    # Damage the target; a shield absorbs the hit, or is the only way in
+    damage, shield_only = card.damage, card.shield_only
+
+    def effect(game, action, target):
+        if target.shield > 0:
+            if shield_only:
+                target.health -= damage
+            target.shield -= 1
+        elif not shield_only:
+            target.health -= damage
+    return effect
+
+
+def burn(card):
+    # Damage that ignores shields, then optionally bounces clockwise
+    damage, bounce = card.damage, card.bounce
+
+    def effect(game, action, target):
+        target.health -= damage
+        if target.health <= 0:
+            target.eliminated = True
+        elif bounce:
+            bounce_target = choose_bounce_target(game, exclude=[target.id])
+            if bounce_target:
+                bounce_target.health -= damage
+                if bounce_target.health <= 0:
+                    bounce_target.eliminated = True
+    return effect
+
+
+def shield(card):
+    def effect(game, action, target):
+        target.shield += 1
+    return effect
+
+
+def heal(card):
+    amount = card.heal
+
+    def effect(game, action, target):
+        if target.health < MAX_LIVES:
+            target.health += amount
+    return effect
+
+
+def status(card):
+    flag = card.status
+
+    def effect(game, action, target):
+        setattr(target, flag, True)
+    return effect
+
+
+def prime(card):
+    def effect(game, action, target):
+        action["card"].is_primed = True  # Mark the bomb card as primed
+    return effect
+
+
+def draw(card):
+    def effect(game, action, target):
+        game.draw_card(target)
+    return effect
+
+
+def swap_left(card):
+    def effect(game, action, target):
+        game.swap_hands(target, left_of(game, target))
+    return effect
+
+
+def pass_left(card):
+    def effect(game, action, target):
+        if target.hand:
+            game.pass_card(target, left_of(game, target))
+    return effect
+
+
+def discard_random(card):
+    def effect(game, action, target):
+        if target.hand:
+            game.discard_from_hand(target, game.rng().randrange(len(target.hand)))
+    return effect
+
+
+def with_shield_refund(effect, refund):
+    # Shield correction pass: a target still shielded after the effect gets
+    # `refund` health back and loses a shield
+    def refunded(game, action, target):
+        effect(game, action, target)
+        if target.shield > 0:
+            target.health += refund
+            target.shield -= 1
+    return refunded
+
+
+EFFECT_KINDS = {
+    "strike": strike,
+    "burn": burn,
+    "shield": shield,
+    "heal": heal,
+    "status": status,
+    "prime": prime,
+    "draw": draw,
+    "swap_left": swap_left,
+    "pass_left": pass_left,
+    "discard_random": discard_random,
+}
+
+
+def compile_effect(card):
+    effect = EFFECT_KINDS[card.effect](card)
+    if card.shield_refund:
+        effect = with_shield_refund(effect, card.shield_refund)
+    return effect
+
+
+EFFECTS = {card.type: compile_effect(card) for card in CARD_DEFS}
@@ -0,0 +1,146 @@
+# Keeps the number of games held in memory bounded.
+#
+# GameManager touches a game on every lookup and commit, so last_active is
+# in least-recently-used order. A game is in use while it has sockets open
+# or a long-poll request parked on it; HTTP requests touch it anyway.
+# sweep() evicts finished games after FINISHED_GAME_TTL and games not in use
+# after IDLE_GAME_TTL, then the least recently used games not in use until
+# no more than MAX_RESIDENT_GAMES are tracked. Games whose lock is held are
+# left for the next sweep. Evicted games are written to the spill
+# directory, when there is one, and come back on their next lookup; without
+# one (and without a durable store) the LRU pass only takes finished games,
+# since anything else would be lost.
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from .game_store import dump_game, load_game
+from .models import GameState
+from shared.config import MAX_RESIDENT_GAMES, IDLE_GAME_TTL, FINISHED_GAME_TTL
+
+SWEEP_INTERVAL = 30.0  # seconds between sweeps
+
+
+class GameEvictor:
+    def __init__(self, manager, max_games: int = MAX_RESIDENT_GAMES, idle_ttl: float = IDLE_GAME_TTL,
+                 finished_ttl: float = FINISHED_GAME_TTL, spill_dir: Optional[str] = None,
+                 connections: Optional[Callable[[str], int]] = None):
+        # connections(code) is the number of sockets open on a game
+        self.manager = manager
+        self.max_games = max_games
+        self.idle_ttl = idle_ttl
+        self.finished_ttl = finished_ttl
+        self.spill_dir = spill_dir
+        self.connections = connections or (lambda code: 0)
+        self.last_active: "OrderedDict[str, float]" = OrderedDict()
+        # Called with the game code after a game leaves memory
+        self.on_evict: List[Callable[[str], None]] = []
+        self.evicted = 0
+        self.restored = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def touch(self, code: str):
+        # Runs on every lookup and commit, so it only records the use;
+        # evicting is left to sweep()
+        self.last_active[code] = time.monotonic()
+        self.last_active.move_to_end(code)
+
+    def track_all(self):
+        # Start tracking games loaded without a lookup, e.g. by recovery
+        for code in self.manager.games:
+            if code not in self.last_active:
+                self.touch(code)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        for code, active in list(self.last_active.items()):
+            idle = now - active
+            if idle < min(self.idle_ttl, self.finished_ttl):
+                break  # everything after this was used more recently
+            game = self.manager.games.get(code)
+            if game is None:
+                self.last_active.pop(code, None)
+                continue
+            if self.manager.games.locked(code):
+                continue
+            if (game.phase == "end" and idle >= self.finished_ttl) or \
+                    (idle >= self.idle_ttl and not self.in_use(code)):
+                self.evict(code)
+                evicted += 1
+        # Then the least recently used, down to max_games
+        excess = len(self.last_active) - self.max_games
+        for code in list(self.last_active):
+            if excess <= 0:
+                break
+            if self.manager.games.locked(code) or self.in_use(code):
+                continue
+            if not self.restorable(code):
+                game = self.manager.games.get(code)
+                if game is not None and game.phase != "end":
+                    continue
+            self.evict(code)
+            evicted += 1
+            excess -= 1
+        return evicted
+
+    def in_use(self, code: str) -> bool:
+        return bool(self.connections(code)) or self.manager.waiting(code)
+
+    def restorable(self, code: str) -> bool:
+        # Whether the game comes back on its next lookup once evicted
+        return self.manager.games.durable or self._spill_path(code) is not None
+
+    async def sweep_forever(self, interval: float = SWEEP_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    def evict(self, code: str):
+        self.last_active.pop(code, None)
+        game = self.manager.games.evict(code)
+        path = self._spill_path(code)
+        if game is not None and path:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(dump_game(game))
+            os.replace(path + ".tmp", path)
+        self.manager.forget(code)
+        self.evicted += 1
+        for callback in self.on_evict:
+            callback(code)
+
+    def restore(self, code: str) -> Optional[GameState]:
+        path = self._spill_path(code)
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        game = load_game(text)
+        self.manager.games[code] = game
+        os.remove(path)
+        if self.manager.log is not None:
+            # The action log's snapshots only hold resident games
+            self.manager.log.append(("restore_game", code, text))
+        self.restored += 1
+        return game
+
+    def stats(self) -> Dict[str, int]:
+        spilled = 0
+        if self.spill_dir:
+            spilled = sum(1 for name in os.listdir(self.spill_dir) if name.endswith(".json"))
+        return {
+            "resident": self.manager.games.resident(),
+            "tracked": len(self.last_active),
+            "evicted": self.evicted,
+            "restored": self.restored,
+            "spilled": spilled,
+        }
+
+    def _spill_path(self, code: str) -> Optional[str]:
+        # Codes arrive from URLs, so only plain ones map to a file
+        if not self.spill_dir or not code.isalnum():
+            return None
+        return os.path.join(self.spill_dir, code + ".json")
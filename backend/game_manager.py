@@ -1,77 +1,228 @@
 # Game state, logic, turns, eliminations will be implemented here.
 
+import asyncio
 import random
-from typing import Dict
-from .models import GameState
-
-from typing import Dict
-from .models import GameState, Player, Card, CardType
+import string
+from collections import deque
+from typing import Dict, List, Optional
+from .models import GameState, Player, CardType, player_dict
+from .cards.definitions import deck_codes
 from .card_effects import apply_card_effect
+from .state_diff import summarize, diff_states
+from .utils.helpers import get_next_drawer, get_next_player, current_turn
+from .game_store import LocalGameStore, make_store
+from .tracing import tracer
+from shared.config import GAME_STORE, GAME_STORE_PATH, GAME_STORE_SHARDS, MAX_PLAYERS, MIN_PLAYERS
 
+# How many patches per game are kept for clients catching up on a version gap
+HISTORY_SIZE = 64
 
-def build_full_deck():
-    deck = []
 
-    def add_cards(name, symbol, priority, count):
-        for _ in range(count):
-            deck.append(Card(name=name, symbol=symbol, priority=priority))
+def build_full_deck(counts: Optional[Dict[CardType, int]] = None) -> List[int]:
+    # Card codes for one deck; card counts live in cards/definitions.py
+    return deck_codes(counts)
 
-    # Based on card descriptions and expected frequency
-    add_cards("Dagger", "🔪", 5, 8)
-    add_cards("Shield", "🛡️", 3, 5)
-    add_cards("Fireball", "🔥", 6, 4)
-    add_cards("Bow", "🏹", 4, 4)
-    add_cards("Love Potion", "💖", 2, 4)
-    add_cards("Bomb", "💣", 7, 3)
-    add_cards("Snake", "🐍", 8, 3)
-    add_cards("Crystal", "🔮", 9, 3)
-    add_cards("Goblin Hands", "👐", 1, 4)
-    add_cards("Battle Axe", "🪓", 10, 4)
-    add_cards("Left Potion", "🥤", 11, 2)
-    add_cards("Golden Left Potion", "🥇", 0, 1)
-    add_cards("Drink", "🍺", 12, 2)
 
-    return deck
+class GameManager:
+    def __init__(self, store=None):
+        # Any store from game_store.py; in-process only by default
+        self.games = store if store is not None else LocalGameStore()
+        self.history: Dict[str, deque] = {}
+        # Per game, the version the last summary was taken at and the summary
+        self._summaries: Dict[str, tuple] = {}
+        # Long-poll waiters per game, woken by the next commit
+        self._changed: Dict[str, asyncio.Event] = {}
+        # Optional ActionLog (action_log.py) that every commit is appended to
+        self.log = None
+        # Optional GameEvictor (eviction.py) bounding the games kept in memory
+        self.evictor = None
+        # Optional PhaseEngine (phases.py) told about every commit
+        self.engine = None
+        # Optional Bots (bots.py) that move for bot players
+        self.bots = None
+        # Optional GameMetrics (metrics.py) counting commits and phase times
+        self.metrics = None
+        # Optional GameAnalytics (analytics.py) recording finished games
+        self.analytics = None
 
+    def _commit(self, game: GameState, record: tuple):
+        # Bump the version and record the patch since the previous version.
+        # `record` is the method call that made the change, for the action log.
+        game.version += 1
+        game.current_turn_player_id = current_turn(game)
+        self.games.save(game)
+        if self.log is not None:
+            self.log.append(record)
+        if self.evictor is not None:
+            self.evictor.touch(game.code)
+        if self.engine is not None:
+            self.engine.changed(game.code)
+        if self.bots is not None:
+            self.bots.changed(game.code)
+        if self.metrics is not None:
+            self.metrics.committed(game, record)
+        if self.analytics is not None:
+            self.analytics.committed(game, record)
+        summary = summarize(game)
+        history = self.history.setdefault(game.code, deque(maxlen=HISTORY_SIZE))
+        previous = self._summaries.get(game.code)
+        if previous is not None and previous[0] == game.version - 1:
+            patch = diff_states(previous[1], summary, game)
+        elif previous is None and game.version == 1:
+            patch = diff_states(None, summary, game)
+        else:
+            # Other nodes committed versions in between (shared store), so a
+            # diff against our summary would not be this version's patch.
+            # Start the history over; anyone behind resyncs from a snapshot.
+            patch = None
+            history.clear()
+        self._summaries[game.code] = (game.version, summary)
+        if patch is not None:
+            patch["version"] = game.version
+            history.append(patch)
+        changed = self._changed.pop(game.code, None)
+        if changed:
+            changed.set()
 
-class GameManager:
-    def __init__(self):
-        self.games: Dict[str, GameState] = {}
-    
-    deck = build_full_deck()
-    random.shuffle(deck)
+    async def wait_for_change(self, code: str, since: int, timeout: float):
+        # Park until the game moves past version `since` or the timeout expires
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            game = self.get_game(code)
+            if not game or game.version > since:
+                return game
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return game
+            changed = self._changed.setdefault(code, asyncio.Event())
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return self.get_game(code)
 
-    def create_game(self, code: str, host_player: Player):
-        # Initialize deck (for now, just a few cards for demo)
-        deck =deck
+    def waiting(self, code: str) -> bool:
+        # Whether a long-poll request is parked on the game
+        return code in self._changed
 
+    def changes_since(self, code: str, version: int):
+        # Patches after `version`, or None if they fell out of the history
+        game = self.get_game(code)
+        if not game:
+            raise ValueError("Game not found")
+        if version >= game.version:
+            return []
+        patches = [patch for patch in self.history.get(code, ()) if patch["version"] > version]
+        # Every version from version + 1 up to the current one, with no gaps
+        expected = range(version + 1, game.version + 1)
+        if len(patches) != len(expected) or any(p["version"] != v for p, v in zip(patches, expected)):
+            return None
+        return patches
+
+    def new_game_code(self) -> str:
+        # Six uppercase letters not used by a game we still know about
+        while True:
+            code = "".join(random.choices(string.ascii_uppercase, k=6))
+            if not self.get_game(code):
+                return code
+
+    def create_game(self, code: str, host_player: Player, counts: Optional[Dict[CardType, int]] = None,
+                    seed: Optional[int] = None):
+        if seed is None:
+            seed = random.getrandbits(62)
         game = GameState(
             code=code,
             players=[host_player],
-            deck=deck,
+            deck=build_full_deck(counts),
             discard=[],
             crown_index=0,
             phase="setup",
             round=1,
-            played_cards={}  # player_id: {"card": Card, "target_id": str}
+            played_cards={},  # player_id: {"card": Card, "target_id": str}
+            seed=seed,
         )
+        game.rng().shuffle(game.deck)
         self.games[code] = game
+        logged_counts = {t.value: n for t, n in counts.items()} if counts else None
+        self._commit(game, ("create_game", code, player_dict(host_player), logged_counts, seed))
 
     def get_game(self, code: str) -> GameState:
-        return self.games.get(code)
+        game = self.games.get(code)
+        if self.evictor is not None:
+            if game is None:
+                # Evicted earlier: bring it back from the spill directory
+                game = self.evictor.restore(code)
+            if game is not None:
+                self.evictor.touch(code)
+        return game
+
+    def forget(self, code: str):
+        # Drop per-game bookkeeping once the game has left memory
+        self.history.pop(code, None)
+        self._summaries.pop(code, None)
+        changed = self._changed.pop(code, None)
+        if changed:
+            changed.set()
+
+    def lock(self, code: str):
+        # Hold across check-then-mutate sequences on one game
+        return self.games.lock(code)
     
 
     def join_game(self, code: str, player: Player):
-        game = self.games.get(code)
+        game = self.get_game(code)
         if not game:
             raise ValueError("Game not found")
         if any(p.username == player.username for p in game.players):
             raise ValueError("Username already taken in this game")
-        if len(game.players) >= 5:  # Or use MAX_PLAYERS from config
+        if len(game.players) >= MAX_PLAYERS:
             raise ValueError("Game is full")
-        game.players.append(player)
+        game.add_player(player)
+        self._commit(game, ("join_game", code, player_dict(player)))
 
-    from .models import GameState, Player, Card
+    def start_game(self, code: str):
+        game = self.get_game(code)
+        if not game:
+            raise ValueError("Game not found")
+        if game.phase != "setup":
+            raise ValueError("Game has already started")
+        if len(game.players) < MIN_PLAYERS:
+            raise ValueError(f"At least {MIN_PLAYERS} players are needed")
+        for idx, player in enumerate(game.players):
+            player.is_royal = (idx == game.crown_index)
+        game.phase = "draw"
+        self._commit(game, ("start_game", code))
+
+    def begin_play(self, code: str):
+        game = self.get_game(code)
+        if not game:
+            raise ValueError("Game not found")
+        if game.phase != "draw":
+            raise ValueError("Not in draw phase")
+        game.phase = "play"
+        self._commit(game, ("begin_play", code))
+
+    def begin_resolve(self, code: str):
+        game = self.get_game(code)
+        if not game:
+            raise ValueError("Game not found")
+        if game.phase != "play":
+            raise ValueError("Not in play phase")
+        game.phase = "resolve"
+        self._commit(game, ("begin_resolve", code))
+
+    def pass_turn(self, code: str, player_id: str):
+        # Sit out the rest of this play phase
+        game = self.get_game(code)
+        if not game:
+            raise ValueError("Game not found")
+        if game.phase != "play":
+            raise ValueError("Cannot pass outside of play phase")
+        player = game.player(player_id)
+        if not player or player is not get_next_player(game):
+            raise ValueError("It's not your turn to play")
+        game.passed.append(player_id)
+        self._commit(game, ("pass_turn", code, player_id))
 
     def draw_cards(self, code: str, player_id: str):
         game = self.get_game(code)
@@ -79,15 +230,19 @@ class GameManager:
             raise ValueError("Game not found")
         if game.phase != "draw":
             raise ValueError("Cannot draw cards outside of draw phase")
-        player = next((p for p in game.players if p.id == player_id), None)
+        player = game.player(player_id)
         if not player or player.eliminated:
             raise ValueError("Player not found or eliminated")
         # Enforce draw order: must be player's turn
-        expected_player = game.players[(game.crown_index + len([p for p in game.players if len(p.hand) < 4])) % len(game.players)]
-        if player != expected_player:
+        if player is not get_next_drawer(game):
             raise ValueError("It's not your turn to draw")
-        while len(player.hand) < 4 and game.deck:
-            player.hand.append(game.deck.pop(0))
+        while len(player.hand) < 4:
+            if not game.deck:
+                if not game.discard:
+                    break
+                game.reshuffle_discard(game.rng().shuffle)
+            game.draw_card(player)
+        self._commit(game, ("draw_cards", code, player_id))
 
 
     def play_card(self, code: str, player_id: str, card_id: str, target_id: str):
@@ -96,27 +251,22 @@ class GameManager:
             raise ValueError("Game not found")
         if game.phase != "play":
             raise ValueError("Cannot play cards outside of play phase")
-        player = next((p for p in game.players if p.id == player_id), None)
+        player = game.player(player_id)
         if not player or player.eliminated or player.snakebit or player.entranced:
             raise ValueError("Player cannot play this round")
         # Enforce play order: must be player's turn
-        played_this_round = sum([len(plays) for plays in game.played_cards.values()])
-        expected_player = game.players[(game.crown_index + played_this_round) % len(game.players)]
-        if player != expected_player:
+        if player is not get_next_player(game):
             raise ValueError("It's not your turn to play")
-        card = next((c for c in player.hand if c.id == card_id), None)
-        if not card:
+        if game.card_location(card_id) != ("hand", player_id):
             raise ValueError("Card not in hand")
         if player_id in game.played_cards and len(game.played_cards[player_id]) >= 2:
             raise ValueError("Player has already played two cards this round")
-        player.hand = [c for c in player.hand if c.id != card_id]
-        if player_id not in game.played_cards:
-            game.played_cards[player_id] = []
-        game.played_cards[player_id].append({"card": card, "target_id": target_id})
+        game.play_from_hand(player, card_id, target_id)
+        self._commit(game, ("play_card", code, player_id, card_id, target_id))
 
 
     def resolve_round(self, code: str):
-        game = self.games.get(code)
+        game = self.get_game(code)
         if not game:
             raise ValueError("Game not found")
         actions = []
@@ -128,15 +278,16 @@ class GameManager:
                     "target_id": play["target_id"]
                 })
         def player_order(pid):
-            idx = next((i for i, p in enumerate(game.players) if p.id == pid), None)
+            idx = game.seat(pid)
             if idx is None:
                 return 999
             return (idx - game.crown_index) % len(game.players)
         actions.sort(key=lambda x: (x["card"].priority, player_order(x["player_id"])))
         # Apply effects and check elimination/victory after each
         for action in actions:
-            apply_card_effect(game, action)
-            game.discard.append(action["card"])
+            with tracer.span("apply_card_effect", card=action["card"].type.value, target=action["target_id"]):
+                apply_card_effect(game, action)
+            game.discard_card(action["card"])
             # Eliminate players with 0 or less health immediately
             for player in game.players:
                 if player.health <= 0 and not player.eliminated:
@@ -146,43 +297,47 @@ class GameManager:
             if len(alive_players) == 1:
                 game.phase = "end"
                 game.winner = alive_players[0].username
-                game.played_cards = {}
+                game.clear_played()
+                self._commit(game, ("resolve_round", code))
                 return  # End round immediately if only one remains
         # If more than one player remains, advance as usual
         game.phase = "draw"
         game.round += 1
-        game.played_cards = {}
+        game.clear_played()
+        self._commit(game, ("resolve_round", code))
     
     def next_round(self, code: str):
-        game = self.games.get(code)
+        game = self.get_game(code)
         if not game:
             raise ValueError("Game not found")
         # Rotate crown to the left (next player who is not eliminated)
         alive_players = [p for p in game.players if not p.eliminated]
         if not alive_players:
             game.phase = "end"
+            self._commit(game, ("next_round", code))
             return
         # Find next alive player
         next_crown = (game.crown_index + 1) % len(game.players)
         while game.players[next_crown].eliminated:
             next_crown = (next_crown + 1) % len(game.players)
+        game.players[game.crown_index].is_royal = False
         game.crown_index = next_crown
-        for idx, player in enumerate(game.players):
-            player.is_royal = (idx == game.crown_index)
-        # Reset per-round statuses
+        game.players[next_crown].is_royal = True
+        # Reset per-round statuses (pydantic assignments aren't free, so
+        # only the ones that change)
         for player in game.players:
-            player.shield = 0
+            if player.shield:
+                player.shield = 0
             if player.snakebit:
                 player.snakebit = False
             if player.entranced:
                 player.entranced = False
         # Handle bombs: deal damage if primed
         for player in game.players:
-            for card in list(player.hand):
-                if getattr(card, "is_primed", False):
+            for i in reversed(range(len(player.hand))):
+                if player.hand[i].is_primed:
                     player.health -= 1
-                    player.hand.remove(card)
-                    game.discard.append(card)
+                    game.discard_from_hand(player, i)
         # Advance round number and phase
         game.round += 1
         game.phase = "draw"
@@ -194,11 +349,11 @@ class GameManager:
             if player.eliminated:
                 continue
             while len(player.hand) < 4 and game.deck:
-                player.hand.append(game.deck.pop(0))
+                game.draw_card(player)
 
                 # If deck is empty, reshuffle discard into deck
                 if not game.deck:
-                    game.deck = game.discard
-                    game.discard = []
-                    random.shuffle(game.deck)
-game_manager = GameManager()
\ No newline at end of file
+                    game.reshuffle_discard(game.rng().shuffle)
+        self._commit(game, ("next_round", code))
+
+game_manager = GameManager(make_store(GAME_STORE, GAME_STORE_PATH, GAME_STORE_SHARDS))
\ No newline at end of file
@@ -0,0 +1,218 @@
+# Pluggable storage for GameManager.games.
+#
+# LocalGameStore keeps games in this process only. SqliteGameStore keeps
+# them in a SQLite file that every uvicorn worker on the host can open; each
+# worker caches games in memory and reloads one when another worker has
+# committed a newer version. Saves are optimistic: a save based on a stale
+# version raises ConflictError instead of overwriting someone else's move.
+# ShardedGameStore spreads games over several stores by consistent hashing
+# of the game code, so shards can be added without moving most games.
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+from typing import Dict, Iterator, Optional
+
+from .models import Card, GameState, game_dict, dumps
+
+
+class ConflictError(ValueError):
+    pass
+
+
+def dump_game(game: GameState) -> str:
+    return dumps(game_dict(game)).decode()
+
+
+def load_game(text: str) -> GameState:
+    data = json.loads(text)
+    # played_cards is loosely typed, so its cards come back as plain dicts
+    for plays in data.get("played_cards", {}).values():
+        for play in plays:
+            play["card"] = Card(**play["card"])
+    return GameState(**data)
+
+
+class LocalGameStore:
+    # Whether an evicted game can still be loaded from the store
+    durable = False
+
+    def __init__(self):
+        self.games: Dict[str, GameState] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def get(self, code: str) -> Optional[GameState]:
+        return self.games.get(code)
+
+    def __setitem__(self, code: str, game: GameState):
+        self.games[code] = game
+
+    def save(self, game: GameState):
+        pass  # the object in memory is the only copy
+
+    def pop(self, code: str, default=None):
+        self._locks.pop(code, None)
+        return self.games.pop(code, default)
+
+    def evict(self, code: str) -> Optional[GameState]:
+        # Drop the game from memory; returns it when this was the only copy
+        self._locks.pop(code, None)
+        return self.games.pop(code, None)
+
+    def resident(self) -> int:
+        return len(self.games)
+
+    def lock(self, code: str) -> asyncio.Lock:
+        # Serializes mutations of one game across concurrent requests
+        lock = self._locks.get(code)
+        if lock is None:
+            lock = self._locks[code] = asyncio.Lock()
+        return lock
+
+    def locked(self, code: str) -> bool:
+        # True while a request holds the game's lock, i.e. is mid-mutation
+        lock = self._locks.get(code)
+        return lock is not None and lock.locked()
+
+    def __contains__(self, code: str) -> bool:
+        return self.get(code) is not None
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.games))
+
+
+class SqliteGameStore(LocalGameStore):
+    durable = True
+
+    def __init__(self, path: str):
+        import sqlite3  # only workers that use this store pay for the import
+        super().__init__()
+        self.path = path
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS games (code TEXT PRIMARY KEY, version INTEGER, state TEXT)")
+
+    def get(self, code: str) -> Optional[GameState]:
+        row = self.db.execute("SELECT version FROM games WHERE code = ?", (code,)).fetchone()
+        if row is None:
+            self.games.pop(code, None)
+            return None
+        cached = self.games.get(code)
+        if cached is None or cached.version != row[0]:
+            # Another worker moved the game on: reload it
+            state = self.db.execute("SELECT state FROM games WHERE code = ?", (code,)).fetchone()[0]
+            cached = self.games[code] = load_game(state)
+        return cached
+
+    def __setitem__(self, code: str, game: GameState):
+        self.games[code] = game
+        self.db.execute(
+            "INSERT OR REPLACE INTO games (code, version, state) VALUES (?, ?, ?)",
+            (code, game.version, dump_game(game)),
+        )
+
+    def save(self, game: GameState):
+        # GameManager bumps the version by one per commit
+        cursor = self.db.execute(
+            "UPDATE games SET version = ?, state = ? WHERE code = ? AND version = ?",
+            (game.version, dump_game(game), game.code, game.version - 1),
+        )
+        if cursor.rowcount == 0:
+            self.games.pop(game.code, None)
+            raise ConflictError("Game was changed by another player, try again")
+
+    def pop(self, code: str, default=None):
+        self.db.execute("DELETE FROM games WHERE code = ?", (code,))
+        return super().pop(code, default)
+
+    def evict(self, code: str) -> Optional[GameState]:
+        # The row stays in the database, so there is nothing to spill
+        super().evict(code)
+        return None
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([row[0] for row in self.db.execute("SELECT code FROM games")])
+
+
+class HashRing:
+    def __init__(self, nodes, replicas: int = 64):
+        # Each node gets `replicas` points on the ring to even out the load
+        self.ring = sorted(
+            (self._hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas)
+        )
+        self.points = [point for point, _ in self.ring]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def owner(self, key: str):
+        i = bisect.bisect(self.points, self._hash(key)) % len(self.points)
+        return self.ring[i][1]
+
+
+class ShardedGameStore:
+    def __init__(self, shards: Dict[str, LocalGameStore]):
+        self.shards = shards
+        self.ring = HashRing(shards)
+        self.durable = all(shard.durable for shard in shards.values())
+
+    def shard(self, code: str) -> LocalGameStore:
+        return self.shards[self.ring.owner(code)]
+
+    def get(self, code: str) -> Optional[GameState]:
+        return self.shard(code).get(code)
+
+    def __setitem__(self, code: str, game: GameState):
+        self.shard(code)[code] = game
+
+    def save(self, game: GameState):
+        self.shard(game.code).save(game)
+
+    def pop(self, code: str, default=None):
+        return self.shard(code).pop(code, default)
+
+    def evict(self, code: str) -> Optional[GameState]:
+        return self.shard(code).evict(code)
+
+    def resident(self) -> int:
+        return sum(shard.resident() for shard in self.shards.values())
+
+    def lock(self, code: str) -> asyncio.Lock:
+        return self.shard(code).lock(code)
+
+    def locked(self, code: str) -> bool:
+        return self.shard(code).locked(code)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.shard(code)
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards.values())
+
+    def __iter__(self) -> Iterator[str]:
+        for shard in self.shards.values():
+            yield from shard
+
+
+def make_store(kind: str = "memory", path: str = "games", shards: int = 1):
+    # "memory": this process only; "sqlite": <path>/shard-<n>.db files that
+    # every worker on the host shares
+    if kind == "memory":
+        make_shard = lambda i: LocalGameStore()
+    elif kind == "sqlite":
+        os.makedirs(path, exist_ok=True)
+        make_shard = lambda i: SqliteGameStore(os.path.join(path, f"shard-{i}.db"))
+    else:
+        raise ValueError(f"Unknown game store: {kind}")
+    if shards == 1:
+        return make_shard(0)
+    return ShardedGameStore({f"shard-{i}": make_shard(i) for i in range(shards)})
@@ -1,30 +1,202 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
-from telegram.ext import ApplicationBuilder, MessageHandler, CommandHandler, ContextTypes, filters
-
-
-from fastapi import FastAPI, HTTPException, Body
-from fastapi.middleware.cors import CORSMiddleware
-from backend.models import Player
-from backend.game_manager import game_manager
-from fastapi import BackgroundTasks
-import json
-from typing import Dict, List
-from fastapi.staticfiles import StaticFiles
-from fastapi import WebSocket, WebSocketDisconnect
+import asyncio
+import io
 import os
+import time
+from typing import Dict, Optional
 
+from fastapi import BackgroundTasks, Body, FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.websockets import WebSocketState
 
-
-active_connections: Dict[str, List[WebSocket]] = {}
-
-async def broadcast_game_state(game_code: str, game_state):
-    if game_code in active_connections:
-        data = json.dumps(game_state.dict())
-        for ws in active_connections[game_code]:
-            try:
-                await ws.send_text(data)
-            except Exception:
-                pass  # Ignore failed sends
+from backend.action_log import ActionLog, recover
+from backend.analytics import GameAnalytics
+from backend.bots import Bots
+from backend.eviction import GameEvictor
+from backend.game_manager import game_manager
+from backend.matchmaking import Matchmaker
+from backend.metrics import Registry, GameMetrics, MetricsMiddleware, instrument
+from backend.models import Player, FORMATS, card_dict, player_dict, dumps, encode, encode_snapshot, decode
+from backend.phases import PhaseEngine
+from backend.pubsub import make_bus, game_channel
+from backend.replay import MAGIC, export_log, write_header, write_replay
+from backend.tokens import player_token, check_token
+from backend.tracing import tracer, trace_methods, TracingMiddleware
+from backend.views import view_cache, redact_patch
+from backend.websocket import Broadcaster, UpdateBatcher
+from shared.config import ACTION_LOG_DIR, GAME_SPILL_DIR, PUBSUB_URL, BROADCAST_TICK_MS, DEBUG_ENDPOINTS, SERVE_STATIC, WEB_HOST, WEB_PORT
+
+
+def serialized_snapshot(game_code: str, player_id: Optional[str] = None, fmt: str = "json"):
+    game = game_manager.get_game(game_code)
+    if not game:
+        return None
+    return encode_snapshot(game.version, view_cache.get(game, player_id, fmt), fmt)
+
+broadcaster = Broadcaster(serialized_snapshot)
+
+def verified_player(game_code: str, player_id: Optional[str], token: Optional[str]) -> Optional[str]:
+    # The player a request may see as: without their token it is a spectator
+    return player_id if check_token(game_code, player_id, token) else None
+
+def require_player(game_code: str, player_id: str, token: Optional[str]):
+    if not check_token(game_code, player_id, token):
+        raise ValueError("Invalid player token")
+
+# Longest a ?since= request is parked waiting for the game to change
+LONG_POLL_TIMEOUT = 25.0
+
+def versioned_response(request: Request, game, content) -> Response:
+    # ETag is the game version; clients that already have it get a 304
+    etag = '"%d"' % game.version
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=content, media_type="application/json", headers={"ETag": etag})
+
+def json_response(content) -> Response:
+    # Already plain data: skips FastAPI's jsonable_encoder pass over it
+    return Response(content=dumps(content), media_type="application/json")
+
+async def wait_for_version(game_code: str, since: Optional[int], timeout: float):
+    if since is None:
+        return game_manager.get_game(game_code)
+    return await game_manager.wait_for_change(game_code, since, min(timeout, LONG_POLL_TIMEOUT))
+# Last version this node published for each game; patches after it go next
+broadcast_versions: Dict[str, int] = {}
+# Last version fanned out to this node's sockets, per game they watch
+delivered_versions: Dict[str, int] = {}
+
+# Updates reach sockets through the bus, whichever node made the move
+bus = make_bus(PUBSUB_URL)
+# Moves on a game within BROADCAST_TICK_MS of each other go out as one update
+update_batcher = UpdateBatcher(lambda game_code: flush_game_updates(game_code), BROADCAST_TICK_MS / 1000)
+
+def broadcast_later(game_code: str):
+    update_batcher.schedule(game_code)
+
+def deliver_game_update(message: dict):
+    game_code = message["code"]
+    seen = delivered_versions.get(game_code, 0)
+    if message["version"] <= seen:
+        return  # another node already published this far
+    delivered_versions[game_code] = message["version"]
+    patches = message["patches"]
+    if patches is not None:
+        patches = [patch for patch in patches if patch["version"] > seen]
+    if not patches or patches[0]["version"] != seen + 1:
+        # Missed some versions: everyone here starts over from a snapshot
+        broadcaster.resync_game(game_code)
+        return
+
+    def render(player_id, fmt):
+        return [encode(redact_patch(patch, player_id), fmt) for patch in patches]
+
+    # Serialized once per player, shared by that player's send queues
+    broadcaster.publish(game_code, render)
+
+def watch_game(game_code: str):
+    # New sockets start from a snapshot, so only later versions are news
+    game = game_manager.get_game(game_code)
+    delivered_versions[game_code] = game.version if game else 0
+    bus.subscribe(game_channel(game_code), deliver_game_update)
+
+def unwatch_game(game_code: str):
+    bus.unsubscribe(game_channel(game_code), deliver_game_update)
+    delivered_versions.pop(game_code, None)
+
+broadcaster.on_watch.append(watch_game)
+broadcaster.on_unwatch.append(unwatch_game)
+
+game_manager.evictor = GameEvictor(game_manager, spill_dir=GAME_SPILL_DIR, connections=broadcaster.connection_count)
+# Moves games along and plays for AFK players; its moves are broadcast too
+phase_engine = game_manager.engine = PhaseEngine(game_manager)
+phase_engine.on_advance.append(broadcast_later)
+# Seats players queued on /queue at new tables
+matchmaker = Matchmaker(game_manager)
+# Moves for bot players, for players who time out in the play phase, and
+# fills matchmaking tables nobody else joins
+bots = game_manager.bots = phase_engine.bots = matchmaker.bots = Bots(game_manager)
+bots.on_move.append(broadcast_later)
+
+game_manager.evictor.on_evict += [
+    phase_engine.cancel,
+    view_cache.drop,
+    broadcaster.close_game,
+    update_batcher.cancel,
+    lambda game_code: broadcast_versions.pop(game_code, None),
+]
+
+# Metrics, scraped from /metrics
+GAME_METHODS = ("create_game", "join_game", "start_game", "draw_cards", "play_card", "pass_turn",
+                "begin_play", "begin_resolve", "resolve_round", "next_round", "changes_since")
+metrics_registry = Registry()
+game_manager.metrics = GameMetrics(metrics_registry)
+game_manager.evictor.on_evict.append(game_manager.metrics.forget)
+# Finished games, for /analytics; attached once recovery has replayed the log
+analytics = GameAnalytics()
+game_manager.evictor.on_evict.append(analytics.forget)
+instrument(game_manager, GAME_METHODS, metrics_registry.histogram(
+    "syf_game_method_seconds", "Time spent in GameManager methods", ("method",)))
+trace_methods(game_manager, [name for name in GAME_METHODS if name != "changes_since"])
+broadcast_seconds = metrics_registry.histogram("syf_broadcast_seconds", "Time to fan an update out to a game's sockets")
+socket_action_seconds = metrics_registry.histogram(
+    "syf_socket_action_seconds", "Time to handle a move sent over the WebSocket", ("action",))
+metrics_registry.gauge("syf_games_resident", "Games held in memory", game_manager.games.resident)
+metrics_registry.callback_counter("syf_games_evicted_total", "Games evicted from memory",
+                                  lambda: game_manager.evictor.evicted)
+metrics_registry.gauge("syf_websocket_connections", "Open WebSocket connections", broadcaster.connection_count)
+metrics_registry.gauge("syf_websocket_send_queue_depth", "Messages waiting in all send queues",
+                       lambda: sum(broadcaster.queue_depths()))
+metrics_registry.gauge("syf_websocket_send_queue_max", "Messages waiting in the longest send queue",
+                       lambda: max(broadcaster.queue_depths(), default=0))
+metrics_registry.callback_counter("syf_websocket_failed_sends_total", "Sends that failed or timed out",
+                                  lambda: broadcaster.failed_sends)
+metrics_registry.gauge("syf_matchmaking_waiting", "Players waiting on /queue for a table", lambda: matchmaker.waiting)
+metrics_registry.callback_counter("syf_matchmaking_tables_total", "Tables formed by matchmaking",
+                                  lambda: matchmaker.tables)
+metrics_registry.callback_counter("syf_broadcasts_requested_total", "Moves that asked for a broadcast",
+                                  lambda: update_batcher.requested)
+metrics_registry.callback_counter("syf_broadcasts_flushed_total", "Batched updates actually sent",
+                                  lambda: update_batcher.flushed)
+metrics_registry.callback_counter("syf_pubsub_published_total", "Game updates published on the bus",
+                                  lambda: bus.published)
+metrics_registry.callback_counter("syf_pubsub_received_total", "Game updates received from other nodes",
+                                  lambda: bus.received)
+metrics_registry.callback_counter("syf_bot_moves_total", "Moves made by bots", lambda: bots.moves)
+metrics_registry.callback_counter("syf_bot_rollouts_total", "Rounds played out by bot searches",
+                                  lambda: bots.rollouts)
+metrics_registry.callback_counter("syf_games_finished_total", "Finished games sent to analytics",
+                                  lambda: analytics.finished)
+metrics_registry.gauge("syf_turn_timers", "Games waiting on a turn timer", phase_engine.pending)
+metrics_registry.callback_counter("syf_turn_timeouts_total", "Moves made for players who timed out",
+                                  lambda: phase_engine.timeouts)
+
+async def broadcast_game_state(game_code: str):
+    # Returns once the update carrying the game's current version is out
+    await update_batcher.schedule(game_code)
+
+def flush_game_updates(game_code: str):
+    game = game_manager.get_game(game_code)
+    if game is None:
+        return
+    started = time.perf_counter()
+    try:
+        with tracer.trace("broadcast", game_code):
+            _broadcast_game_state(game_code, game)
+    finally:
+        broadcast_seconds.observe(time.perf_counter() - started)
+
+def _broadcast_game_state(game_code: str, game_state):
+    sent_version = broadcast_versions.get(game_code, 0)
+    if game_state.version <= sent_version:
+        return
+    broadcast_versions[game_code] = game_state.version
+    # patches is None when the history no longer reaches back to
+    # sent_version; subscribers then resync
+    bus.publish(game_channel(game_code), {
+        "code": game_code,
+        "version": game_state.version,
+        "patches": game_manager.changes_since(game_code, sent_version),
+    })
 
 
 
@@ -34,9 +206,6 @@ app = FastAPI(
     version="0.1.0"
 )
 
-
-app.mount("/", StaticFiles(directory="frontend", html=True), name="frontend")
-
 # Allow frontend (adjust origins as needed)
 app.add_middleware(
     CORSMiddleware,
@@ -45,23 +214,138 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, registry=metrics_registry)
+app.add_middleware(TracingMiddleware)
+
+@app.on_event("startup")
+async def start_action_log():
+    # Rebuild games lost in a crash, then log every commit from here on
+    if ACTION_LOG_DIR:
+        recover(game_manager, ACTION_LOG_DIR)
+        game_manager.log = ActionLog(ACTION_LOG_DIR, game_manager.games)
+        asyncio.create_task(game_manager.log.sync_forever())
+
+@app.on_event("startup")
+async def start_analytics():
+    game_manager.analytics = analytics
+    analytics.start()
+
+@app.on_event("shutdown")
+async def stop_analytics():
+    analytics.close()
+
+@app.on_event("startup")
+async def start_evictor():
+    game_manager.evictor.track_all()
+    asyncio.create_task(game_manager.evictor.sweep_forever())
+
+@app.on_event("startup")
+async def start_phase_engine():
+    phase_engine.track_all()
+    asyncio.create_task(phase_engine.run())
+
+@app.on_event("startup")
+async def start_bus():
+    await bus.start()
+
+@app.on_event("shutdown")
+async def stop_bus():
+    await bus.close()
+
+@app.on_event("startup")
+async def start_bots():
+    bots.track_all()
+
+@app.on_event("startup")
+async def start_matchmaker():
+    asyncio.create_task(matchmaker.run())
+
+@app.on_event("shutdown")
+async def stop_bots():
+    bots.close()
+
+@app.on_event("shutdown")
+async def stop_action_log():
+    if game_manager.log is not None:
+        game_manager.log.close()
 
 @app.get("/")
 async def root():
     return {"message": "Stab Your Friends backend is running!"}
 
+@app.get("/metrics")
+async def metrics():
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+if DEBUG_ENDPOINTS:
+    @app.on_event("startup")
+    async def start_profiler():
+        # The profiler samples whichever thread configures it: the event loop
+        tracer.profiler.configure(tracer.profiler.rate)
+
+    @app.get("/debug/traces/{game_code}")
+    async def debug_traces(game_code: str):
+        return tracer.recent(game_code)
+
+    @app.post("/debug/tracing")
+    async def debug_tracing(
+        enabled: Optional[bool] = Body(None),
+        slow_ms: Optional[float] = Body(None),
+        profile_rate: Optional[float] = Body(None),
+    ):
+        if enabled is not None:
+            tracer.enabled = enabled
+        if slow_ms is not None:
+            tracer.slow_ms = slow_ms
+        if profile_rate is not None:
+            tracer.profiler.configure(profile_rate)
+        return {"enabled": tracer.enabled, "slow_ms": tracer.slow_ms, "profile_rate": tracer.profiler.rate,
+                "slow_actions": tracer.slow, "profile_samples": tracer.profiler.samples}
+
+    @app.get("/debug/profile")
+    async def debug_profile(reset: bool = False):
+        # Collapsed stacks, e.g. `curl .../debug/profile | flamegraph.pl > profile.svg`
+        text = tracer.profiler.collapsed()
+        if reset:
+            tracer.profiler.reset()
+        return Response(content=text, media_type="text/plain")
+
+    @app.get("/debug/replay/{game_code}")
+    async def debug_replay(game_code: str):
+        # The game as a replay file (see replay.py), checked against the
+        # state this server committed
+        if game_manager.log is None:
+            raise HTTPException(status_code=404, detail="Action log is off (ACTION_LOG_DIR)")
+        game_manager.log.sync()
+        f = io.BytesIO()
+        write_header(f)
+        for data in export_log(ACTION_LOG_DIR, game_manager.get_game, {game_code}):
+            write_replay(f, data)
+        if f.tell() == len(MAGIC) + 1:
+            raise HTTPException(status_code=404, detail="Game not found in the action log")
+        return Response(content=f.getvalue(), media_type="application/octet-stream")
+
+@app.get("/stats")
+async def stats():
+    # Games in memory, evicted and spilled to disk, open sockets and players queued
+    return {**game_manager.evictor.stats(), "connections": broadcaster.connection_count(),
+            "queued": matchmaker.waiting}
+
+
+@app.get("/analytics")
+async def analytics_summary():
+    # Running totals over finished games; see analytics.py for full scans
+    return json_response(analytics.aggregate.summary())
+
 
 @app.post("/create_game")
-async def create_game(username: str, background_tasks: BackgroundTasks = None):  # MODIFIED: add background_tasks
-    # Generate a unique game code (e.g., 6 uppercase letters)
-    import random, string
-    code = ''.join(random.choices(string.ascii_uppercase, k=6))
+async def create_game(username: str, background_tasks: BackgroundTasks = None):
+    code = game_manager.new_game_code()
     host_player = Player(id=code + "_host", username=username)
     game_manager.create_game(code, host_player)
-    game = game_manager.get_game(code)
     if background_tasks:
-        background_tasks.add_task(broadcast_game_state, code, game)
-    return {"game_code": code}
+        background_tasks.add_task(broadcast_game_state, code)
+    return {"game_code": code, "player_id": host_player.id, "token": player_token(code, host_player.id)}
 
 @app.post("/join_game")
 async def join_game(
@@ -69,30 +353,60 @@ async def join_game(
     username: str = Body(...),
     background_tasks: BackgroundTasks = None
 ):
-    from models import Player
     player = Player(id=game_code + "_" + username, username=username)
     try:
-        game_manager.join_game(game_code, player)
-        game = game_manager.get_game(game_code)
+        async with game_manager.lock(game_code):
+            game_manager.join_game(game_code, player)
+        if background_tasks:
+            background_tasks.add_task(broadcast_game_state, game_code)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"{username} joined game {game_code}", "player_id": player.id,
+            "token": player_token(game_code, player.id)}
+
+@app.post("/start_game")
+async def start_game(
+    game_code: str = Body(..., embed=True),
+    background_tasks: BackgroundTasks = None
+):
+    try:
+        async with game_manager.lock(game_code):
+            game_manager.start_game(game_code)
         if background_tasks:
-            background_tasks.add_task(broadcast_game_state, game_code, game)
+            background_tasks.add_task(broadcast_game_state, game_code)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    return {"message": f"{username} joined game {game_code}"}
+    return {"message": f"Game {game_code} started"}
+
+@app.post("/add_bots")
+async def add_bots(
+    game_code: str = Body(...),
+    count: int = Body(1),
+    background_tasks: BackgroundTasks = None
+):
+    try:
+        async with game_manager.lock(game_code):
+            player_ids = bots.add(game_code, count)
+        if background_tasks:
+            background_tasks.add_task(broadcast_game_state, game_code)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"player_ids": player_ids}
 
 @app.get("/players/{game_code}")
-async def get_players(game_code: str):
-    game = game_manager.get_game(game_code)
+async def get_players(request: Request, game_code: str, since: Optional[int] = None, timeout: float = LONG_POLL_TIMEOUT):
+    game = await wait_for_version(game_code, since, timeout)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
-    return [player.dict() for player in game.players]
-
-# ...existing code...
+    # Same redaction as the game view: no hands in the lobby list
+    players = [player_dict(player, hand=False) for player in game.players]
+    return versioned_response(request, game, dumps(players))
 
 @app.post("/draw")
 async def draw(
     game_code: str = Body(...),
     player_id: str = Body(...),
+    token: Optional[str] = Body(None),
     background_tasks: BackgroundTasks = None
 ):
     game = game_manager.get_game(game_code)
@@ -101,12 +415,16 @@ async def draw(
     if game.phase != "draw":
         raise HTTPException(status_code=400, detail="Not in draw phase")
     try:
-        game_manager.draw_cards(game_code, player_id)
+        require_player(game_code, player_id, token)
+        async with game_manager.lock(game_code):
+            game_manager.draw_cards(game_code, player_id)
+        # The store may have reloaded the game while drawing
+        game = game_manager.get_game(game_code)
         if background_tasks:
-            background_tasks.add_task(broadcast_game_state, game_code, game)
+            background_tasks.add_task(broadcast_game_state, game_code)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    return {"message": "Cards drawn", "hand": [card.dict() for card in next(p for p in game.players if p.id == player_id).hand]}
+    return json_response({"message": "Cards drawn", "hand": [card_dict(card) for card in game.player(player_id).hand]})
 
 
 @app.post("/play_card")
@@ -115,6 +433,7 @@ async def play_card_endpoint(
     player_id: str = Body(...),
     card_id: str = Body(...),
     target_id: str = Body(...),
+    token: Optional[str] = Body(None),
     background_tasks: BackgroundTasks = None
 ):
     game = game_manager.get_game(game_code)
@@ -123,94 +442,196 @@ async def play_card_endpoint(
     if game.phase != "play":
         raise HTTPException(status_code=400, detail="Not in play phase")
     try:
-        game_manager.play_card(game_code, player_id, card_id, target_id)
+        require_player(game_code, player_id, token)
+        async with game_manager.lock(game_code):
+            game_manager.play_card(game_code, player_id, card_id, target_id)
         if background_tasks:
-            background_tasks.add_task(broadcast_game_state, game_code, game)
+            background_tasks.add_task(broadcast_game_state, game_code)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     return {"message": "Card played"}
 
 
-@app.post("/resolve_round")
-async def resolve_round(
-    game_code: str = Body(...),
-    background_tasks: BackgroundTasks = None
-):
-    game = game_manager.get_game(game_code)
-    if not game:
+async def finish_round(game_code: str, player_id: str, token: Optional[str], background_tasks):
+    if not game_manager.get_game(game_code):
         raise HTTPException(status_code=404, detail="Game not found")
-    if game.phase != "resolve":
-        raise HTTPException(status_code=400, detail="Not in resolve phase")
     try:
-        game_manager.resolve_round(game_code)
+        require_player(game_code, player_id, token)
+        async with game_manager.lock(game_code):
+            phase_engine.finish_round(game_code)
         if background_tasks:
-            background_tasks.add_task(broadcast_game_state, game_code, game)
+            background_tasks.add_task(broadcast_game_state, game_code)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+# Both skip the rest of the resolve delay: the revealed cards resolve and
+# the next round is dealt at once, exactly as when the engine's timer fires
+@app.post("/resolve_round")
+async def resolve_round(
+    game_code: str = Body(...),
+    player_id: str = Body(...),
+    token: Optional[str] = Body(None),
+    background_tasks: BackgroundTasks = None
+):
+    await finish_round(game_code, player_id, token, background_tasks)
     return {"message": "Round resolved"}
 
 @app.post("/next_round")
 async def next_round(
     game_code: str = Body(...),
+    player_id: str = Body(...),
+    token: Optional[str] = Body(None),
     background_tasks: BackgroundTasks = None
 ):
-    game = game_manager.get_game(game_code)
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
-    if game.phase != "draw":  # Only allow next round from draw phase
-        raise HTTPException(status_code=400, detail="Not ready for next round")
-    try:
-        game_manager.next_round(game_code)
-        if background_tasks:
-            background_tasks.add_task(broadcast_game_state, game_code, game)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    await finish_round(game_code, player_id, token, background_tasks)
     return {"message": "Next round started"}
 
 
-
 @app.get("/game_state/{game_code}")
-async def game_state(game_code: str):
-    game = game_manager.get_game(game_code)
+async def game_state(request: Request, game_code: str, player_id: Optional[str] = None, token: Optional[str] = None,
+                     since: Optional[int] = None, timeout: float = LONG_POLL_TIMEOUT):
+    game = await wait_for_version(game_code, since, timeout)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
-    return game
+    # Cached per player and state version; only the caller's hand is included
+    viewer = verified_player(game_code, player_id, token)
+    return versioned_response(request, game, view_cache.get(game, viewer))
+
+
+# Moves sent over the socket as {"type": <action>, "id": <request id>, ...}.
+# Each checks the phase like its HTTP endpoint; the player is the one the
+# socket was opened for.
+def socket_draw(game_code: str, player_id: str, request: dict):
+    game_manager.draw_cards(game_code, player_id)
+
+def socket_play_card(game_code: str, player_id: str, request: dict):
+    if not request.get("card_id") or not request.get("target_id"):
+        raise ValueError("card_id and target_id are required")
+    game_manager.play_card(game_code, player_id, request["card_id"], request["target_id"])
+
+def socket_pass(game_code: str, player_id: str, request: dict):
+    game_manager.pass_turn(game_code, player_id)
+
+def socket_start_game(game_code: str, player_id: str, request: dict):
+    game_manager.start_game(game_code)
+
+def socket_resolve_round(game_code: str, player_id: str, request: dict):
+    phase_engine.finish_round(game_code)
+
+def socket_next_round(game_code: str, player_id: str, request: dict):
+    phase_engine.finish_round(game_code)
+
+SOCKET_ACTIONS = {
+    "draw": socket_draw,
+    "play_card": socket_play_card,
+    "pass": socket_pass,
+    "start_game": socket_start_game,
+    "resolve_round": socket_resolve_round,
+    "next_round": socket_next_round,
+}
+
+async def handle_socket_action(conn, request: dict):
+    with tracer.trace("ws " + request["type"], conn.game_code):
+        await _handle_socket_action(conn, request)
+
+async def _handle_socket_action(conn, request: dict):
+    # The delta for the move is queued before the ack, so a client holding
+    # the ack already has the state it produced; the ack waits for the
+    # batched broadcast that carries it
+    request_id = request.get("id")
+    try:
+        if conn.player_id is None:
+            raise ValueError("Spectators cannot make moves")
+        if not game_manager.get_game(conn.game_code):
+            raise ValueError("Game not found")
+        started = time.perf_counter()
+        async with game_manager.lock(conn.game_code):
+            try:
+                SOCKET_ACTIONS[request["type"]](conn.game_code, conn.player_id, request)
+            finally:
+                socket_action_seconds.observe(time.perf_counter() - started, request["type"])
+    except ValueError as e:
+        conn.offer([encode({"type": "error", "id": request_id, "detail": str(e)}, conn.fmt)])
+        return
+    version = game_manager.get_game(conn.game_code).version
+    await broadcast_game_state(conn.game_code)
+    conn.offer([encode({"type": "ack", "id": request_id, "version": version}, conn.fmt)])
 
 
 @app.websocket("/ws/{game_code}")
-async def websocket_endpoint(websocket: WebSocket, game_code: str):
-    await websocket.accept()
-    if game_code not in active_connections:
-        active_connections[game_code] = []
-    active_connections[game_code].append(websocket)
+async def websocket_endpoint(websocket: WebSocket, game_code: str, player_id: Optional[str] = None,
+                             token: Optional[str] = None):
+    # Clients that can read msgpack ask for it as the subprotocol and get
+    # binary frames; everyone else gets JSON text
+    fmt = "msgpack" if "msgpack" in FORMATS and "msgpack" in websocket.scope.get("subprotocols", ()) else "json"
+    await websocket.accept(subprotocol="msgpack" if fmt == "msgpack" else None)
+    # A socket without a valid token for its player id only spectates
+    conn = broadcaster.connect(game_code, websocket, verified_player(game_code, player_id, token), fmt)
+    # New clients start from a full snapshot, then follow the patches
+    conn.resync()
     try:
         while True:
-            # Wait for any message from client (could be a ping or action)
-            await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                request = decode(message["text"] if message.get("text") is not None else message["bytes"])
+            except ValueError:
+                continue
+            if not isinstance(request, dict):
+                continue
+            # Clients that notice a version gap ask for a fresh snapshot
+            if request.get("type") == "sync":
+                conn.resync()
+            elif request.get("type") in SOCKET_ACTIONS:
+                await handle_socket_action(conn, request)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.disconnect(conn)
+
+@app.websocket("/queue")
+async def queue_endpoint(websocket: WebSocket, username: str):
+    # Waits in the matchmaking queue for as long as the socket is open; the
+    # player is told their game, player id and token, then the socket is
+    # closed
+    await websocket.accept()
+
+    async def disconnected():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    left = asyncio.ensure_future(disconnected())
+    # The matchmaker checks this before seating the ticket: a socket that
+    # has closed gets no seat, even before the finally below cancels it
+    ticket = matchmaker.enqueue(
+        username, lambda: not left.done() and websocket.client_state == WebSocketState.CONNECTED)
+    try:
+        await websocket.send_text(encode({"type": "queued", "ticket": ticket.id, "waiting": matchmaker.waiting}))
+        await asyncio.wait((ticket.matched, left), return_when=asyncio.FIRST_COMPLETED)
+        if ticket.matched.done() and not ticket.matched.cancelled():
+            game_code, player_id = ticket.matched.result()
+            await websocket.send_text(encode({"type": "matched", "game_code": game_code, "player_id": player_id,
+                                              "token": player_token(game_code, player_id)}))
+            await websocket.close()
     except WebSocketDisconnect:
-        active_connections[game_code].remove(websocket)
-
-# BOT_TOKEN = os.getenv("8068386210:AAEiyCP3-0PVksVkX8fgomIj5JiwVuAqAbY")  # Or paste your token directly for local dev
-# WEBAPP_URL = "https://fc8343d703b2.ngrok-free.app/menu.html"  # <-- Replace with your deployed frontend URL
-
-# async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-#     keyboard = [
-#         [InlineKeyboardButton("▶️ Play Stab Your Friends", web_app=WebAppInfo(url=WEBAPP_URL))]
-#     ]
-#     reply_markup = InlineKeyboardMarkup(keyboard)
-#     await update.message.reply_text(
-#         "Welcome to Stab Your Friends!\nTap below to start the game.",
-#         reply_markup=reply_markup
-#     )
-
-# def run_telegram_bot():
-#     app = ApplicationBuilder().token(BOT_TOKEN).build()
-#     app.add_handler(CommandHandler("start", start_command))
-#     # Add more bot handlers if needed
-#     app.run_polling()
-
-# if __name__ == "__main__":
-#     import threading
-#     threading.Thread(target=run_telegram_bot, daemon=True).start()
-#     import uvicorn
-#     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+        pass
+    finally:
+        left.cancel()
+        matchmaker.cancel(ticket)
+
+# Mounted last so the static files don't shadow the API routes above. With
+# SERVE_STATIC=0 the frontend is served elsewhere, e.g. by static_app.py.
+if SERVE_STATIC:
+    from fastapi.staticfiles import StaticFiles
+    app.mount("/", StaticFiles(directory="frontend", html=True), name="frontend")
+
+
+def main():
+    # python -m backend.main; the Telegram bot is its own process, see telegram_bot.py
+    import uvicorn
+    uvicorn.run(app, host=WEB_HOST, port=WEB_PORT)
+
+
+if __name__ == "__main__":
+    main()
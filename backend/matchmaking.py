@@ -0,0 +1,171 @@
+# Matchmaking: players queue without a game code and are seated at new
+# tables of MIN_PLAYERS..MAX_PLAYERS.
+#
+# Waiting tickets sit in a heap ordered by when they joined, so joining,
+# leaving and taking the next player are O(log n); leaving only marks the
+# ticket and the heap skips it later. One task forms tables: a full table
+# as soon as MAX_PLAYERS are waiting, and a smaller one once the longest
+# waiting player has been there MATCHMAKING_WAIT seconds. It sleeps until
+# enqueue() wakes it or that deadline comes up, and every table formed in
+# one wake-up is created, joined and started in a single pass. With bots
+# attached, players still short of a table after MATCHMAKING_WAIT are
+# seated anyway and the empty seats go to bots. A ticket can carry an
+# alive() check (main.py passes one for the queue socket); tickets whose
+# player has gone are dropped as they come up, before any table is made.
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Callable, List, Optional
+
+from .models import Player
+from shared.config import MIN_PLAYERS, MAX_PLAYERS, MATCHMAKING_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+class Ticket:
+    __slots__ = ("id", "username", "enqueued", "matched", "cancelled", "alive")
+
+    def __init__(self, ticket_id: int, username: str, enqueued: float,
+                 alive: Optional[Callable[[], bool]] = None):
+        self.id = ticket_id
+        self.username = username
+        self.enqueued = enqueued
+        self.alive = alive  # False once the player can no longer be told about a seat
+        # Resolves to (game_code, player_id) once the player has a seat
+        self.matched: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.cancelled = False
+
+
+class Matchmaker:
+    def __init__(self, manager, min_players: int = MIN_PLAYERS, max_players: int = MAX_PLAYERS,
+                 wait: float = MATCHMAKING_WAIT, clock: Callable[[], float] = time.monotonic):
+        self.manager = manager
+        self.min_players = min_players
+        self.max_players = max_players
+        self.wait = wait
+        self.clock = clock
+        self.heap: List[tuple] = []  # (enqueued, ticket id, ticket)
+        self.ids = itertools.count(1)
+        self.waiting = 0  # live tickets in the heap
+        self.wake = asyncio.Event()
+        # Optional Bots (bots.py) to fill tables nobody else turns up for
+        self.bots = None
+        self.matched = 0
+        self.tables = 0
+
+    def enqueue(self, username: str, alive: Optional[Callable[[], bool]] = None) -> Ticket:
+        ticket = Ticket(next(self.ids), username, self.clock(), alive)
+        heapq.heappush(self.heap, (ticket.enqueued, ticket.id, ticket))
+        self.waiting += 1
+        if self.waiting >= self.min_players or self.bots is not None:
+            self.wake.set()
+        return ticket
+
+    def cancel(self, ticket: Ticket):
+        # Leaving the queue; too late once the ticket has a seat
+        if ticket.cancelled or ticket.matched.done():
+            return
+        ticket.cancelled = True
+        self.waiting -= 1
+        ticket.matched.cancel()
+
+    def _gone(self, ticket: Ticket) -> bool:
+        # Cancelled, or cancelled now because the player has left
+        if not ticket.cancelled and ticket.alive is not None and not ticket.alive():
+            self.cancel(ticket)
+        return ticket.cancelled
+
+    def _pop(self) -> Optional[Ticket]:
+        while self.heap:
+            ticket = heapq.heappop(self.heap)[2]
+            if not self._gone(ticket):
+                self.waiting -= 1
+                return ticket
+        return None
+
+    def _peek(self) -> Optional[Ticket]:
+        while self.heap and self._gone(self.heap[0][2]):
+            heapq.heappop(self.heap)
+        return self.heap[0][2] if self.heap else None
+
+    def _take(self, count: int, least: int) -> List[Ticket]:
+        # The `count` longest-waiting players with distinct usernames, or
+        # none when there are fewer than `least`; players skipped keep their
+        # place
+        table, names, skipped = [], set(), []
+        while len(table) < count:
+            ticket = self._pop()
+            if ticket is None:
+                break
+            if ticket.username in names:
+                skipped.append(ticket)
+            else:
+                names.add(ticket.username)
+                table.append(ticket)
+        if len(table) < least:
+            skipped += table
+            table = []
+        for ticket in skipped:
+            heapq.heappush(self.heap, (ticket.enqueued, ticket.id, ticket))
+            self.waiting += 1
+        return table
+
+    def match(self, now: float) -> Optional[float]:
+        # Seat everyone who can be seated; returns the seconds until a
+        # smaller table would be due, or None if nothing is due
+        tables = []
+        while self._peek() and self.waiting >= self.min_players:
+            if self.waiting < self.max_players and self._peek().enqueued + self.wait > now:
+                break
+            table = self._take(self.max_players, self.min_players)
+            if not table:
+                break  # only repeated usernames left; wait for someone new
+            tables.append(table)
+        least = self.min_players if self.bots is None else 1
+        if self.bots is not None and self._peek() and self.waiting < self.min_players \
+                and self._peek().enqueued + self.wait <= now:
+            # Waited long enough on their own: bots make up the numbers
+            table = self._take(self.waiting, least)
+            if table:
+                tables.append(table)
+        due = None
+        if self._peek() and self.waiting >= least:
+            due = self._peek().enqueued + self.wait - now
+            if due <= 0:
+                due = None
+        for table in tables:
+            self.seat(table)
+        return due
+
+    def seat(self, table: List[Ticket]):
+        code = self.manager.new_game_code()
+        players = [Player(id=f"{code}_{t.username}", username=t.username) for t in table]
+        try:
+            self.manager.create_game(code, players[0])
+            for player in players[1:]:
+                self.manager.join_game(code, player)
+            if len(players) < self.min_players and self.bots is not None:
+                self.bots.add(code, self.min_players - len(players))
+            self.manager.start_game(code)
+        except ValueError:
+            logger.exception("Could not seat table %s; requeueing its players", code)
+            for ticket in table:
+                heapq.heappush(self.heap, (ticket.enqueued, ticket.id, ticket))
+                self.waiting += 1
+            return
+        for ticket, player in zip(table, players):
+            ticket.matched.set_result((code, player.id))
+        self.matched += len(table)
+        self.tables += 1
+
+    async def run(self):
+        while True:
+            self.wake.clear()
+            due = self.match(self.clock())
+            try:
+                await asyncio.wait_for(self.wake.wait(), due)
+            except asyncio.TimeoutError:
+                pass
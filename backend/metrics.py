@@ -0,0 +1,186 @@
+# Counters, gauges and histograms exposed in the Prometheus text format.
+#
+# Recording is a dict update and, for histograms, a bisect into the bucket
+# bounds; nothing is formatted until /metrics is scraped. Gauges are
+# callbacks read at scrape time, so they cost nothing in between.
+import bisect
+import functools
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Seconds; spans a fast in-memory action up to a slow request
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Seconds a game spends in one phase
+PHASE_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name, self.help, self.read = name, help, read
+
+    def samples(self) -> Iterable[str]:
+        yield f"{self.name} {_number(self.read())}"
+
+
+class CallbackCounter(Gauge):
+    # A total kept elsewhere (e.g. GameEvictor.evicted), read at scrape time
+    kind = "counter"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = TIME_BUCKETS):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (last one is +Inf), sum]
+        self.values: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % _number(float(bound))
+                yield f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=TIME_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self.add(Gauge(name, help, read))
+
+    def callback_counter(self, name: str, help: str, read: Callable[[], float]) -> CallbackCounter:
+        return self.add(CallbackCounter(name, help, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+def instrument(obj, methods: Iterable[str], histogram: Histogram):
+    # Replace obj.<method> with a wrapper timing each call into `histogram`,
+    # labelled by method name. Instance-level, so other instances (e.g. the
+    # simulator's managers) stay unwrapped.
+    perf_counter = time.perf_counter
+    for name in methods:
+        method = getattr(obj, name)
+
+        def timed(*args, _method=method, _name=name, **kwargs):
+            started = perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                histogram.observe(perf_counter() - started, _name)
+        setattr(obj, name, functools.wraps(method)(timed))
+
+
+class GameMetrics:
+    # Attached as GameManager.metrics and told about every commit
+    def __init__(self, registry: Registry):
+        self.actions = registry.counter("syf_game_actions_total", "Committed game actions", ("action",))
+        self.phase_seconds = registry.histogram(
+            "syf_game_phase_seconds", "Time games spend in each phase", ("phase",), PHASE_BUCKETS
+        )
+        self.phase_started: Dict[str, Tuple[str, float]] = {}
+
+    def committed(self, game, record: tuple):
+        self.actions.inc(record[0])
+        entered = self.phase_started.get(game.code)
+        if entered is not None and entered[0] == game.phase:
+            return
+        now = time.monotonic()
+        if entered is not None:
+            self.phase_seconds.observe(now - entered[1], entered[0])
+        if game.phase == "end":
+            self.phase_started.pop(game.code, None)
+        else:
+            self.phase_started[game.code] = (game.phase, now)
+
+    def forget(self, code: str):
+        self.phase_started.pop(code, None)
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware timing HTTP requests by route template, so
+    # /game_state/ABCDEF and /game_state/QWERTY share one series
+    def __init__(self, app, registry: Registry):
+        self.app = app
+        self.requests = registry.counter("syf_http_requests_total", "HTTP requests", ("route", "status"))
+        self.seconds = registry.histogram("syf_http_request_seconds", "HTTP request time", ("route",))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "static"
+            self.seconds.observe(time.perf_counter() - started, route)
+            self.requests.inc(route, status[0])
@@ -1,31 +1,37 @@
 # Pydantic models for requests and responses will be defined here.
-from typing import List, Optional, Dict
+import json
+import random
+from typing import List, Optional, Dict, Union
 from pydantic import BaseModel
-import enum
-
-
-class CardType(str, enum.Enum):
-    GOLDEN_LEFT_POTION = "Golden Left Potion"
-    LEFT_POTION = "Left Potion"
-    GOBLIN_HANDS = "Goblin Hands"
-    SHIELD = "Shield"
-    BATTLE_AXE = "Battle Axe"
-    BOW = "Bow"
-    FIREBALL = "Fireball"
-    DAGGER = "Dagger"
-    BOMB = "Bomb"
-    LOVE_POTION = "Love Potion"
-    SNAKE = "Snake"
-    CRYSTAL = "Crystal"
-    DRINK = "Drink"
+from .cards.definitions import CardType, CARD_DEFS, CARD_CODES
+
+# Both optional (listed in requirements.txt): orjson makes dumps() several
+# times faster, msgpack lets WebSocket clients ask for binary frames (see
+# encode). Without msgpack, /ws only speaks JSON.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 
 class Card(BaseModel):
     id: str
     type: CardType
     priority: int
-    description: str
+    symbol: str = ""
+    description: str = ""
     is_primed: bool = False  # For bombs, snakes, etc.
 
+
+def card_from_code(code: int, card_id: str) -> Card:
+    d = CARD_DEFS[code]
+    return Card(id=card_id, type=d.type, priority=d.priority, symbol=d.symbol, description=d.description)
+
+
 class Player(BaseModel):
     id: str
     username: str
@@ -37,15 +43,228 @@ class Player(BaseModel):
     entranced: bool = False
     is_primed: bool = False
     shield: int = 0
+    is_bot: bool = False  # Moved for by the server, see bots.py
 
 class GameState(BaseModel):
     code: str
     players: List[Player]
-    deck: List[Card]
-    discard: List[Card]
+    # Card codes (see cards.definitions); drawn from the end of the list
+    deck: List[int]
+    discard: List[int]
     crown_index: int = 0
     phase: str = "setup"  # setup, draw, play, resolve, end
     round: int = 1
-    played_cards: Dict[str, Dict] = {}
+    played_cards: Dict[str, List[Dict]] = {}
     winner: Optional[str] = None  
-    current_turn_player_id: str 
+    current_turn_player_id: Optional[str] = None
+    passed: List[str] = []  # Players sitting out the rest of this play phase
+    version: int = 0  # Bumped by GameManager on every mutation
+    cards_dealt: int = 0  # Id source for cards drawn out of the deck
+    seed: int = 0  # Every shuffle and random pick derives from this
+
+    # Lookup indexes, kept in step by the mutation helpers below. Only cards
+    # out of the deck have ids; their locations are ("hand", player_id) or
+    # ("played", player_id). Plain slots rather than PrivateAttr, which
+    # pydantic reads through a __getattr__ fallback costing microseconds.
+    __slots__ = ("_players_by_id", "_seats", "_card_locations", "_rng", "_rng_version")
+
+    # pydantic's copy, deepcopy and pickle support only carries fields and
+    # private attributes, so each rebuilds the slots afterwards
+    def model_post_init(self, __context):
+        self.reindex()
+
+    def __copy__(self):
+        copied = super().__copy__()
+        copied.reindex()
+        return copied
+
+    def __deepcopy__(self, memo=None):
+        copied = super().__deepcopy__(memo)
+        copied.reindex()
+        return copied
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.reindex()
+
+    def reindex(self):
+        # Rebuild every index from the lists; only needed after bulk edits
+        self._players_by_id = {p.id: p for p in self.players}
+        self._seats = {p.id: i for i, p in enumerate(self.players)}
+        locations = {}
+        for p in self.players:
+            for card in p.hand:
+                locations[card.id] = ("hand", p.id)
+        for pid, plays in self.played_cards.items():
+            for play in plays:
+                locations[play["card"].id] = ("played", pid)
+        self._card_locations = locations
+        self._rng = None
+        self._rng_version = -1
+
+    def rng(self) -> random.Random:
+        # Random stream for the mutation in progress, derived from the seed
+        # and the current version so replays reshuffle the same way
+        if self._rng_version != self.version:
+            self._rng = random.Random(self.seed << 32 | self.version)
+            self._rng_version = self.version
+        return self._rng
+
+    def player(self, player_id: str) -> Optional[Player]:
+        return self._players_by_id.get(player_id)
+
+    def seat(self, player_id: str) -> Optional[int]:
+        return self._seats.get(player_id)
+
+    def card_location(self, card_id: str):
+        return self._card_locations.get(card_id)
+
+    def add_player(self, player: Player):
+        self._seats[player.id] = len(self.players)
+        self._players_by_id[player.id] = player
+        self.players.append(player)
+        for card in player.hand:
+            self._card_locations[card.id] = ("hand", player.id)
+
+    def draw_card(self, player: Player) -> Optional[Card]:
+        if not self.deck:
+            return None
+        card = card_from_code(self.deck.pop(), str(self.cards_dealt))
+        self.cards_dealt += 1
+        player.hand.append(card)
+        self._card_locations[card.id] = ("hand", player.id)
+        return card
+
+    def _take_from_hand(self, player: Player, card_id: str) -> Optional[Card]:
+        if self._card_locations.get(card_id) != ("hand", player.id):
+            return None
+        for i, card in enumerate(player.hand):
+            if card.id == card_id:
+                return player.hand.pop(i)
+        return None
+
+    def play_from_hand(self, player: Player, card_id: str, target_id: str) -> Optional[Card]:
+        card = self._take_from_hand(player, card_id)
+        if card is None:
+            return None
+        self.played_cards.setdefault(player.id, []).append({"card": card, "target_id": target_id})
+        self._card_locations[card.id] = ("played", player.id)
+        return card
+
+    def discard_card(self, card: Card):
+        self.discard.append(CARD_CODES[card.type])
+        self._card_locations.pop(card.id, None)
+
+    def discard_from_hand(self, player: Player, index: int) -> Card:
+        card = player.hand.pop(index)
+        self.discard_card(card)
+        return card
+
+    def pass_card(self, giver: Player, receiver: Player, index: int = 0) -> Card:
+        card = giver.hand.pop(index)
+        receiver.hand.append(card)
+        self._card_locations[card.id] = ("hand", receiver.id)
+        return card
+
+    def swap_hands(self, a: Player, b: Player):
+        a.hand, b.hand = b.hand, a.hand
+        for card in a.hand:
+            self._card_locations[card.id] = ("hand", a.id)
+        for card in b.hand:
+            self._card_locations[card.id] = ("hand", b.id)
+
+    def clear_played(self):
+        # Cards still face down when the round is cut short leave the game
+        for pid, plays in self.played_cards.items():
+            for play in plays:
+                if self._card_locations.get(play["card"].id) == ("played", pid):
+                    del self._card_locations[play["card"].id]
+        self.played_cards = {}
+        self.passed = []
+
+    def reshuffle_discard(self, shuffle):
+        # The discard pile (plus anything left in the deck) becomes the new
+        # deck; both lists are reused rather than copied
+        self.discard.extend(self.deck)
+        self.deck.clear()
+        self.deck, self.discard = self.discard, self.deck
+        shuffle(self.deck)
+
+
+# Plain-dict serialization, bypassing pydantic. model_dump() (and the
+# deprecated .dict(), which warns on every call) walks the validators' schema
+# for each card; these build the same dicts directly, and everything a card
+# carries apart from its id and is_primed is fixed by its type, so that part
+# is built once per type.
+CARD_FIELDS = {
+    d.type: {"type": d.type.value, "priority": d.priority, "symbol": d.symbol, "description": d.description}
+    for d in CARD_DEFS
+}
+PLAYER_STATE_FIELDS = tuple(name for name in Player.model_fields if name != "hand")
+GAME_STATE_FIELDS = tuple(name for name in GameState.model_fields if name not in ("players", "played_cards"))
+
+
+def card_dict(card: Card) -> dict:
+    return {"id": card.id, **CARD_FIELDS[card.type], "is_primed": card.is_primed}
+
+
+def player_dict(player: Player, hand: bool = True) -> dict:
+    entry = {name: getattr(player, name) for name in PLAYER_STATE_FIELDS}
+    if hand:
+        entry["hand"] = [card_dict(card) for card in player.hand]
+    return entry
+
+
+def plays_dict(played_cards: Dict[str, List[Dict]]) -> dict:
+    return {
+        pid: [{"card": card_dict(play["card"]), "target_id": play["target_id"]} for play in plays]
+        for pid, plays in played_cards.items()
+    }
+
+
+def game_dict(game: GameState) -> dict:
+    # Same shape as game.model_dump(); lists are copied so the result can
+    # outlive the next mutation
+    data = {name: getattr(game, name) for name in GAME_STATE_FIELDS}
+    for name in ("deck", "discard", "passed"):
+        data[name] = list(data[name])
+    data["players"] = [player_dict(p) for p in game.players]
+    data["played_cards"] = plays_dict(game.played_cards)
+    return data
+
+
+if orjson is not None:
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+# WebSocket frame formats; a client asks for msgpack as its subprotocol
+FORMATS = ("json", "msgpack") if msgpack is not None else ("json",)
+
+
+def encode(obj, fmt: str = "json") -> Union[str, bytes]:
+    # A text frame for JSON, a binary one for msgpack
+    if fmt == "msgpack":
+        return msgpack.packb(obj)
+    return dumps(obj).decode()
+
+
+def encode_snapshot(version: int, view: bytes, fmt: str = "json") -> Union[str, bytes]:
+    # Wraps an already-encoded view (see ViewCache) without re-encoding it
+    if fmt == "msgpack":
+        # A 3-entry map header followed by its keys and values back to back
+        return b"\x83" + msgpack.packb("type") + msgpack.packb("snapshot") + msgpack.packb("version") \
+            + msgpack.packb(version) + msgpack.packb("state") + view
+    return '{"type":"snapshot","version":%d,"state":%s}' % (version, view.decode())
+
+
+def decode(data: Union[str, bytes]):
+    # Incoming frame: text is JSON, binary is msgpack
+    if isinstance(data, bytes):
+        if msgpack is None:
+            raise ValueError("Binary frames need msgpack")
+        return msgpack.unpackb(data)
+    return json.loads(data)
@@ -0,0 +1,193 @@
+# Server-side phase progression and turn timers.
+#
+# After every commit the engine checks whether the game can move on: once
+# nobody is left to draw the play phase starts, once nobody is left to play
+# the cards are revealed, and RESOLVE_DELAY later the round is resolved and
+# the next one dealt. A player who hasn't moved within TURN_TIMEOUT gets a
+# default move: their draw, or a pass in the play phase; with bots attached
+# a bot plays their card instead.
+#
+# Deadlines for every game sit in one hashed timer wheel driven by a single
+# task: WHEEL_SLOTS buckets of game codes, one per TICK, so scheduling,
+# rescheduling and firing cost the same however many games are running.
+import asyncio
+import contextvars
+import logging
+import math
+from typing import Callable, Dict, List, Set
+
+from .tracing import tracer
+from .utils.helpers import get_next_drawer, get_next_player
+from shared.config import TURN_TIMEOUT, RESOLVE_DELAY
+
+TICK = 0.25  # seconds
+WHEEL_SLOTS = 1024  # one lap is TICK * WHEEL_SLOTS seconds; longer waits take several laps
+
+logger = logging.getLogger(__name__)
+
+
+class PhaseEngine:
+    def __init__(self, manager, turn_timeout: float = TURN_TIMEOUT, resolve_delay: float = RESOLVE_DELAY,
+                 tick: float = TICK, slots: int = WHEEL_SLOTS):
+        self.manager = manager
+        self.turn_timeout = turn_timeout
+        self.resolve_delay = resolve_delay
+        self.tick = tick
+        self.wheel: List[Set[str]] = [set() for _ in range(slots)]
+        # Tick each game is due at; wheel entries that disagree are stale
+        self.deadlines: Dict[str, int] = {}
+        self.now = 0
+        self.dirty: Set[str] = set()
+        self.flushing = False
+        # Called with the game code after the engine changed a game
+        self.on_advance: List[Callable[[str], None]] = []
+        self.timeouts = 0
+        # Optional Bots (bots.py) that play for players who time out
+        self.bots = None
+
+    def changed(self, code: str):
+        # Called by GameManager on every commit; the check runs once the
+        # current request is done, so the engine never nests in a commit
+        self.dirty.add(code)
+        if self.flushing:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop yet: the next tick picks it up
+        self.flushing = True
+        # A fresh context, so engine moves trace as actions of their own
+        loop.call_soon(self.flush, context=contextvars.Context())
+
+    def flush(self):
+        self.flushing = True
+        try:
+            while self.dirty:
+                code = self.dirty.pop()
+                try:
+                    self.advance(code)
+                except Exception:
+                    logger.exception("Phase check failed for game %s", code)
+        finally:
+            self.flushing = False
+
+    def track_all(self):
+        # Pick up games that were running before a restart
+        for code in self.manager.games:
+            self.dirty.add(code)
+
+    def advance(self, code: str):
+        game = self.manager.get_game(code)
+        if game is None:
+            self.cancel(code)
+            return
+        if self.manager.lock(code).locked():
+            self.schedule(code, self.tick)  # someone is mid-move, look again shortly
+            return
+        moved = False
+        while self.step(game):
+            moved = True
+            game = self.manager.get_game(code)
+        self.reschedule(game)
+        if moved:
+            self.notify(code)
+
+    def step(self, game) -> bool:
+        if game.phase == "draw":
+            if get_next_drawer(game) is None or (not game.deck and not game.discard):
+                self.manager.begin_play(game.code)
+                return True
+        elif game.phase == "play":
+            if get_next_player(game) is None:
+                self.manager.begin_resolve(game.code)
+                return True
+        return False
+
+    def reschedule(self, game):
+        if game.phase == "resolve":
+            self.schedule(game.code, self.resolve_delay)
+        elif game.phase in ("draw", "play") and game.current_turn_player_id:
+            self.schedule(game.code, self.turn_timeout)
+        else:
+            self.cancel(game.code)
+
+    def schedule(self, code: str, delay: float):
+        due = self.now + max(1, math.ceil(delay / self.tick))
+        self.deadlines[code] = due
+        self.wheel[due % len(self.wheel)].add(code)
+
+    def cancel(self, code: str):
+        # The wheel entry is dropped lazily when its slot comes round
+        self.deadlines.pop(code, None)
+
+    def expire(self, code: str):
+        with tracer.trace("turn timer", code):
+            self._expire(code)
+
+    def _expire(self, code: str):
+        game = self.manager.get_game(code)
+        if game is None:
+            return
+        if self.manager.lock(code).locked():
+            self.schedule(code, self.tick)
+            return
+        try:
+            if game.phase == "resolve":
+                self.finish_round(code)
+            elif game.phase == "draw" and game.current_turn_player_id:
+                self.timeouts += 1
+                self.manager.draw_cards(code, game.current_turn_player_id)
+            elif game.phase == "play" and game.current_turn_player_id:
+                self.timeouts += 1
+                if self.bots is not None:
+                    # The bot's move is broadcast through its own callbacks
+                    self.bots.play_for(code, game.current_turn_player_id)
+                    return
+                self.manager.pass_turn(code, game.current_turn_player_id)
+        except ValueError:
+            return
+        self.notify(code)
+
+    def finish_round(self, code: str):
+        # Resolve the revealed cards and deal the next round unless the game
+        # is over; players asking to resolve early get the same
+        if self.manager.get_game(code).phase != "resolve":
+            raise ValueError("Not in resolve phase")
+        self.manager.resolve_round(code)
+        if self.manager.get_game(code).phase != "end":
+            self.manager.next_round(code)
+
+    def notify(self, code: str):
+        for callback in self.on_advance:
+            callback(code)
+
+    def advance_clock(self):
+        # One tick: fire whatever in this slot is due now
+        self.now += 1
+        slot = self.wheel[self.now % len(self.wheel)]
+        for code in list(slot):
+            due = self.deadlines.get(code)
+            if due is None or due % len(self.wheel) != self.now % len(self.wheel):
+                slot.discard(code)
+            elif due <= self.now:
+                slot.discard(code)
+                del self.deadlines[code]
+                try:
+                    self.expire(code)
+                except Exception:
+                    logger.exception("Turn timer failed for game %s", code)
+        if self.dirty and not self.flushing:
+            self.flush()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        while True:
+            await asyncio.sleep(self.tick)
+            # Catch up on ticks missed while the loop was busy
+            elapsed = int((loop.time() - start) / self.tick)
+            while self.now < elapsed:
+                self.advance_clock()
+
+    def pending(self) -> int:
+        return len(self.deadlines)
@@ -0,0 +1,228 @@
+# Pub/sub for game updates, so sockets on any node see every game.
+#
+# The node that commits a move publishes the game's patches on the game's
+# channel; every node holding sockets for that game subscribes to it and
+# fans the patches out to its own connections (see main.py). Two backends:
+#
+#   LocalBus   one process, callbacks run inline. The default.
+#   SocketBus  nodes share a Broker over a Unix or TCP socket, e.g.
+#              PUBSUB_URL=unix:/tmp/syf-bus.sock with
+#              python -m backend.pubsub unix:/tmp/syf-bus.sock
+#
+# Both deliver to local subscribers inline, so a move's patch is queued on
+# this node's sockets before the move is acked. Frames between nodes and the
+# broker are one JSON object per line; the broker forwards published lines
+# untouched to every other node subscribed to the channel.
+import argparse
+import asyncio
+import json
+import logging
+import os
+from typing import Callable, Dict, List, Set
+
+from .models import dumps
+
+RECONNECT_DELAY = 1.0  # seconds between attempts to reach the broker
+LINE_LIMIT = 16 * 1024 * 1024  # longest frame a stream will read
+BROKER_BUFFER = 4 * 1024 * 1024  # bytes queued for one node before the broker drops it
+
+logger = logging.getLogger(__name__)
+
+
+def game_channel(code: str) -> str:
+    return "game:" + code
+
+
+class LocalBus:
+    def __init__(self):
+        self.subscribers: Dict[str, List[Callable[[dict], None]]] = {}
+        self.published = 0
+        self.received = 0  # messages that came from other nodes
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def subscribe(self, channel: str, callback: Callable[[dict], None]):
+        self.subscribers.setdefault(channel, []).append(callback)
+
+    def unsubscribe(self, channel: str, callback: Callable[[dict], None]):
+        callbacks = self.subscribers.get(channel)
+        if callbacks and callback in callbacks:
+            callbacks.remove(callback)
+            if not callbacks:
+                del self.subscribers[channel]
+
+    def publish(self, channel: str, message: dict):
+        self.published += 1
+        self.deliver(channel, message)
+
+    def deliver(self, channel: str, message: dict):
+        for callback in list(self.subscribers.get(channel, ())):
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("Subscriber to %s failed", channel)
+
+
+class SocketBus(LocalBus):
+    def __init__(self, address: str, reconnect_delay: float = RECONNECT_DELAY):
+        super().__init__()
+        self.address = address
+        self.reconnect_delay = reconnect_delay
+        self.writer = None
+        self.task = None
+        self.dropped = 0  # published while the broker was unreachable
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+    def subscribe(self, channel: str, callback: Callable[[dict], None]):
+        if channel not in self.subscribers:
+            self._send({"op": "sub", "channel": channel})
+        super().subscribe(channel, callback)
+
+    def unsubscribe(self, channel: str, callback: Callable[[dict], None]):
+        super().unsubscribe(channel, callback)
+        if channel not in self.subscribers:
+            self._send({"op": "unsub", "channel": channel})
+
+    def publish(self, channel: str, message: dict):
+        super().publish(channel, message)
+        if not self._send({"op": "pub", "channel": channel, "data": message}):
+            self.dropped += 1
+
+    def _send(self, frame: dict) -> bool:
+        if self.writer is None:
+            return False
+        self.writer.write(dumps(frame) + b"\n")
+        return True
+
+    async def _run(self):
+        # Stay connected; subscriptions are replayed after every reconnect,
+        # and subscribers notice anything missed by the gap in versions
+        while True:
+            try:
+                reader, writer = await open_connection(self.address)
+            except OSError as e:
+                logger.warning("Pub/sub broker %s unreachable: %s", self.address, e)
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+            self.writer = writer
+            for channel in self.subscribers:
+                self._send({"op": "sub", "channel": channel})
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    frame = json.loads(line)
+                    self.received += 1
+                    self.deliver(frame["channel"], frame["data"])
+            except (OSError, ValueError) as e:
+                logger.warning("Pub/sub connection lost: %s", e)
+            finally:
+                self.writer = None
+                writer.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+
+class Broker:
+    # Stand-in for a real broker: channel membership per connected node
+    def __init__(self):
+        self.channels: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self.forwarded = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        joined: Set[str] = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                frame = json.loads(line)
+                channel = frame["channel"]
+                if frame["op"] == "pub":
+                    for node in list(self.channels.get(channel, ())):
+                        if node is writer:
+                            continue
+                        if node.transport.get_write_buffer_size() > BROKER_BUFFER:
+                            # Not reading: cut it off, it resubscribes and resyncs
+                            node.close()
+                            continue
+                        node.write(line)
+                        self.forwarded += 1
+                elif frame["op"] == "sub":
+                    self.channels.setdefault(channel, set()).add(writer)
+                    joined.add(channel)
+                elif frame["op"] == "unsub":
+                    self._leave(channel, writer)
+                    joined.discard(channel)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Dropping pub/sub node: %s", e)
+        finally:
+            for channel in joined:
+                self._leave(channel, writer)
+            writer.close()
+
+    def _leave(self, channel: str, writer: asyncio.StreamWriter):
+        nodes = self.channels.get(channel)
+        if nodes is not None:
+            nodes.discard(writer)
+            if not nodes:
+                del self.channels[channel]
+
+    async def start(self, address: str):
+        if address.startswith("unix:"):
+            path = address[len("unix:"):]
+            if os.path.exists(path):
+                os.unlink(path)
+            return await asyncio.start_unix_server(self.handle, path, limit=LINE_LIMIT)
+        host, port = _host_port(address)
+        return await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+
+    async def serve(self, address: str):
+        server = await self.start(address)
+        logger.info("Pub/sub broker listening on %s", address)
+        async with server:
+            await server.serve_forever()
+
+
+def _host_port(address: str):
+    if address.startswith("tcp://"):
+        address = address[len("tcp://"):]
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+async def open_connection(address: str):
+    # "unix:/path/to/socket" or "tcp://host:port"
+    if address.startswith("unix:"):
+        return await asyncio.open_unix_connection(address[len("unix:"):], limit=LINE_LIMIT)
+    host, port = _host_port(address)
+    return await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+
+
+def make_bus(url: str = None) -> LocalBus:
+    return SocketBus(url) if url else LocalBus()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pub/sub broker for game updates between nodes")
+    parser.add_argument("address", help="unix:/path/to/socket or tcp://host:port")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(Broker().serve(args.address))
+
+
+if __name__ == "__main__":
+    main()
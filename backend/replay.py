@@ -0,0 +1,417 @@
+# Compact binary replays: a game's seed plus its ordered actions.
+#
+# Every shuffle and random pick comes from the game's seed and version (see
+# GameState.rng), so the seed, the players and the moves made are enough to
+# rebuild a game exactly. A replay stores them with players as seat numbers
+# and card ids as integers, typically a few hundred bytes a game, followed
+# by a digest of the final state that a re-run must reproduce. Exported
+# games take that digest from the state the server committed (its game
+# store, or the live manager via /debug/replay), never from a re-run, so a
+# replay that diverges from what players saw fails verify.
+#
+#   python -m backend.replay record --games 5000 corpus.syfr   # simulated games
+#   python -m backend.replay export <ACTION_LOG_DIR> bug.syfr   # games from a server's action log
+#   python -m backend.replay verify corpus.syfr                # re-run, compare digests
+#   python -m backend.replay show bug.syfr                     # actions as JSON lines
+#
+# A file is MAGIC and a format byte, then replays back to back, each one
+# prefixed with its length, so tools stream through files of any size.
+# Inside a replay, numbers are unsigned LEB128 varints and strings are a
+# varint length and UTF-8:
+#
+#   code, seed, card counts (n, then n x card code, copies; 0 = standard
+#   deck), players (n, then n x id, username, flags), actions (n, then n x
+#   op and operands), 8-byte digest
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional
+
+from .cards.definitions import CARD_CODES, CARD_DEFS, CardType
+from .game_store import make_store
+from .models import GameState, Player, dumps, game_dict
+from shared.config import GAME_STORE_PATH, GAME_STORE_SHARDS
+
+MAGIC = b"SYFR"
+FORMAT = 1
+BATCH_SIZE = 500  # replays per worker task in verify
+
+# Operation codes; the host's create_game is implied by the header
+OPS = ("join_game", "start_game", "draw_cards", "play_card", "pass_turn",
+       "begin_play", "begin_resolve", "resolve_round", "next_round")
+OP_CODES = {op: code for code, op in enumerate(OPS)}
+SEAT_OPS = {"draw_cards", "pass_turn"}  # operand: the player's seat
+BOT = 1  # player flag
+
+logger = logging.getLogger(__name__)
+
+
+def state_digest(game: GameState) -> bytes:
+    # The whole game except whose turn it is, which HeadlessGameManager
+    # doesn't track
+    state = game_dict(game)
+    del state["current_turn_player_id"]
+    return hashlib.blake2b(dumps(state), digest_size=8).digest()
+
+
+def _varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _string(out: bytearray, text: str):
+    data = text.encode()
+    _varint(out, len(data))
+    out += data
+
+
+class Reader:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def varint(self) -> int:
+        data, pos = self.data, self.pos
+        n = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            n |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                self.pos = pos
+                return n
+            shift += 7
+
+    def string(self) -> str:
+        size = self.varint()
+        self.pos += size
+        return self.data[self.pos - size:self.pos].decode()
+
+    def raw(self, size: int) -> bytes:
+        self.pos += size
+        return self.data[self.pos - size:self.pos]
+
+
+class GameRecording:
+    # One game's replay so far, in encoded form
+    def __init__(self, code: str, host: dict, counts: Optional[Dict[str, int]], seed: int):
+        self.code = code
+        self.seed = seed
+        self.counts = counts
+        self.players: List[dict] = []
+        self.seats: Dict[str, int] = {}
+        self.actions = bytearray()
+        self.count = 0
+        self.add_player(host)
+
+    def add_player(self, player: dict):
+        self.seats[player["id"]] = len(self.players)
+        self.players.append(player)
+
+    def add(self, op: str, args: list):
+        out = self.actions
+        out.append(OP_CODES[op])
+        if op == "join_game":
+            self.add_player(args[0])
+        elif op in SEAT_OPS:
+            _varint(out, self.seats[args[0]])
+        elif op == "play_card":
+            player_id, card_id, target_id = args
+            _varint(out, self.seats[player_id])
+            _varint(out, int(card_id))
+            # Seat + 1, or 0 and the raw id for a target that isn't seated
+            target = self.seats.get(target_id)
+            if target is None:
+                out.append(0)
+                _string(out, target_id)
+            else:
+                _varint(out, target + 1)
+        self.count += 1
+
+    def encode(self, digest: bytes) -> bytes:
+        out = bytearray()
+        _string(out, self.code)
+        _varint(out, self.seed)
+        counts = self.counts or {}
+        _varint(out, len(counts))
+        for name, copies in counts.items():
+            _varint(out, CARD_CODES[CardType(name)])
+            _varint(out, copies)
+        _varint(out, len(self.players))
+        for player in self.players:
+            _string(out, player["id"])
+            _string(out, player["username"])
+            out.append(BOT if player.get("is_bot") else 0)
+        _varint(out, self.count)
+        out += self.actions
+        out += digest
+        return bytes(out)
+
+
+class Recorder:
+    # Builds replays from GameManager commit records: attach it as
+    # manager.log, or feed it records read back from an action log. Games
+    # whose create_game it never saw are ignored.
+    def __init__(self):
+        self.games: Dict[str, GameRecording] = {}
+
+    def append(self, record):
+        op, code, *args = record
+        if op == "create_game":
+            host, counts, seed = args
+            self.games[code] = GameRecording(code, host, counts, seed)
+        elif op == "restore_game":
+            pass  # reloaded from a spill file unchanged; nothing to replay
+        elif code in self.games:
+            self.games[code].add(op, args)
+
+    def export(self, game: GameState) -> bytes:
+        # The game's replay, checked against its current state
+        return self.games.pop(game.code).encode(state_digest(game))
+
+
+def parse(data: bytes) -> dict:
+    r = Reader(data)
+    code = r.string()
+    seed = r.varint()
+    counts = {CARD_DEFS[r.varint()].type: r.varint() for _ in range(r.varint())} or None
+    players = []
+    for _ in range(r.varint()):
+        player_id, username = r.string(), r.string()
+        players.append(Player(id=player_id, username=username, is_bot=bool(r.raw(1)[0] & BOT)))
+    actions = []
+    for _ in range(r.varint()):
+        op = OPS[r.raw(1)[0]]
+        if op in SEAT_OPS:
+            actions.append((op, players[r.varint()].id))
+        elif op == "play_card":
+            player_id = players[r.varint()].id
+            card_id = str(r.varint())
+            target = r.varint()
+            actions.append((op, player_id, card_id, players[target - 1].id if target else r.string()))
+        else:
+            actions.append((op,))
+    return {"code": code, "seed": seed, "counts": counts, "players": players, "actions": actions,
+            "digest": r.raw(8)}
+
+
+def run(replay: dict, manager=None) -> GameState:
+    # Re-run a parsed replay on a fresh (by default headless) manager
+    if manager is None:
+        from .simulation import HeadlessGameManager
+        manager = HeadlessGameManager()
+    code, players = replay["code"], replay["players"]
+    manager.create_game(code, players[0], replay["counts"], replay["seed"])
+    joined = 1
+    for op, *args in replay["actions"]:
+        if op == "join_game":
+            manager.join_game(code, players[joined])
+            joined += 1
+        else:
+            getattr(manager, op)(code, *args)
+    return manager.get_game(code)
+
+
+def verify(data: bytes) -> bool:
+    try:
+        replay = parse(data)
+        return state_digest(run(replay)) == replay["digest"]
+    except (ValueError, IndexError, KeyError):
+        return False
+
+
+# Files
+
+def write_header(f: BinaryIO):
+    f.write(MAGIC + bytes([FORMAT]))
+
+
+def write_replay(f: BinaryIO, data: bytes):
+    prefix = bytearray()
+    _varint(prefix, len(data))
+    f.write(prefix + data)
+
+
+def read_replays(f: BinaryIO) -> Iterator[bytes]:
+    header = f.read(len(MAGIC) + 1)
+    if header[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a replay file")
+    if header[len(MAGIC)] != FORMAT:
+        raise ValueError(f"Unsupported replay format {header[len(MAGIC)]}")
+    while True:
+        size = shift = 0
+        while True:
+            byte = f.read(1)
+            if not byte:
+                if shift:
+                    raise ValueError("Truncated replay file")
+                return
+            size |= (byte[0] & 0x7F) << shift
+            shift += 7
+            if byte[0] < 0x80:
+                break
+        data = f.read(size)
+        if len(data) < size:
+            raise ValueError("Truncated replay file")
+        yield data
+
+
+def record_games(games: int, players: int, seed: int = 0) -> Iterator[bytes]:
+    # Simulated games with random policies, seeds seed..seed + games - 1
+    from .simulation import HeadlessGameManager, play_game
+
+    for game_seed in range(seed, seed + games):
+        manager = HeadlessGameManager()
+        manager.log = Recorder()
+        play_game(game_seed, ["random"] * players, manager=manager)
+        yield manager.log.export(manager.get_game("SIM"))
+
+
+def export_log(directory: str, committed: Callable[[str], Optional[GameState]],
+               codes: Optional[set] = None) -> Iterator[bytes]:
+    # Every game created within the action log's current segments (or just
+    # `codes`), with the digest of its state as committed(code) returns it
+    # from the server; games the server no longer has are left out
+    from .action_log import _files, replay as replay_record
+    from .simulation import HeadlessGameManager
+
+    manager = HeadlessGameManager()
+    recorder = Recorder()
+    for _, path in _files(directory, "segment"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn write at the tail of the last segment
+                if codes is not None and record[1] not in codes:
+                    continue
+                if record[0] != "create_game" and record[1] not in recorder.games:
+                    continue  # created before these segments
+                recorder.append(record)
+                replay_record(manager, record)
+    for code in list(recorder.games):
+        game = committed(code)
+        if game is None:
+            logger.warning("No committed state for game %s; not exported", code)
+            recorder.games.pop(code)
+            continue
+        if state_digest(manager.get_game(code)) != state_digest(game):
+            # Still exported: this is the replay that reproduces the bug
+            logger.warning("Re-running game %s from the log does not reach the server's state", code)
+        yield recorder.export(game)
+
+
+def verify_batch(batch: List[bytes]) -> List[int]:
+    # Indexes within the batch that failed
+    return [i for i, data in enumerate(batch) if not verify(data)]
+
+
+def verify_file(path: str, workers: Optional[int] = None, batch_size: int = BATCH_SIZE) -> dict:
+    failed, total = [], 0
+    started = time.perf_counter()
+
+    def batches(f):
+        batch = []
+        for data in read_replays(f):
+            batch.append(data)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    with open(path, "rb") as f:
+        if workers == 1:
+            for batch in batches(f):
+                failed += [total + i for i in verify_batch(batch)]
+                total += len(batch)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Bounded read-ahead: a few batches per worker in flight
+                pending = []
+                limit = 2 * (workers or os.cpu_count())
+                for batch in batches(f):
+                    pending.append((total, pool.submit(verify_batch, batch)))
+                    total += len(batch)
+                    if len(pending) >= limit:
+                        offset, future = pending.pop(0)
+                        failed += [offset + i for i in future.result()]
+                for offset, future in pending:
+                    failed += [offset + i for i in future.result()]
+    elapsed = time.perf_counter() - started
+    return {
+        "replays": total,
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "replays_per_second": round(total / elapsed, 1) if elapsed else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record, export, verify and show game replays")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="simulate games and record them")
+    record.add_argument("output")
+    record.add_argument("--games", type=int, default=1000)
+    record.add_argument("--players", type=int, default=4)
+    record.add_argument("--seed", type=int, default=0)
+    export = commands.add_parser("export", help="replays of the games in an action log directory")
+    export.add_argument("directory")
+    export.add_argument("output")
+    export.add_argument("--store", default=GAME_STORE_PATH,
+                        help="the server's sqlite game store, for the committed final states")
+    export.add_argument("--shards", type=int, default=GAME_STORE_SHARDS)
+    check = commands.add_parser("verify", help="re-run replays and compare final states")
+    check.add_argument("input")
+    check.add_argument("--workers", type=int, default=os.cpu_count())
+    check.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    show = commands.add_parser("show", help="print replays as JSON lines")
+    show.add_argument("input")
+    args = parser.parse_args(argv)
+
+    if args.command == "export" and not os.path.isdir(args.store):
+        # Final states come from the server, never from re-running the log
+        parser.error(f"no game store at {args.store}: export needs the server's sqlite store "
+                     "(GAME_STORE=sqlite); with GAME_STORE=memory, fetch /debug/replay/<code> from the server")
+    if args.command in ("record", "export"):
+        replays = (record_games(args.games, args.players, args.seed) if args.command == "record"
+                   else export_log(args.directory, make_store("sqlite", args.store, args.shards).get))
+        count = size = 0
+        with open(args.output, "wb") as f:
+            write_header(f)
+            for data in replays:
+                write_replay(f, data)
+                count += 1
+                size += len(data)
+        print(f"{count} replays, {size // max(count, 1)} bytes each on average")
+    elif args.command == "verify":
+        result = verify_file(args.input, args.workers, args.batch_size)
+        print(json.dumps(result))
+        if result["failed"]:
+            sys.exit(1)
+    else:
+        with open(args.input, "rb") as f:
+            for data in read_replays(f):
+                replay = parse(data)
+                print(json.dumps({
+                    "code": replay["code"],
+                    "seed": replay["seed"],
+                    "counts": {t.value: n for t, n in replay["counts"].items()} if replay["counts"] else None,
+                    "players": [p.username for p in replay["players"]],
+                    "actions": replay["actions"],
+                    "digest": replay["digest"].hex(),
+                }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
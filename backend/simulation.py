@@ -0,0 +1,244 @@
+# Headless batch simulation of complete games, for balancing the deck.
+#
+# Games run draw -> play -> resolve_round -> next_round on the regular
+# GameManager with pluggable player policies, spread over a process pool.
+# Every game has its own seed, and every phase change goes through the
+# manager, so any single game can be recorded and replayed (see replay.py).
+#
+# Throughput: a full-rules game is about a hundred manager calls, which puts
+# this at roughly 500 four-player games/s per worker, so a machine does
+# cores x 500. That is enough for policy and win-rate studies over tens of
+# thousands of games, but not for sweeping deck counts at tens of thousands
+# of games/s; those sweeps belong on the vectorized round kernel in
+# batch_resolve.py, which trades policies and exact hands for numpy rows.
+#
+#   python -m backend.simulation --games 20000 --players 4 --policy random --policy aggressive
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from .cards.definitions import CARD_DEFS, CardType
+from .game_manager import GameManager
+from .models import Player
+from .utils.helpers import get_next_drawer, get_next_player
+
+MAX_ROUNDS = 100  # games still running after this many rounds count as draws
+BATCH_SIZE = 500
+
+
+class HeadlessGameManager(GameManager):
+    # Nothing watches simulated games: skip patch history and wakeups, but
+    # still hand commits to a log (e.g. a replay Recorder) if one is set
+    def _commit(self, game, record):
+        game.version += 1
+        if self.log is not None:
+            self.log.append(record)
+
+
+# Policies pick (card_id, target_id) for the player whose turn it is
+
+def random_policy(game, player, rng):
+    card = rng.choice(player.hand)
+    target = rng.choice([p for p in game.players if not p.eliminated])
+    return card.id, target.id
+
+
+SELF_CARDS = {CardType.SHIELD, CardType.DRINK, CardType.CRYSTAL}
+ATTACK_CARDS = {CardType.DAGGER, CardType.BOW, CardType.FIREBALL, CardType.BATTLE_AXE}
+
+
+def aggressive_policy(game, player, rng):
+    # Attack the healthiest opponent, keep helpful cards for yourself
+    opponents = [p for p in game.players if not p.eliminated and p is not player]
+    attacks = [c for c in player.hand if c.type in ATTACK_CARDS]
+    card = attacks[0] if attacks else rng.choice(player.hand)
+    if card.type in SELF_CARDS or not opponents:
+        return card.id, player.id
+    if card.type == CardType.BATTLE_AXE:
+        shielded = [p for p in opponents if p.shield > 0]
+        if shielded:
+            return card.id, shielded[0].id
+    target = max(opponents, key=lambda p: (p.health, -game.seat(p.id)))
+    return card.id, target.id
+
+
+POLICIES = {
+    "random": random_policy,
+    "aggressive": aggressive_policy,
+}
+
+
+def play_game(seed: int, policy_names: List[str], counts: Optional[Dict[CardType, int]] = None,
+              manager: Optional[GameManager] = None) -> dict:
+    rng = random.Random(seed)
+    policies = [POLICIES[name] for name in policy_names]
+    if manager is None:
+        manager = HeadlessGameManager()
+    code = "SIM"
+    players = [Player(id=f"p{i}", username=f"p{i}") for i in range(len(policies))]
+    manager.create_game(code, players[0], counts, seed)
+    for player in players[1:]:
+        manager.join_game(code, player)
+    manager.start_game(code)
+    game = manager.get_game(code)
+
+    plays = [Counter() for _ in players]
+    rounds = 0
+    while game.phase != "end" and rounds < MAX_ROUNDS:
+        rounds += 1
+        drawer = get_next_drawer(game)
+        while drawer:
+            before = len(drawer.hand)
+            manager.draw_cards(code, drawer.id)
+            if len(drawer.hand) == before:
+                break  # deck and discard are both empty
+            drawer = get_next_drawer(game)
+
+        manager.begin_play(code)
+        player = get_next_player(game)
+        while player:
+            seat = game.seat(player.id)
+            card_id, target_id = policies[seat](game, player, rng)
+            card_type = next(c.type for c in player.hand if c.id == card_id)
+            plays[seat][card_type.value] += 1
+            manager.play_card(code, player.id, card_id, target_id)
+            player = get_next_player(game)
+
+        manager.begin_resolve(code)
+        manager.resolve_round(code)
+        if game.phase != "end":
+            manager.next_round(code)
+
+    winner = next((i for i, p in enumerate(game.players) if p.username == game.winner), None)
+    return {"seed": seed, "winner": winner, "rounds": rounds, "plays": plays}
+
+
+def run_batch(seeds: List[int], policy_names: List[str], counts=None) -> dict:
+    # Aggregates only, so workers send back a few hundred bytes per batch
+    stats = {
+        "games": 0, "draws": 0, "rounds": 0, "min_rounds": None, "max_rounds": 0,
+        "seat_wins": Counter(), "card_plays": Counter(), "winner_card_plays": Counter(),
+    }
+    for seed in seeds:
+        result = play_game(seed, policy_names, counts)
+        stats["games"] += 1
+        stats["rounds"] += result["rounds"]
+        stats["max_rounds"] = max(stats["max_rounds"], result["rounds"])
+        if stats["min_rounds"] is None or result["rounds"] < stats["min_rounds"]:
+            stats["min_rounds"] = result["rounds"]
+        for played in result["plays"]:
+            stats["card_plays"].update(played)
+        if result["winner"] is None:
+            stats["draws"] += 1
+        else:
+            stats["seat_wins"][result["winner"]] += 1
+            stats["winner_card_plays"].update(result["plays"][result["winner"]])
+    return stats
+
+
+def merge_stats(total: dict, stats: dict) -> dict:
+    for key in ("games", "draws", "rounds"):
+        total[key] += stats[key]
+    total["max_rounds"] = max(total["max_rounds"], stats["max_rounds"])
+    if stats["min_rounds"] is not None and (total["min_rounds"] is None or stats["min_rounds"] < total["min_rounds"]):
+        total["min_rounds"] = stats["min_rounds"]
+    for key in ("seat_wins", "card_plays", "winner_card_plays"):
+        total[key].update(stats[key])
+    return total
+
+
+def simulate(games: int, policy_names: List[str], seed: int = 0, workers: Optional[int] = None,
+             counts: Optional[Dict[CardType, int]] = None, batch_size: int = BATCH_SIZE) -> dict:
+    # Game i always gets seed + i, whatever the worker count or batch size
+    seeds = list(range(seed, seed + games))
+    batches = [seeds[i:i + batch_size] for i in range(0, games, batch_size)]
+    total = run_batch([], policy_names)
+    started = time.perf_counter()
+    if workers == 1:
+        for batch in batches:
+            merge_stats(total, run_batch(batch, policy_names, counts))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_batch, batch, policy_names, counts) for batch in batches]
+            for future in futures:
+                merge_stats(total, future.result())
+    elapsed = time.perf_counter() - started
+    return report(total, policy_names, elapsed)
+
+
+def report(stats: dict, policy_names: List[str], elapsed: float) -> dict:
+    games = stats["games"] or 1
+    players = len(policy_names)
+    policy_wins = Counter()
+    for seat, wins in stats["seat_wins"].items():
+        policy_wins[policy_names[seat]] += wins
+    return {
+        "games": stats["games"],
+        "seconds": round(elapsed, 3),
+        "games_per_second": round(stats["games"] / elapsed, 1) if elapsed else None,
+        "policies": policy_names,
+        "seat_win_rate": {seat: stats["seat_wins"][seat] / games for seat in range(players)},
+        "policy_win_rate": {
+            name: policy_wins[name] / (games * policy_names.count(name)) for name in set(policy_names)
+        },
+        "draw_rate": stats["draws"] / games,
+        "rounds": {
+            "mean": stats["rounds"] / games,
+            "min": stats["min_rounds"],
+            "max": stats["max_rounds"],
+        },
+        # winner_share: fraction of a card's plays made by the eventual
+        # winner; 1 / players means the card doesn't move the needle
+        "cards": {
+            card: {
+                "plays": plays,
+                "winner_share": stats["winner_card_plays"][card] / plays,
+            }
+            for card, plays in sorted(stats["card_plays"].items())
+        },
+    }
+
+
+def parse_counts(values: List[str]) -> Optional[Dict[CardType, int]]:
+    # ["Dagger=6", "Bomb=0"] -> standard deck with those counts replaced
+    if not values:
+        return None
+    counts = {d.type: d.count for d in CARD_DEFS}
+    for value in values:
+        name, _, count = value.partition("=")
+        counts[CardType(name)] = int(count)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run headless Stab Your Friends games")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--policy", action="append", choices=sorted(POLICIES),
+                        help="policy per seat, repeated; the last one fills remaining seats")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--count", action="append", default=[], metavar="CARD=N",
+                        help="override how many copies of a card the deck holds")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    policy_names = (args.policy or ["random"])[:args.players]
+    policy_names += [policy_names[-1]] * (args.players - len(policy_names))
+    result = simulate(args.games, policy_names, args.seed, args.workers, parse_counts(args.count), args.batch_size)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
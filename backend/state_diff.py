@@ -0,0 +1,58 @@
+# Compact state summaries and version-to-version patches for broadcasts.
+#
+# A summary only keeps what a client can see change (ids, counts, flags), so
+# diffing two of them never walks the deck or the discard pile.
+
+from .models import card_dict, player_dict, plays_dict
+
+PLAYER_FIELDS = ("username", "health", "is_royal", "eliminated", "snakebit", "entranced", "is_primed", "shield", "is_bot")
+GAME_FIELDS = ("phase", "round", "crown_index", "winner", "current_turn_player_id")
+
+
+def summarize(game):
+    summary = {field: getattr(game, field) for field in GAME_FIELDS}
+    summary["deck_size"] = len(game.deck)
+    summary["discard_size"] = len(game.discard)
+    summary["played_cards"] = {
+        pid: tuple((play["card"].id, play["target_id"]) for play in plays)
+        for pid, plays in game.played_cards.items()
+    }
+    summary["players"] = {
+        p.id: (tuple(getattr(p, field) for field in PLAYER_FIELDS), tuple(c.id for c in p.hand))
+        for p in game.players
+    }
+    return summary
+
+
+def diff_states(before, after, game):
+    # Build the patch that turns `before` into `after`; `game` supplies the
+    # card payloads for hands and plays that changed.
+    patch = {"type": "delta"}
+    if before is None:
+        before = {"players": {}, "played_cards": {}}
+    for key in GAME_FIELDS + ("deck_size", "discard_size"):
+        if before.get(key) != after[key]:
+            patch[key] = after[key]
+    if before["played_cards"] != after["played_cards"]:
+        patch["played_cards"] = plays_dict(game.played_cards)
+
+    players = {}
+    for p in game.players:
+        old = before["players"].get(p.id)
+        new_fields, new_hand = after["players"][p.id]
+        if old is None:
+            players[p.id] = player_dict(p)
+            continue
+        old_fields, old_hand = old
+        changed = {
+            field: value
+            for field, old_value, value in zip(PLAYER_FIELDS, old_fields, new_fields)
+            if old_value != value
+        }
+        if old_hand != new_hand:
+            changed["hand"] = [card_dict(c) for c in p.hand]
+        if changed:
+            players[p.id] = changed
+    if players:
+        patch["players"] = players
+    return patch
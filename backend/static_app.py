@@ -0,0 +1,9 @@
+# The frontend on its own, for deployments that scale it apart from the
+# game API (run the API with SERVE_STATIC=0):
+#
+#   uvicorn backend.static_app:app --port 8080
+from starlette.applications import Starlette
+from starlette.staticfiles import StaticFiles
+
+app = Starlette()
+app.mount("/", StaticFiles(directory="frontend", html=True), name="frontend")
@@ -1,10 +1,27 @@
+# Telegram bot that opens the game WebApp. Runs as its own process, apart
+# from the web server:
+#
+#   TELEGRAM_BOT_TOKEN=... python -m backend.telegram_bot
+import json
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import ApplicationBuilder, MessageHandler, CommandHandler, ContextTypes, filters
 
-from shared.config import WEB_APP_URL
+from shared.config import WEB_APP_URL, TELEGRAM_BOT_TOKEN
 
 web_app = WebAppInfo(url=WEB_APP_URL)
 
+# Welcome message with the web app button
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    keyboard = [
+        [InlineKeyboardButton("▶️ Play Stab Your Friends", web_app=web_app)]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text(
+        "Welcome to Stab Your Friends!\nTap below to start the game.",
+        reply_markup=reply_markup
+    )
+
 # Command to show web app button
 async def open_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
@@ -16,7 +33,6 @@ async def open_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # Handle web app data
 async def handle_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.web_app_data:
-        import json
         data = json.loads(update.message.web_app_data.data)
         action = data.get("action")
         code = data.get("code")
@@ -35,11 +51,20 @@ async def handle_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 game["players"].append(update.effective_user.username)
                 await update.message.reply_text(f"✅ Joined game {code}. Players: {', '.join(game['players'])}")
 
-# Start the bot
-# import os
-# BOT_TOKEN = os.getenv("8068386210:AAEiyCP3-0PVksVkX8fgomIj5JiwVuAqAbY")  
 
-app = ApplicationBuilder().token("8068386210:AAEiyCP3-0PVksVkX8fgomIj5JiwVuAqAbY").build()
-app.add_handler(CommandHandler("game", open_webapp))
-app.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA, handle_webapp))
-app.run_polling()
\ No newline at end of file
+def build_app(token: str):
+    app = ApplicationBuilder().token(token).build()
+    app.add_handler(CommandHandler("start", start_command))
+    app.add_handler(CommandHandler("game", open_webapp))
+    app.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA, handle_webapp))
+    return app
+
+
+def main():
+    if not TELEGRAM_BOT_TOKEN:
+        raise SystemExit("Set TELEGRAM_BOT_TOKEN to run the bot")
+    build_app(TELEGRAM_BOT_TOKEN).run_polling()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+# Player tokens: proof that a request comes from the player who joined.
+#
+# A token is an HMAC of the game code and player id, issued by /create_game,
+# /join_game and the matchmaking queue. Nothing is stored, so any node with
+# the same PLAYER_TOKEN_SECRET can check it.
+import hashlib
+import hmac
+import secrets
+from typing import Optional
+
+from shared.config import PLAYER_TOKEN_SECRET
+
+_secret = (PLAYER_TOKEN_SECRET or secrets.token_hex(32)).encode()
+
+
+def player_token(game_code: str, player_id: str) -> str:
+    return hmac.new(_secret, f"{game_code}:{player_id}".encode(), hashlib.sha256).hexdigest()
+
+
+def check_token(game_code: str, player_id: Optional[str], token: Optional[str]) -> bool:
+    if not player_id or not token:
+        return False
+    return hmac.compare_digest(player_token(game_code, player_id), token)
@@ -0,0 +1,259 @@
+# Per-game action tracing and a sampling profiler, both opt-in.
+#
+# An action (an HTTP POST, a WebSocket move or a turn timer firing) opens a
+# root span; GameManager methods, card effects and the broadcast nest under
+# it. Finished traces are kept per game code, and any action slower than
+# SLOW_ACTION_MS is logged with its span tree. With tracing off, span()
+# returns a shared no-op, so instrumented code pays one call and a check.
+#
+# The profiler picks PROFILE_RATE of actions; while any picked action is in
+# flight a background thread samples the event loop thread's stack every
+# few milliseconds. profile() returns the samples as collapsed stacks
+# ("outer;inner;leaf count" per line), ready for flamegraph.pl or speedscope.
+import functools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional
+
+from shared.config import TRACING, SLOW_ACTION_MS, PROFILE_RATE
+
+TRACES_PER_GAME = 20
+TRACED_GAMES = 1000  # games whose recent traces are kept, least recently traced dropped first
+SAMPLE_INTERVAL = 0.005  # seconds between profiler samples
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end = None
+        self.children: List["Span"] = []
+
+    def ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1e3
+
+    def to_dict(self) -> dict:
+        entry = {"name": self.name, "ms": round(self.ms(), 3)}
+        if self.attrs:
+            entry["attrs"] = self.attrs
+        if self.children:
+            entry["children"] = [child.to_dict() for child in self.children]
+        return entry
+
+    def format(self, depth: int = 0) -> Iterable[str]:
+        attrs = " ".join(f"{k}={v}" for k, v in self.attrs.items())
+        yield f"{'  ' * depth}{self.name} {self.ms():.2f}ms {attrs}".rstrip()
+        for child in self.children:
+            yield from child.format(depth + 1)
+
+
+class Trace:
+    __slots__ = ("game_code", "root", "sampled", "finished_at")
+
+    def __init__(self, root: Span, game_code: Optional[str]):
+        self.root = root
+        self.game_code = game_code
+        self.sampled = False
+        self.finished_at = None
+
+
+_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class _ChildSpan:
+    __slots__ = ("name", "attrs", "span", "token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.span = Span(self.name, self.attrs)
+        _span.get().children.append(self.span)
+        self.token = _span.set(self.span)
+        return self.span
+
+    def __exit__(self, *exc):
+        self.span.end = time.perf_counter()
+        _span.reset(self.token)
+        return False
+
+
+class _RootSpan:
+    def __init__(self, tracer: "Tracer", name: str, game_code: Optional[str]):
+        self.tracer = tracer
+        self.name = name
+        self.game_code = game_code
+
+    def __enter__(self):
+        self.trace = Trace(Span(self.name, {}), self.game_code)
+        self.tokens = (_span.set(self.trace.root), _trace.set(self.trace))
+        if self.tracer.profiler.should_sample():
+            self.trace.sampled = True
+            self.tracer.profiler.enter()
+        return self.trace.root
+
+    def __exit__(self, *exc):
+        self.trace.root.end = time.perf_counter()
+        _span.reset(self.tokens[0])
+        _trace.reset(self.tokens[1])
+        if self.trace.sampled:
+            self.tracer.profiler.exit()
+        self.tracer.finished(self.trace)
+        return False
+
+
+class SamplingProfiler:
+    def __init__(self, rate: float = 0.0, interval: float = SAMPLE_INTERVAL):
+        self.rate = rate
+        self.interval = interval
+        self.active = 0  # picked actions in flight
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.thread = None
+        self.target = None  # id of the thread being sampled
+
+    def configure(self, rate: float, interval: Optional[float] = None):
+        # Call from the event loop thread: that's the one that gets sampled
+        self.rate = rate
+        if interval:
+            self.interval = interval
+        if rate > 0 and self.thread is None:
+            self.target = threading.get_ident()
+            self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self.thread.start()
+
+    def should_sample(self) -> bool:
+        return self.rate > 0 and random.random() < self.rate
+
+    def enter(self):
+        self.active += 1
+
+    def exit(self):
+        self.active -= 1
+
+    def _run(self):
+        while self.rate > 0:
+            time.sleep(self.interval)
+            if not self.active:
+                continue
+            frame = sys._current_frames().get(self.target)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+                self.samples += 1
+        self.thread = None
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def reset(self):
+        self.stacks.clear()
+        self.samples = 0
+
+
+def collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Tracer:
+    def __init__(self, enabled: bool = TRACING, slow_ms: float = SLOW_ACTION_MS, profile_rate: float = PROFILE_RATE):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.profiler = SamplingProfiler(profile_rate)
+        self.traces: "OrderedDict[str, deque]" = OrderedDict()
+        self.slow = 0
+
+    def trace(self, name: str, game_code: Optional[str] = None):
+        # Root span for an action, or a child span when one is already open
+        if _span.get() is not None:
+            if game_code and _trace.get().game_code is None:
+                _trace.get().game_code = game_code
+            return _ChildSpan(name, {}) if self.enabled else NO_SPAN
+        if not self.enabled and self.profiler.rate <= 0:
+            return NO_SPAN
+        return _RootSpan(self, name, game_code)
+
+    def span(self, name: str, **attrs):
+        if not self.enabled or _span.get() is None:
+            return NO_SPAN
+        return _ChildSpan(name, attrs)
+
+    def finished(self, trace: Trace):
+        if not self.enabled or trace.game_code is None:
+            return
+        trace.finished_at = time.time()
+        recent = self.traces.get(trace.game_code)
+        if recent is None:
+            recent = self.traces[trace.game_code] = deque(maxlen=TRACES_PER_GAME)
+            if len(self.traces) > TRACED_GAMES:
+                self.traces.popitem(last=False)
+        else:
+            self.traces.move_to_end(trace.game_code)
+        recent.append(trace)
+        if trace.root.ms() >= self.slow_ms:
+            self.slow += 1
+            logger.warning("Slow action in game %s:\n%s", trace.game_code, "\n".join(trace.root.format()))
+
+    def recent(self, game_code: str) -> List[Dict]:
+        return [
+            {"game_code": trace.game_code, "finished_at": trace.finished_at, **trace.root.to_dict()}
+            for trace in self.traces.get(game_code, ())
+        ]
+
+
+tracer = Tracer()
+
+
+def trace_methods(obj, methods: Iterable[str]):
+    # Wrap obj.<method>(code, ...) in a span named after the method; it opens
+    # the root itself when nothing else did, e.g. for turn timers
+    for name in methods:
+        method = getattr(obj, name)
+
+        def traced(*args, _method=method, _name=name, **kwargs):
+            with tracer.trace(_name, args[0] if args else None):
+                return _method(*args, **kwargs)
+        setattr(obj, name, functools.wraps(method)(traced))
+
+
+class TracingMiddleware:
+    # Opens the root span for POST requests; reads aren't actions and long
+    # polls would drown the slow-action log
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        with tracer.trace("POST " + scope["path"]) as root:
+            await self.app(scope, receive, send)
+            if root is not None and scope.get("route") is not None:
+                root.name = "POST " + scope["route"].path
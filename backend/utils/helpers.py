@@ -1 +1,62 @@
-# Utility functions (e.g., get_next_player) will be implemented here.
\ No newline at end of file
+# Utility functions (e.g., get_next_player) for turn order.
+#
+# Every phase runs clockwise starting from the royal highness.
+
+HAND_SIZE = 4
+PLAYS_PER_ROUND = 2
+
+
+def seats_from_crown(game):
+    n = len(game.players)
+    return [game.players[(game.crown_index + i) % n] for i in range(n)]
+
+
+def get_next_drawer(game):
+    # First alive player, from the crown, whose hand isn't full yet
+    players, n = game.players, len(game.players)
+    for i in range(game.crown_index, game.crown_index + n):
+        player = players[i % n]
+        if not player.eliminated and len(player.hand) < HAND_SIZE:
+            return player
+    return None
+
+
+def can_play(game, player) -> bool:
+    if player.eliminated or player.snakebit or player.entranced or not player.hand:
+        return False
+    if player.id in game.passed:
+        return False
+    return len(game.played_cards.get(player.id, [])) < PLAYS_PER_ROUND
+
+
+def get_next_player(game):
+    # Plays go round the table one card at a time: the next player is the
+    # first one, from the crown, with the fewest plays this round. Called on
+    # every play (and by every simulated turn), so can_play is inlined and
+    # the scan stops at the first player who hasn't played yet.
+    players, n = game.players, len(game.players)
+    played, passed = game.played_cards, game.passed
+    next_player, fewest = None, PLAYS_PER_ROUND
+    for i in range(game.crown_index, game.crown_index + n):
+        player = players[i % n]
+        if player.eliminated or player.snakebit or player.entranced or not player.hand:
+            continue
+        if player.id in passed:
+            continue
+        plays = len(played.get(player.id, ()))
+        if plays < fewest:
+            if not plays:
+                return player
+            next_player, fewest = player, plays
+    return next_player
+
+
+def current_turn(game):
+    # Whose move the game is waiting on, if anyone's
+    if game.phase == "draw":
+        player = get_next_drawer(game)
+    elif game.phase == "play":
+        player = get_next_player(game)
+    else:
+        player = None
+    return player.id if player else None
@@ -0,0 +1,89 @@
+# Per-player projections of a GameState.
+#
+# A player only sees their own hand and their own face-down plays; everyone
+# else shows up as counts, and the deck is just a size. Serialized views are
+# cached per (game, seated player, format) and reused until the game's
+# version changes. Callers pass the viewer only once their token checks out
+# (see tokens.py).
+
+from typing import Dict, Optional, Tuple
+
+from .models import card_dict, plays_dict, dumps, msgpack
+from .state_diff import PLAYER_FIELDS, GAME_FIELDS
+
+
+def redact_player(player_dict: dict, own: bool) -> dict:
+    if own or "hand" not in player_dict:
+        return player_dict
+    redacted = {k: v for k, v in player_dict.items() if k != "hand"}
+    redacted["hand_count"] = len(player_dict["hand"])
+    return redacted
+
+
+def redact_plays(played_cards: dict, viewer_id: Optional[str]) -> dict:
+    # Other players' cards stay face down: only their targets are visible
+    return {
+        pid: plays if pid == viewer_id else [{"target_id": play["target_id"]} for play in plays]
+        for pid, plays in played_cards.items()
+    }
+
+
+def player_view(game, viewer_id: Optional[str]) -> dict:
+    view = {field: getattr(game, field) for field in GAME_FIELDS}
+    view["code"] = game.code
+    view["version"] = game.version
+    view["deck_size"] = len(game.deck)
+    view["discard_size"] = len(game.discard)
+    view["played_cards"] = redact_plays(plays_dict(game.played_cards), viewer_id)
+    players = []
+    for p in game.players:
+        entry = {"id": p.id}
+        entry.update((field, getattr(p, field)) for field in PLAYER_FIELDS)
+        if p.id == viewer_id:
+            entry["hand"] = [card_dict(c) for c in p.hand]
+        else:
+            entry["hand_count"] = len(p.hand)
+        players.append(entry)
+    view["players"] = players
+    return view
+
+
+def redact_patch(patch: dict, viewer_id: Optional[str]) -> dict:
+    redacted = dict(patch)
+    if "players" in patch:
+        redacted["players"] = {
+            pid: redact_player(changes, pid == viewer_id) for pid, changes in patch["players"].items()
+        }
+    if "played_cards" in patch:
+        redacted["played_cards"] = redact_plays(patch["played_cards"], viewer_id)
+    return redacted
+
+
+class ViewCache:
+    def __init__(self):
+        # game code -> (viewer, format) -> (version, serialized view)
+        self.entries: Dict[str, Dict[Tuple[Optional[str], str], Tuple[int, bytes]]] = {}
+
+    def get(self, game, viewer_id: Optional[str], fmt: str = "json") -> bytes:
+        # Serialized player_view, rebuilt only when the game version moved on.
+        # Anyone not seated at the table gets the spectator view, so made-up
+        # ids share its entry instead of adding their own
+        if viewer_id is not None and game.player(viewer_id) is None:
+            viewer_id = None
+        views = self.entries.get(game.code)
+        if views is None:
+            views = self.entries[game.code] = {}
+        key = (viewer_id, fmt)
+        cached = views.get(key)
+        if cached and cached[0] == game.version:
+            return cached[1]
+        view = player_view(game, viewer_id)
+        data = msgpack.packb(view) if fmt == "msgpack" else dumps(view)
+        views[key] = (game.version, data)
+        return data
+
+    def drop(self, code: str):
+        self.entries.pop(code, None)
+
+
+view_cache = ViewCache()
@@ -1 +1,183 @@
-# WebSocket endpoints will be implemented here.
\ No newline at end of file
+# WebSocket connection management and fan-out of game updates.
+#
+# Each update is serialized once per viewing player and frame format (JSON
+# text or msgpack binary, see models.encode) by the caller and handed to the
+# bounded queue of each of that player's connections; a dedicated
+# writer task per connection drains it, so a slow socket only delays itself.
+# A connection whose queue fills up drops its backlog and gets a fresh
+# snapshot instead, and a socket that fails or times out on send is evicted.
+
+import asyncio
+import contextvars
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+SEND_QUEUE_SIZE = 16
+SEND_TIMEOUT = 5.0  # seconds before a stuck send evicts the connection
+
+# Queue marker: replace the backlog with a snapshot taken at send time
+RESYNC = object()
+
+
+class Connection:
+    def __init__(self, game_code: str, websocket: WebSocket, player_id: Optional[str] = None,
+                 queue_size: int = SEND_QUEUE_SIZE, fmt: str = "json"):
+        self.game_code = game_code
+        self.player_id = player_id  # None for spectators
+        self.fmt = fmt
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer = None
+        self.closed = False
+        self.failed_sends = 0
+
+    def offer(self, messages: List[Union[str, bytes]]):
+        for data in messages:
+            if self.queue.full():
+                # Laggard: everything queued is stale, catch up with one snapshot
+                self.resync()
+                return
+            self.queue.put_nowait(data)
+
+    def resync(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESYNC)
+
+
+class Broadcaster:
+    def __init__(self, snapshot: Callable[[str, Optional[str], str], Union[str, bytes]], queue_size: int = SEND_QUEUE_SIZE):
+        # snapshot(game_code, player_id, fmt) returns that player's serialized view
+        self.snapshot = snapshot
+        self.queue_size = queue_size
+        self.connections: Dict[str, List[Connection]] = {}
+        self.failed_sends = 0  # across every connection, for metrics
+        # Called with the game code when its first socket here opens, and
+        # when its last one closes
+        self.on_watch: List[Callable[[str], None]] = []
+        self.on_unwatch: List[Callable[[str], None]] = []
+
+    def connect(self, game_code: str, websocket: WebSocket, player_id: Optional[str] = None,
+                fmt: str = "json") -> Connection:
+        conn = Connection(game_code, websocket, player_id, self.queue_size, fmt)
+        conns = self.connections.get(game_code)
+        if conns is None:
+            conns = self.connections[game_code] = []
+            for callback in self.on_watch:
+                callback(game_code)
+        conns.append(conn)
+        conn.writer = asyncio.create_task(self._write(conn))
+        return conn
+
+    def disconnect(self, conn: Connection):
+        if conn.closed:
+            return
+        conn.closed = True
+        conns = self.connections.get(conn.game_code, [])
+        if conn in conns:
+            conns.remove(conn)
+        if not conns and self.connections.pop(conn.game_code, None) is not None:
+            for callback in self.on_unwatch:
+                callback(conn.game_code)
+        if conn.writer and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+
+    def close_game(self, game_code: str):
+        # The game left memory: hang up on everyone still watching it
+        for conn in list(self.connections.get(game_code, [])):
+            self.disconnect(conn)
+            asyncio.ensure_future(self._close(conn.websocket))
+
+    def publish(self, game_code: str, render: Callable[[Optional[str], str], List[Union[str, bytes]]]):
+        # render(player_id, fmt) serializes the update for one viewer; it runs
+        # once per distinct player and format however many sockets are open
+        rendered: Dict[Tuple[Optional[str], str], List[Union[str, bytes]]] = {}
+        for conn in self.connections.get(game_code, []):
+            key = (conn.player_id, conn.fmt)
+            if key not in rendered:
+                rendered[key] = render(conn.player_id, conn.fmt)
+            conn.offer(rendered[key])
+
+    def resync_game(self, game_code: str):
+        # Every socket on the game drops its backlog for a fresh snapshot
+        for conn in self.connections.get(game_code, []):
+            conn.resync()
+
+    def connection_count(self, game_code: str = None) -> int:
+        if game_code is not None:
+            return len(self.connections.get(game_code, []))
+        return sum(len(conns) for conns in self.connections.values())
+
+    def queue_depths(self) -> List[int]:
+        return [conn.queue.qsize() for conns in self.connections.values() for conn in conns]
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    async def _write(self, conn: Connection):
+        while not conn.closed:
+            data = await conn.queue.get()
+            if data is RESYNC:
+                data = self.snapshot(conn.game_code, conn.player_id, conn.fmt)
+                if data is None:
+                    continue
+            send = conn.websocket.send_bytes if isinstance(data, bytes) else conn.websocket.send_text
+            try:
+                await asyncio.wait_for(send(data), SEND_TIMEOUT)
+            except Exception:
+                conn.failed_sends += 1
+                self.failed_sends += 1
+                self.disconnect(conn)
+                await self._close(conn.websocket)
+
+
+class UpdateBatcher:
+    # Coalesces a game's broadcasts: the first move after a flush starts a
+    # `tick` timer, moves until it fires only wait for it, and one flush
+    # then sends everything since the last one. flush(game_code) does the
+    # sending; there is at most one per game in flight, so versions go out
+    # in order.
+    def __init__(self, flush: Callable[[str], None], tick: float):
+        self.flush = flush
+        self.tick = tick
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.handles: Dict[str, asyncio.TimerHandle] = {}
+        self.requested = 0
+        self.flushed = 0
+
+    def schedule(self, game_code: str) -> asyncio.Future:
+        # Resolves once the flush covering the caller's move has run
+        self.requested += 1
+        done = self.pending.get(game_code)
+        if done is None:
+            loop = asyncio.get_running_loop()
+            done = self.pending[game_code] = loop.create_future()
+            # A fresh context: the flush isn't part of any one move's trace
+            context = contextvars.Context()
+            if self.tick > 0:
+                self.handles[game_code] = loop.call_later(self.tick, self._fire, game_code, context=context)
+            else:
+                self.handles[game_code] = loop.call_soon(self._fire, game_code, context=context)
+        return done
+
+    def _fire(self, game_code: str):
+        self.handles.pop(game_code, None)
+        done = self.pending.pop(game_code)
+        self.flushed += 1
+        try:
+            self.flush(game_code)
+        finally:
+            if not done.done():
+                done.set_result(None)
+
+    def cancel(self, game_code: str):
+        handle = self.handles.pop(game_code, None)
+        if handle is not None:
+            handle.cancel()
+        done = self.pending.pop(game_code, None)
+        if done is not None and not done.done():
+            done.set_result(None)
@@ -0,0 +1,64 @@
+# Cold start of the web worker: fresh interpreters importing backend.main
+# and running its startup handlers, as an autoscaled instance would.
+#
+#   python -m benchmarks.cold_start --runs 10 --target 1.0 --output cold.json
+#
+# Exits non-zero when the median time to ready is over --target seconds.
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from .common import metadata, write_result
+
+TARGET = 1.0  # seconds from process start to accepting requests
+
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import backend.main as server
+imported = time.perf_counter()
+
+async def ready():
+    async with server.app.router.lifespan_context(server.app):
+        pass
+
+asyncio.run(ready())
+print(json.dumps({"import_s": imported - started, "startup_s": time.perf_counter() - imported,
+                  "modules": len(__import__("sys").modules)}))
+"""
+
+
+def run_once() -> dict:
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD], capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["ready_s"] = time.perf_counter() - started
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold start time of the web worker")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--target", type=float, default=TARGET, help="median seconds to ready allowed")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.runs)]
+    results = {
+        key: round(statistics.median(run[key] for run in runs), 4)
+        for key in ("ready_s", "import_s", "startup_s")
+    }
+    results["max_ready_s"] = round(max(run["ready_s"] for run in runs), 4)
+    results["modules"] = runs[-1]["modules"]
+    results["target_s"] = args.target
+    write_result({"benchmark": "cold_start", "meta": metadata(), "params": vars(args), "results": results},
+                 args.output)
+    if results["ready_s"] > args.target:
+        raise SystemExit(f"cold start {results['ready_s']}s is over the {args.target}s target")
+
+
+if __name__ == "__main__":
+    main()
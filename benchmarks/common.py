@@ -0,0 +1,42 @@
+# Helpers shared by the benchmark scripts: run metadata, percentiles and
+# writing results as JSON so runs from different commits can be compared.
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+
+def metadata() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def percentiles(samples: List[float], scale: float = 1e3) -> Dict[str, Optional[float]]:
+    # p50/p99/max of `samples` (seconds), reported in milliseconds by default
+    if not samples:
+        return {"count": 0, "p50": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+
+    def at(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale, 4)
+    return {"count": len(ordered), "p50": at(0.50), "p99": at(0.99), "max": round(ordered[-1] * scale, 4)}
+
+
+def write_result(result: Dict, output: Optional[str]):
+    text = json.dumps(result, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
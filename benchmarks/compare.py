@@ -0,0 +1,43 @@
+# Side-by-side comparison of two benchmark result files.
+#
+#   python -m benchmarks.compare before.json after.json
+import argparse
+import json
+from typing import Dict
+
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')}")
+    old, new = flatten(before["results"]), flatten(after["results"])
+    width = max(map(len, old.keys() | new.keys()), default=0)
+    for name in sorted(old.keys() | new.keys()):
+        a, b = old.get(name), new.get(name)
+        if a is None or b is None:
+            print(f"{name:<{width}}  {a!s:>12}  {b!s:>12}")
+            continue
+        change = f"{b / a:>7.2f}x" if a else ""
+        print(f"{name:<{width}}  {a:>12}  {b:>12}  {change}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# Load generator: many simulated tables playing against the app in process.
+#
+#   python -m benchmarks.load --tables 200 --players 4 --output load.json
+#
+# Every table creates and joins its game over HTTP, then each player opens
+# the game WebSocket and plays over it: draw when it's their turn, play a
+# random card at a random opponent, and let the server move the phases on.
+# Requests go straight into the ASGI app on this event loop, so the numbers
+# are server time without any network in the way.
+#
+# Reported: action latency (move sent to ack received, which includes
+# waiting out the broadcast tick), server-side broadcast time, moves per
+# coalesced broadcast, delivery (move sent to the last player at the table
+# holding the resulting version) and finished games per second.
+#
+# Needs httpx (in requirements.txt) on top of the app's own dependencies.
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Dict, List
+
+import httpx
+
+import backend.main as server
+from shared.config import BROADCAST_TICK_MS
+from .common import metadata, percentiles, write_result
+
+MAX_ROUNDS = 60  # tables still playing after this many rounds stop early
+
+
+class AsgiWebSocket:
+    # Minimal WebSocket client speaking ASGI to the app directly
+    def __init__(self, app, path: str, query: str = ""):
+        self.app = app
+        self.scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws",
+            "path": path, "raw_path": path.encode(), "root_path": "",
+            "query_string": query.encode(), "headers": [], "subprotocols": [],
+            "client": ("bench", 0), "server": ("bench", 80),
+        }
+        self.to_app: asyncio.Queue = asyncio.Queue()
+        self.from_app: asyncio.Queue = asyncio.Queue()
+        self.task = None
+
+    async def connect(self):
+        self.task = asyncio.create_task(self.app(self.scope, self.to_app.get, self.from_app.put))
+        await self.to_app.put({"type": "websocket.connect"})
+        message = await self.from_app.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"WebSocket refused: {message}")
+
+    async def send(self, data: str):
+        await self.to_app.put({"type": "websocket.receive", "text": data})
+
+    async def receive(self) -> str:
+        message = await self.from_app.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError("WebSocket closed")
+        return message["text"]
+
+    async def close(self):
+        await self.to_app.put({"type": "websocket.disconnect", "code": 1000})
+        await self.task
+
+
+def apply_delta(state: dict, patch: dict):
+    # Same merge as applyDelta in frontend/scripts/game.js
+    for key, value in patch.items():
+        if key not in ("type", "players"):
+            state[key] = value
+    players = {p["id"]: p for p in state["players"]}
+    for pid, changes in patch.get("players", {}).items():
+        if pid in players:
+            players[pid].update(changes)
+        else:
+            state["players"].append(changes)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.delivery: List[float] = []
+        self.broadcasts: List[float] = []
+        self.actions = 0
+        self.errors = 0
+        self.finished = 0
+        self.stopped = 0
+
+
+async def play_seat(ws: AsgiWebSocket, player_id: str, rng: random.Random, stats: Stats,
+                    sent: Dict[int, float], received: Dict[int, float]):
+    state = None
+    request_ids = itertools.count(1)
+    pending = None  # (request id, time sent)
+    while True:
+        msg = json.loads(await ws.receive())
+        now = time.perf_counter()
+        if msg["type"] == "snapshot":
+            state = msg["state"]
+        elif msg["type"] == "delta" and state is not None:
+            apply_delta(state, msg)
+            received[msg["version"]] = max(received.get(msg["version"], 0), now)
+        elif pending and msg.get("id") == pending[0]:
+            if msg["type"] == "ack":
+                stats.latencies.append(now - pending[1])
+                sent[msg["version"]] = pending[1]
+            else:
+                stats.errors += 1
+            pending = None
+        if state is None:
+            continue
+        if state["phase"] == "end" or state["round"] > MAX_ROUNDS:
+            return state["phase"] == "end"
+        if pending or state.get("current_turn_player_id") != player_id:
+            continue
+        me = next(p for p in state["players"] if p["id"] == player_id)
+        if state["phase"] == "draw":
+            request = {"type": "draw"}
+        elif state["phase"] == "play" and me.get("hand"):
+            targets = [p["id"] for p in state["players"] if not p["eliminated"] and p["id"] != player_id]
+            request = {"type": "play_card", "card_id": rng.choice(me["hand"])["id"],
+                       "target_id": rng.choice(targets or [player_id])}
+        else:
+            continue
+        request["id"] = next(request_ids)
+        pending = (request["id"], time.perf_counter())
+        stats.actions += 1
+        await ws.send(json.dumps(request))
+
+
+async def play_table(http: httpx.AsyncClient, players: int, rng: random.Random, stats: Stats):
+    joined = [(await http.post("/create_game", params={"username": "p0"})).json()]
+    code = joined[0]["game_code"]
+    for i in range(1, players):
+        joined.append((await http.post("/join_game", json={"game_code": code, "username": f"p{i}"})).json())
+    player_ids = [entry["player_id"] for entry in joined]
+    sockets = [AsgiWebSocket(server.app, f"/ws/{code}", f"player_id={entry['player_id']}&token={entry['token']}")
+               for entry in joined]
+    for ws in sockets:
+        await ws.connect()
+    sent: Dict[int, float] = {}
+    received: Dict[int, float] = {}
+    seats = [asyncio.create_task(play_seat(ws, pid, random.Random(rng.random()), stats, sent, received))
+             for ws, pid in zip(sockets, player_ids)]
+    await http.post("/start_game", json={"game_code": code})
+    finished = await asyncio.gather(*seats)
+    for ws in sockets:
+        await ws.close()
+    if all(finished):
+        stats.finished += 1
+    else:
+        stats.stopped += 1
+    stats.delivery.extend(received[v] - t for v, t in sent.items() if v in received)
+
+
+async def run(tables: int, players: int, concurrency: int, seed: int, tick_ms: float) -> Dict:
+    stats = Stats()
+    flush = server.flush_game_updates
+
+    def timed_flush(game_code):
+        started = time.perf_counter()
+        flush(game_code)
+        stats.broadcasts.append(time.perf_counter() - started)
+
+    # Looked up by name on every call, so the wrapper sees every broadcast
+    server.flush_game_updates = timed_flush
+    server.update_batcher.tick = tick_ms / 1000
+    requested, flushed = server.update_batcher.requested, server.update_batcher.flushed
+    # Resolve as soon as the cards are down, and never time a player out
+    server.phase_engine.tick = 0.005
+    server.phase_engine.resolve_delay = 0
+    server.phase_engine.turn_timeout = 3600
+    rng = random.Random(seed)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def table(http):
+        async with limit:
+            await play_table(http, players, random.Random(rng.random()), stats)
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            started = time.perf_counter()
+            await asyncio.gather(*(table(http) for _ in range(tables)))
+            elapsed = time.perf_counter() - started
+    server.flush_game_updates = flush
+    requested = server.update_batcher.requested - requested
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "games_per_sec": round(stats.finished / elapsed, 2),
+        "actions_per_sec": round(stats.actions / elapsed, 1),
+        "finished": stats.finished,
+        "stopped": stats.stopped,
+        "actions": stats.actions,
+        "errors": stats.errors,
+        "action_latency_ms": percentiles(stats.latencies),
+        "broadcast_ms": percentiles(stats.broadcasts),
+        # Moves per update sent, from coalescing within the broadcast tick
+        "moves_per_broadcast": round(requested / max(server.update_batcher.flushed - flushed, 1), 2),
+        "delivery_ms": percentiles(stats.delivery),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated tables against the in-process app")
+    parser.add_argument("--tables", type=int, default=100)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=100, help="tables playing at once")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tick-ms", type=float, default=BROADCAST_TICK_MS, help="broadcast coalescing tick")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args.tables, args.players, args.concurrency, args.seed, args.tick_ms))
+    write_result({
+        "benchmark": "load",
+        "meta": metadata(),
+        "params": vars(args),
+        "results": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# Micro-benchmarks for the game hot paths.
+#
+#   python -m benchmarks.micro --output before.json
+#   python -m benchmarks.compare before.json after.json
+#
+# Every benchmark times `number` calls, `repeat` times over, and reports the
+# best repeat so noise from the rest of the machine doesn't count. Calls
+# that mutate a game each get their own copy, made outside the timed loop.
+import argparse
+import time
+from typing import Callable, Dict, List
+
+from backend.batch_resolve import games_in_play
+from backend.card_effects import apply_card_effect
+from backend.cards.definitions import CARD_CODES, CARD_DEFS
+from backend.game_manager import build_full_deck
+from backend.game_store import dump_game, load_game
+import backend.models as models
+from backend.models import card_from_code
+from backend.simulation import HeadlessGameManager
+from backend.state_diff import summarize, diff_states
+from backend.views import player_view, redact_patch
+from .common import metadata, write_result
+
+NUMBER = 1000
+REPEAT = 5
+
+
+def sample_games(count: int, players: int, seed: int) -> List[str]:
+    # Serialized games stopped in the resolve phase of a random round
+    dumps = []
+    while len(dumps) < count:
+        pair = games_in_play(seed, players)
+        seed += 1
+        if pair:
+            dumps.append(dump_game(pair[1]))
+    return dumps
+
+
+def fresh_games(dumps: List[str], number: int):
+    # `number` independent games, named apart, in one headless manager
+    manager = HeadlessGameManager()
+    codes = []
+    for i in range(number):
+        game = load_game(dumps[i % len(dumps)])
+        game.code = f"B{i}"
+        manager.games[game.code] = game
+        codes.append(game.code)
+    return manager, codes
+
+
+def bench(make_calls: Callable[[int], List[Callable[[], object]]], number: int, repeat: int) -> Dict:
+    best = None
+    for _ in range(repeat):
+        calls = make_calls(number)
+        started = time.perf_counter()
+        for call in calls:
+            call()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {"per_call_us": round(best / number * 1e6, 3), "calls_per_sec": round(number / best)}
+
+
+def benchmarks(dumps: List[str]) -> Dict[str, Callable[[int], List[Callable[[], object]]]]:
+    game = load_game(dumps[0])
+    viewer = game.players[0].id
+    before = summarize(game)
+    resolved = load_game(dumps[0])
+    manager = HeadlessGameManager()
+    manager.games[resolved.code] = resolved
+    manager.resolve_round(resolved.code)
+    after = summarize(resolved)
+    patch = diff_states(before, after, resolved)
+
+    def repeated(fn):
+        return lambda number: [fn] * number
+
+    def resolve_round(number):
+        manager, codes = fresh_games(dumps, number)
+        return [lambda code=code: manager.resolve_round(code) for code in codes]
+
+    def effect(card_def):
+        def make_calls(number):
+            manager, codes = fresh_games(dumps, number)
+            calls = []
+            for code in codes:
+                game = manager.games.get(code)
+                action = {
+                    "player_id": game.players[0].id,
+                    "card": card_from_code(CARD_CODES[card_def.type], "bench"),
+                    "target_id": game.players[1].id,
+                }
+                calls.append(lambda game=game, action=action: apply_card_effect(game, action))
+            return calls
+        return make_calls
+
+    suite = {
+        "build_full_deck": repeated(build_full_deck),
+        "resolve_round": resolve_round,
+        "serialize.game_dict_json": repeated(lambda: models.dumps(models.game_dict(game))),
+        "serialize.dump_game": repeated(lambda: dump_game(game)),
+        "serialize.player_view": repeated(lambda: models.dumps(player_view(game, viewer))),
+        "serialize.summarize": repeated(lambda: summarize(game)),
+        "serialize.diff_states": repeated(lambda: diff_states(before, after, resolved)),
+        "serialize.patch_render": repeated(lambda: models.encode(redact_patch(patch, viewer))),
+    }
+    for card_def in CARD_DEFS:
+        suite[f"apply_card_effect.{card_def.type.value}"] = effect(card_def)
+    return suite
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the game hot paths")
+    parser.add_argument("--number", type=int, default=NUMBER, help="calls per timed repeat")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    dumps = sample_games(64, args.players, args.seed)
+    results = {}
+    for name, make_calls in benchmarks(dumps).items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = bench(make_calls, args.number, args.repeat)
+    write_result({
+        "benchmark": "micro",
+        "meta": metadata(),
+        "params": vars(args),
+        "results": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
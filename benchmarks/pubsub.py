@@ -0,0 +1,104 @@
+# Cross-node latency through the pub/sub broker.
+#
+#   python -m benchmarks.pubsub --messages 2000 --output pubsub.json
+#
+# Starts a Broker on a temporary Unix socket (or --address) and two
+# SocketBus nodes in this process. Node A publishes a real game update
+# (the patches of one resolved round) and node B, subscribed to the game's
+# channel, receives it. Reported: one-at-a-time latency, publish to
+# delivery, and the rate of a burst of back-to-back publishes.
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from backend.batch_resolve import games_in_play
+from backend.models import dumps
+from backend.pubsub import Broker, SocketBus, game_channel
+from backend.simulation import HeadlessGameManager
+from backend.state_diff import summarize, diff_states
+from .common import metadata, percentiles, write_result
+
+
+def sample_update(seed: int = 0) -> dict:
+    # Roughly what a node publishes after a move: one patch with players
+    game = games_in_play(seed, 4)
+    game = game[1] if isinstance(game, tuple) else game
+    before = summarize(game)
+    manager = HeadlessGameManager()
+    manager.games[game.code] = game
+    manager.resolve_round(game.code)
+    patch = diff_states(before, summarize(game), game)
+    patch["version"] = game.version
+    return {"code": game.code, "version": game.version, "patches": [patch]}
+
+
+async def connected(bus: SocketBus):
+    await bus.start()
+    while bus.writer is None:
+        await asyncio.sleep(0.001)
+
+
+async def run(messages: int, address: str):
+    server = await Broker().start(address)
+    a, b = SocketBus(address), SocketBus(address)
+    await connected(a)
+    await connected(b)
+    update = sample_update()
+    channel = game_channel(update["code"])
+    arrived = []
+    waiter = [None]
+
+    def received(message):
+        arrived.append(time.perf_counter())
+        if waiter[0] is not None and not waiter[0].done():
+            waiter[0].set_result(None)
+
+    b.subscribe(channel, received)
+    await asyncio.sleep(0.05)  # let the subscription reach the broker
+
+    latencies = []
+    for _ in range(messages):
+        waiter[0] = asyncio.get_running_loop().create_future()
+        sent = time.perf_counter()
+        a.publish(channel, update)
+        await waiter[0]
+        latencies.append(arrived[-1] - sent)
+
+    arrived.clear()
+    waiter[0] = None
+    started = time.perf_counter()
+    for _ in range(messages):
+        a.publish(channel, update)
+    while len(arrived) < messages:
+        await asyncio.sleep(0.001)
+    burst = time.perf_counter() - started
+
+    await a.close()
+    await b.close()
+    await asyncio.sleep(0.05)  # the broker sees both nodes leave
+    server.close()
+    await server.wait_closed()
+    return {
+        "latency_ms": percentiles(latencies),
+        "burst_messages_per_sec": round(messages / burst),
+        "message_bytes": len(dumps(update)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-node latency through the pub/sub broker")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--address", help="broker address; defaults to a temporary Unix socket")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    address = args.address or "unix:" + os.path.join(tempfile.mkdtemp(), "bus.sock")
+    results = asyncio.run(run(args.messages, address))
+    write_result({"benchmark": "pubsub", "meta": metadata(), "params": vars(args), "results": results},
+                 args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,10 @@
 const API_BASE = "https://fc8343d703b2.ngrok-free.app"; // Adjust if needed
 const gameCode = localStorage.getItem("game_code");
 const username = localStorage.getItem("username");
-const playerId = `${gameCode}_${username}`;
+const playerId = localStorage.getItem("player_id") || `${gameCode}_${username}`;
+// Without it the server treats us as a spectator and refuses our moves
+const playerToken = localStorage.getItem("player_token") || "";
+const seatQuery = `player_id=${encodeURIComponent(playerId)}&token=${encodeURIComponent(playerToken)}`;
 const bottomHand = document.getElementById("bottomHand");
 const gameArea = document.getElementById("gameArea");
 let ws;
@@ -13,30 +16,110 @@ let ws;
 // Connect to WebSocket for live game state updates
 function connectWebSocket() {
     if (!gameCode) return;
-    ws = new WebSocket(`${API_BASE.replace(/^http/, "ws")}/ws/${gameCode}`);
+    ws = new WebSocket(`${API_BASE.replace(/^http/, "ws")}/ws/${gameCode}?${seatQuery}`);
     ws.onmessage = (event) => {
-        const state = JSON.parse(event.data);
-        renderGame(state);
+        applyMessage(JSON.parse(event.data));
+    };
+    ws.onclose = () => {
+        // Replies to moves sent on this socket will never come
+        pendingRequests.forEach(pending => pending.reject(new Error("Connection lost")));
+        pendingRequests.clear();
+        setTimeout(connectWebSocket, 2000);
     };
-    ws.onclose = () => setTimeout(connectWebSocket, 2000);
 }
 connectWebSocket();
 
-async function fetchGameState() {
+// With `since`, the server holds the request until the state moves past it
+async function fetchGameState(since) {
     try {
-        const res = await fetch(`${API_BASE}/game_state/${gameCode}`);
+        let url = `${API_BASE}/game_state/${gameCode}?${seatQuery}`;
+        if (since !== undefined) url += `&since=${since}`;
+        const res = await fetch(url);
+        if (!res.ok) return false;
         const data = await res.json();
         renderGame(data);
+        return true;
     } catch (err) {
         console.error("Failed to fetch game state:", err);
+        return false;
+    }
+}
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Long-poll fallback, idle while the WebSocket is delivering updates
+async function pollGameState() {
+    while (true) {
+        if (ws && ws.readyState === WebSocket.OPEN) {
+            await sleep(1000);
+            continue;
+        }
+        if (!await fetchGameState(stateVersion)) await sleep(2000);
     }
 }
 
 let currentGameState = null;
+let stateVersion = 0;
+
+// Moves go over the socket when it is open, answered by an ack or error
+// carrying the request id; the state change arrives as a delta before it
+let nextRequestId = 1;
+const pendingRequests = new Map();
+
+function sendAction(type, fields, httpPath) {
+    if (!ws || ws.readyState !== WebSocket.OPEN) {
+        return fetch(`${API_BASE}/${httpPath}`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ game_code: gameCode, player_id: playerId, token: playerToken, ...fields })
+        }).then(async res => {
+            if (!res.ok) throw new Error((await res.json()).detail);
+            fetchGameState();
+        });
+    }
+    const id = nextRequestId++;
+    ws.send(JSON.stringify({ type, id, ...fields }));
+    return new Promise((resolve, reject) => pendingRequests.set(id, { resolve, reject }));
+}
+
+// The socket sends one full snapshot, then a patch per state version
+function applyMessage(msg) {
+    if (msg.type === "ack" || msg.type === "error") {
+        const pending = pendingRequests.get(msg.id);
+        pendingRequests.delete(msg.id);
+        if (pending && msg.type === "ack") pending.resolve(msg);
+        else if (pending) pending.reject(new Error(msg.detail));
+        return;
+    }
+    if (msg.type === "snapshot") {
+        renderGame(msg.state);
+        return;
+    }
+    if (msg.type !== "delta" || !currentGameState || msg.version <= stateVersion) return;
+    if (msg.version !== stateVersion + 1) {
+        // Missed a version: ask the server for a fresh snapshot
+        ws.send(JSON.stringify({ type: "sync" }));
+        return;
+    }
+    applyDelta(currentGameState, msg);
+    renderGame(currentGameState);
+}
+
+function applyDelta(state, patch) {
+    Object.keys(patch).forEach(key => {
+        if (key !== "type" && key !== "players") state[key] = patch[key];
+    });
+    Object.entries(patch.players || {}).forEach(([id, changes]) => {
+        const player = state.players.find(p => p.id === id);
+        if (player) Object.assign(player, changes);
+        else state.players.push(changes);
+    });
+}
 
 
 function renderGame(state) {
     currentGameState = state; // Store the current state for later use
+    stateVersion = state.version || 0;
     const isMyTurn = state.current_turn_player_id === playerId;
     const isPlayPhase = state.phase === "play";
     const isDrawPhase = state.phase === "draw";
@@ -105,7 +188,7 @@ function renderPlayer(player, state) {
         <div class="health">❤️ ${player.health}</div>
         <div class="status">${getStatusText(player)}</div>
         <div class="hand">
-            ${player.hand.map(card => `<div class="card" title="${card.description}">${card.type}${card.is_primed ? " 🔥" : ""}</div>`).join("")}
+            ${'<div class="card">🂠</div>'.repeat(player.hand_count || 0)}
         </div>
     `;
     gameArea.appendChild(div);
@@ -141,38 +224,23 @@ async function drawCard() {
     return;
   }
     try {
-        const res = await fetch(`${API_BASE}/draw`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ game_code: gameCode, player_id: playerId })
-        });
-        const data = await res.json();
-        fetchGameState();
+        await sendAction("draw", {}, "draw");
     } catch (err) {
         alert("Failed to draw card: " + err.message);
     }
 }
 
-async function playCard(cardId) {
+async function playCard(cardId, targetId) {
     try {
-        const target = prompt("Enter target player's username:");
-        if (!target) return;
-        // Find target player id
-        const state = await (await fetch(`${API_BASE}/game_state/${gameCode}`)).json();
-        const targetPlayer = state.players.find(p => p.username === target);
-        if (!targetPlayer) return alert("Player not found!");
-        await fetch(`${API_BASE}/play_card`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-                game_code: gameCode,
-                player_id: playerId,
-                card_id: cardName,
-                target_id: target
-                })
-
-        });
-        fetchGameState();
+        if (!targetId) {
+            const target = prompt("Enter target player's username:");
+            if (!target) return;
+            // The live state already lists every player
+            const targetPlayer = currentGameState.players.find(p => p.username === target);
+            if (!targetPlayer) return alert("Player not found!");
+            targetId = targetPlayer.id;
+        }
+        await sendAction("play_card", { card_id: cardId, target_id: targetId }, "play_card");
     } catch (err) {
         alert("Failed to play card: " + err.message);
     }
@@ -222,12 +290,5 @@ function changeColor(color) {
 
         
 
-socket.onmessage = (event) => {
-  const data = JSON.parse(event.data);
-  console.log("🔁 WS UPDATE:", data);  // See the updated game state in console
-  renderGame(data);
-};
-
 // Initial fetch and poll fallback
-fetchGameState();
-setInterval(fetchGameState, 1000);
\ No newline at end of file
+fetchGameState().then(pollGameState);
\ No newline at end of file
@@ -1,6 +1,8 @@
 let gameCode = null;
 let isHost = false;
 let username = null;
+let playersVersion = 0;
+let watchingPlayers = false;
 
 const codeDiv = document.getElementById('code');
 const generateBtn = document.getElementById('generate-btn');
@@ -8,6 +10,17 @@ const copyBtn = document.getElementById('copy-btn');
 const startBtn = document.getElementById('start-btn');
 const playersDiv = document.getElementById('players');
 
+// The player id and token the server handed out at join; game.js sends
+// them back so the server shows it this player's hand
+function saveSeat(data) {
+    localStorage.setItem("player_id", data.player_id);
+    localStorage.setItem("player_token", data.token);
+}
+
+function showModal() {
+    document.getElementById("codeModal").style.display = "block";
+}
+
 function showCode() {
     codeDiv.textContent = gameCode || "";
     if (gameCode) {
@@ -30,54 +43,128 @@ generateBtn.onclick = async() => {
     isHost = true;
     localStorage.setItem("game_code", gameCode);
     localStorage.setItem("username", username);
+    // create_game already seats the host
+    saveSeat(data);
     showCode();
-    await joinGame(username);
-    fetchPlayers();
-    setInterval(fetchPlayers, 1500);
-
+    showModal();
+    watchPlayers();
 };
 
 const joinBtn = document.getElementById('join-btn');
 joinBtn.onclick = async() => {
     const code = document.getElementById("joinKey").value.trim().toUpperCase();
-    const username = prompt("Enter your name:");
+    username = prompt("Enter your name:");
     if (!code || !username) return alert("Enter a valid code and name!");
     gameCode = code;
     localStorage.setItem("game_code", gameCode);
     localStorage.setItem("username", username);
     await joinGame(username);
-    fetchPlayers();
-    setInterval(fetchPlayers, 1500);
+    watchPlayers();
     showCode();
+    showModal();
 };
 
 copyBtn.onclick = () => {
     navigator.clipboard.writeText(gameCode);
     copyBtn.textContent = "Copied!";
-    setTimeout(() => (copyBtn.textContent = "Copy Code"), 1000);
+    setTimeout(() => (copyBtn.textContent = "📋 Copy Code"), 1000);
+};
+
+document.getElementById('bot-btn').onclick = async () => {
+    // The new seat shows up through the players long-poll
+    const res = await fetch('/add_bots', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ game_code: gameCode, count: 1 })
+    });
+    if (!res.ok) return alert((await res.json()).detail);
 };
 
 async function joinGame(name) {
-    await fetch('/join_game', {
+    const res = await fetch('/join_game', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ game_code: gameCode, username: name })
     });
+    if (!res.ok) return alert((await res.json()).detail);
+    saveSeat(await res.json());
 }
 
-async function fetchPlayers() {
-    if (!gameCode) return;
-    const res = await fetch(`/players/${gameCode}`);
+// Long-polls: the server answers once the player list moves past `since`
+async function fetchPlayers(since) {
+    if (!gameCode) return false;
+    let url = `/players/${gameCode}`;
+    if (since !== undefined) url += `?since=${since}`;
+    const res = await fetch(url);
+    if (!res.ok) return false;
+    playersVersion = parseInt((res.headers.get("ETag") || "0").replace(/\D/g, ""), 10) || 0;
     const players = await res.json();
     playersDiv.innerHTML =
         '<b>Players:</b><br>' + players.map(p => p.username).join('<br>');
+    return true;
 }
 
-startBtn.onclick = () => {
+async function watchPlayers() {
+    if (watchingPlayers) return;
+    watchingPlayers = true;
+    await fetchPlayers();
+    while (true) {
+        let ok = false;
+        try {
+            ok = await fetchPlayers(playersVersion);
+        } catch (err) {
+            console.error("Failed to fetch players:", err);
+        }
+        if (!ok) await new Promise(resolve => setTimeout(resolve, 2000));
+    }
+}
+
+startBtn.onclick = async () => {
+    // The server deals from here on and moves the game through its phases
+    const res = await fetch('/start_game', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ game_code: gameCode })
+    });
+    if (!res.ok) return alert((await res.json()).detail);
     window.location.href = `waiting.html?code=${gameCode}&host=1`;
 };
 
-// If joining via code (not host)
+// Matchmaking: wait on the queue socket until the server seats us at a
+// new, already started table
+const queueBtn = document.getElementById('queue-btn');
+const queueStatus = document.getElementById('queue-status');
+let queueSocket = null;
+
+queueBtn.onclick = () => {
+    if (queueSocket) {
+        queueSocket.close();
+        return;
+    }
+    username = prompt("Enter your name:");
+    if (!username) return;
+    const scheme = location.protocol === "https:" ? "wss" : "ws";
+    queueSocket = new WebSocket(`${scheme}://${location.host}/queue?username=${encodeURIComponent(username)}`);
+    queueBtn.textContent = "✖️ Leave Queue";
+    queueSocket.onmessage = (event) => {
+        const msg = JSON.parse(event.data);
+        if (msg.type === "queued") {
+            queueStatus.textContent = `Waiting for players (${msg.waiting} in queue)...`;
+        } else if (msg.type === "matched") {
+            localStorage.setItem("game_code", msg.game_code);
+            localStorage.setItem("username", username);
+            saveSeat(msg);
+            window.location.href = "game.html";
+        }
+    };
+    queueSocket.onclose = () => {
+        queueSocket = null;
+        queueBtn.textContent = "⚔️ Find Players";
+        queueStatus.textContent = "";
+    };
+};
+
+// Auto-join via URL (for shared lobby links)
 window.onload = async() => {
     const urlParams = new URLSearchParams(window.location.search);
     if (urlParams.get('code')) {
@@ -89,8 +176,8 @@ window.onload = async() => {
             localStorage.setItem("username", username);
             await joinGame(username);
             showCode();
-            fetchPlayers();
-            setInterval(fetchPlayers, 1500);
+            watchPlayers();
+            showModal();
         }
     }
 };
\ No newline at end of file
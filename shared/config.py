@@ -1,8 +1,80 @@
 # Shared variables like BASE_URL, ENV, etc. will be defined here.
+import os
 
 MAX_PLAYERS = 5
 MIN_PLAYERS = 2
 MAX_LIVES = 5
 
 BASE_API_URL = "http://localhost:8000"
-WEB_APP_URL = "https://fc8343d703b2.ngrok-free.app/menu.html" 
\ No newline at end of file
+WEB_APP_URL = "https://fc8343d703b2.ngrok-free.app/menu.html" 
+
+# Where games live: "memory" (one worker) or "sqlite" (shared by every
+# worker on the host), optionally split into shards by game code
+GAME_STORE = os.getenv("GAME_STORE", "memory")
+GAME_STORE_PATH = os.getenv("GAME_STORE_PATH", "games")
+GAME_STORE_SHARDS = int(os.getenv("GAME_STORE_SHARDS", "1"))
+
+# Directory for the append-only action log used for crash recovery; unset
+# disables logging
+ACTION_LOG_DIR = os.getenv("ACTION_LOG_DIR")
+
+# Games kept in memory: finished games leave after FINISHED_GAME_TTL
+# seconds, games nobody is connected to after IDLE_GAME_TTL, and the least
+# recently used go once there are more than MAX_RESIDENT_GAMES. Evicted
+# games are written to GAME_SPILL_DIR, if set, and reloaded on lookup.
+MAX_RESIDENT_GAMES = int(os.getenv("MAX_RESIDENT_GAMES", "10000"))
+IDLE_GAME_TTL = float(os.getenv("IDLE_GAME_TTL", "1800"))
+FINISHED_GAME_TTL = float(os.getenv("FINISHED_GAME_TTL", "300"))
+GAME_SPILL_DIR = os.getenv("GAME_SPILL_DIR")
+
+# Seconds a player has to draw or play before the server moves for them,
+# and how long revealed cards stay on the table before the round resolves
+TURN_TIMEOUT = float(os.getenv("TURN_TIMEOUT", "30"))
+RESOLVE_DELAY = float(os.getenv("RESOLVE_DELAY", "3"))
+
+# Opt-in per-game action tracing; actions slower than SLOW_ACTION_MS are
+# logged with their trace. PROFILE_RATE is the fraction of actions run
+# under the sampling profiler. Both can be changed at runtime through the
+# /debug endpoints, which only exist when DEBUG_ENDPOINTS is set.
+TRACING = os.getenv("TRACING", "0") == "1"
+SLOW_ACTION_MS = float(os.getenv("SLOW_ACTION_MS", "100"))
+PROFILE_RATE = float(os.getenv("PROFILE_RATE", "0"))
+DEBUG_ENDPOINTS = os.getenv("DEBUG_ENDPOINTS", "0") == "1"
+
+# Entry points: the web app (python -m backend.main), the Telegram bot
+# (python -m backend.telegram_bot) and, optionally, a static-only server
+# for the frontend (uvicorn backend.static_app:app)
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "8000"))
+SERVE_STATIC = os.getenv("SERVE_STATIC", "1") == "1"
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+
+# Matchmaking (/queue): a table starts as soon as MAX_PLAYERS are waiting,
+# or with at least MIN_PLAYERS once someone has waited MATCHMAKING_WAIT
+# seconds
+MATCHMAKING_WAIT = float(os.getenv("MATCHMAKING_WAIT", "10"))
+
+# Pub/sub between nodes for WebSocket updates: unset keeps everything in
+# this process; "unix:/path" or "tcp://host:port" points at a broker
+# started with python -m backend.pubsub <address>
+PUBSUB_URL = os.getenv("PUBSUB_URL")
+
+# Bot players: each move searches for up to BOT_THINK_MS milliseconds, in a
+# pool of BOT_WORKERS processes (0 runs searches on threads in the web
+# process instead)
+BOT_THINK_MS = float(os.getenv("BOT_THINK_MS", "50"))
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "2"))
+
+# Moves on one game within BROADCAST_TICK_MS milliseconds of each other are
+# sent to its sockets as a single update; 0 sends each move on its own
+BROADCAST_TICK_MS = float(os.getenv("BROADCAST_TICK_MS", "15"))
+
+# Finished games go to columnar chunk files in ANALYTICS_DIR, if set, with
+# ANALYTICS_CHUNK_GAMES games per file; running totals are kept either way
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR")
+ANALYTICS_CHUNK_GAMES = int(os.getenv("ANALYTICS_CHUNK_GAMES", "10000"))
+
+# Key for the player tokens handed out at join, which the game view and
+# moves check against the player id. Unset picks a random key per process,
+# so tokens do not survive a restart; every node must share one key.
+PLAYER_TOKEN_SECRET = os.getenv("PLAYER_TOKEN_SECRET")
@@ -0,0 +1,65 @@
+import os
+
+from backend.action_log import ActionLog, _files, recover
+from backend.game_manager import GameManager
+from backend.models import Player, game_dict
+from backend.simulation import play_game
+from backend.utils.helpers import get_next_drawer
+
+
+def crashed_manager(directory):
+    # One finished game and one stopped mid-round; the log is synced but
+    # never closed, as if the process died
+    manager = GameManager()
+    manager.log = ActionLog(directory, manager.games, snapshot_every=40)
+    play_game(3, ["random"] * 4, manager=manager)
+    manager.create_game("MID", Player(id="MID_a", username="a"), seed=9)
+    manager.join_game("MID", Player(id="MID_b", username="b"))
+    manager.start_game("MID")
+    manager.draw_cards("MID", get_next_drawer(manager.get_game("MID")).id)
+    manager.log.sync()
+    return manager
+
+
+def recovered_games(directory):
+    manager = GameManager()
+    recover(manager, directory)
+    return {code: game_dict(manager.games.get(code)) for code in manager.games}
+
+
+def test_recover_rebuilds_every_game(tmp_path):
+    manager = crashed_manager(str(tmp_path))
+    # Enough records for at least one snapshot plus a segment after it
+    assert _files(str(tmp_path), "snapshot")[-1][0] > 1
+    expected = {code: game_dict(manager.games.get(code)) for code in manager.games}
+    assert recovered_games(str(tmp_path)) == expected
+
+
+def test_recover_skips_torn_tail(tmp_path):
+    manager = crashed_manager(str(tmp_path))
+    expected = {code: game_dict(manager.games.get(code)) for code in manager.games}
+    _, segment = _files(str(tmp_path), "segment")[-1]
+    with open(segment, "a", encoding="utf-8") as f:
+        f.write('["draw_cards","MID","MI')
+    assert recovered_games(str(tmp_path)) == expected
+    assert os.path.getsize(segment) > 0
+
+
+class Hook:
+    # Stands in for every attachment recovery should leave alone
+    def __getattr__(self, name):
+        raise AssertionError(f"hook called during recovery: {name}")
+
+
+def test_recover_skips_bad_records_and_detaches_hooks(tmp_path):
+    manager = crashed_manager(str(tmp_path))
+    expected = {code: game_dict(manager.games.get(code)) for code in manager.games}
+    _, segment = _files(str(tmp_path), "segment")[-1]
+    with open(segment, "a", encoding="utf-8") as f:
+        f.write('["no_such_op","MID"]\n["play_card","NOPE","x","y","z"]\n')
+    recovering = GameManager()
+    hook = Hook()
+    recovering.engine = recovering.bots = recovering.metrics = recovering.analytics = hook
+    recover(recovering, str(tmp_path))
+    assert {code: game_dict(recovering.games.get(code)) for code in recovering.games} == expected
+    assert recovering.engine is hook and recovering.analytics is hook
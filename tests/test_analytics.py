@@ -0,0 +1,32 @@
+from backend.analytics import Aggregate, GameAnalytics
+from backend.game_manager import GameManager
+from backend.simulation import play_game
+
+
+class AttachLate(GameManager):
+    # Attaches analytics after a few rounds, as startup does after recover()
+    def __init__(self, analytics, after_round):
+        super().__init__()
+        self.late, self.after_round = analytics, after_round
+
+    def next_round(self, code):
+        super().next_round(code)
+        if self.get_game(code).round >= self.after_round:
+            self.analytics = self.late
+
+
+def test_games_picked_up_mid_play_are_recorded():
+    analytics = GameAnalytics(directory=None)
+    manager = AttachLate(analytics, after_round=5)
+    result = play_game(4, ["random"] * 4, manager=manager)
+    record = analytics.records.get_nowait()
+    assert record["rounds"] == result["rounds"]
+    assert record["winner"] == (-1 if result["winner"] is None else result["winner"])
+    assert all(round_no >= 3 for round_no, *_ in record["plays"])
+
+
+def test_summary_orders_table_sizes_numerically():
+    aggregate = Aggregate()
+    for players in (10, 2, 3):
+        aggregate.add({"players": players, "winner": 0, "rounds": 1, "plays": []})
+    assert list(aggregate.summary()["seat_win_rate"]) == ["2", "3", "10"]
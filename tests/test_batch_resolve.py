@@ -0,0 +1,16 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from backend.batch_resolve import compile_batch_effect, cross_check
+from backend.cards.definitions import CARD_DEFS
+
+
+@pytest.mark.parametrize("players", [2, 4, 5])
+def test_batch_matches_resolve_round(players):
+    assert cross_check(200, players, seed=players * 1000) == 0
+
+
+def test_unsupported_effect_kind_raises():
+    with pytest.raises(ValueError):
+        compile_batch_effect(CARD_DEFS[0]._replace(effect="teleport"))
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")  # cross_check deals its positions with batch_resolve
+
+from backend.batch_resolve import games_in_play
+from backend.bots import Table, choose_play, cross_check, search_input, state_from_game
+from backend.utils.helpers import get_next_player
+
+
+@pytest.mark.parametrize("players", [2, 4, 5])
+def test_rollout_matches_resolve_round(players):
+    assert cross_check(200, players, seed=players * 1000) == 0
+
+
+def test_table_round_trips_flat_state():
+    _, game = games_in_play(3, 4)
+    state = state_from_game(game)
+    assert Table(state, 4, random.Random(0)).state() == state
+
+
+def test_choose_play_picks_a_card_in_hand():
+    for seed in range(20):
+        pair = games_in_play(seed, 3)
+        if pair is None:
+            continue
+        _, game = pair
+        # Take back the last player's plays so there is a decision to make
+        last = next(reversed(game.played_cards))
+        for play in game.played_cards.pop(last):
+            game.player(last).hand.append(play["card"])
+        game.reindex()
+        game.phase = "play"
+        player = get_next_player(game)
+        if player is None:
+            continue
+        card_id, target, stats = choose_play(search_input(game, player.id), 0.001, seed)
+        assert card_id in {card.id for card in player.hand}
+        assert not game.players[target].eliminated
+        assert stats["passes"] >= 1
@@ -0,0 +1,37 @@
+import asyncio
+
+from backend.eviction import GameEvictor
+from backend.game_manager import GameManager
+from backend.models import Player
+
+
+def manager_with_games(spill_dir, games=10):
+    manager = GameManager()
+    manager.evictor = GameEvictor(manager, max_games=games // 2, spill_dir=spill_dir)
+    for i in range(games):
+        manager.create_game(f"G{i}", Player(id=f"G{i}_h", username="h"), seed=i)
+    return manager
+
+
+def test_lru_keeps_unfinished_games_without_a_spill_dir():
+    manager = manager_with_games(None)
+    for i in range(0, 10, 2):
+        manager.get_game(f"G{i}").phase = "end"
+    manager.evictor.sweep()
+    assert sorted(manager.games.games) == ["G1", "G3", "G5", "G7", "G9"]
+
+
+def test_lru_skips_locked_connected_and_polled_games(tmp_path):
+    manager = manager_with_games(str(tmp_path))
+    manager.evictor.connections = lambda code: int(code == "G1")
+    manager._changed["G2"] = asyncio.Event()  # a parked long-poll request
+
+    async def sweep_while_locked():
+        async with manager.lock("G0"):
+            manager.evictor.sweep()
+
+    asyncio.run(sweep_while_locked())
+    assert {"G0", "G1", "G2"} <= set(manager.games.games)
+    assert manager.games.resident() == 5
+    # Spilled games come back on lookup
+    assert manager.get_game("G3").code == "G3"
@@ -0,0 +1,35 @@
+import asyncio
+
+from backend.game_manager import GameManager
+from backend.matchmaking import Matchmaker
+
+
+def test_players_who_left_are_not_seated():
+    async def scenario():
+        manager = GameManager()
+        matchmaker = Matchmaker(manager, min_players=2, max_players=3, wait=0, clock=lambda: 0.0)
+        open_sockets = {"a": True, "b": False, "c": True}
+        tickets = [matchmaker.enqueue(name, lambda name=name: open_sockets[name]) for name in "abc"]
+        matchmaker.match(0.0)
+        a, b, c = tickets
+        assert b.matched.cancelled()
+        code, _ = a.matched.result()
+        assert c.matched.result()[0] == code
+        assert [p.username for p in manager.get_game(code).players] == ["a", "c"]
+        assert matchmaker.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_no_table_when_too_few_are_left():
+    async def scenario():
+        manager = GameManager()
+        matchmaker = Matchmaker(manager, min_players=2, max_players=3, wait=0, clock=lambda: 0.0)
+        a = matchmaker.enqueue("a", lambda: True)
+        matchmaker.enqueue("b", lambda: False)
+        assert matchmaker.match(0.0) is None
+        assert not a.matched.done()
+        assert matchmaker.waiting == 1
+        assert not manager.games
+
+    asyncio.run(scenario())
@@ -0,0 +1,31 @@
+from backend.simulation import HeadlessGameManager, play_game, simulate
+from backend.utils.helpers import PLAYS_PER_ROUND, can_play, get_next_player, seats_from_crown
+
+
+def reference_next_player(game):
+    # Turn order as spelled out in the rules, without the early exit
+    candidates = [p for p in seats_from_crown(game) if can_play(game, p)]
+    if not candidates:
+        return None
+    fewest = min(len(game.played_cards.get(p.id, [])) for p in candidates)
+    if fewest >= PLAYS_PER_ROUND:
+        return None
+    return next(p for p in candidates if len(game.played_cards.get(p.id, [])) == fewest)
+
+
+def test_results_do_not_depend_on_batching():
+    a = simulate(60, ["random", "aggressive", "random"], seed=3, workers=1, batch_size=60)
+    b = simulate(60, ["random", "aggressive", "random"], seed=3, workers=1, batch_size=7)
+    for key in ("seat_win_rate", "draw_rate", "rounds", "cards"):
+        assert a[key] == b[key]
+
+
+def test_next_player_matches_turn_order_rules():
+    class Checked(HeadlessGameManager):
+        def play_card(self, code, player_id, card_id, target_id):
+            game = self.get_game(code)
+            assert get_next_player(game) is reference_next_player(game)
+            super().play_card(code, player_id, card_id, target_id)
+
+    for seed in range(20):
+        play_game(seed, ["random"] * 4, manager=Checked())
@@ -0,0 +1,49 @@
+import json
+
+from backend.game_manager import GameManager
+from backend.models import dumps
+from backend.simulation import play_game
+from backend.views import player_view, redact_patch
+
+
+def wire(obj):
+    return json.loads(dumps(obj))
+
+
+def apply_delta(state, patch):
+    # Same as applyDelta in frontend/scripts/game.js
+    for key, value in patch.items():
+        if key not in ("type", "players"):
+            state[key] = value
+    for player_id, changes in patch.get("players", {}).items():
+        player = next((p for p in state["players"] if p["id"] == player_id), None)
+        if player is None:
+            state["players"].append(changes)
+        else:
+            player.update(changes)
+
+
+def test_patches_rebuild_every_snapshot():
+    manager = GameManager()
+    viewers = [None, "p0", "p2"]
+    clients = {}
+    checked = 0
+    commit = manager._commit
+
+    def checked_commit(game, record):
+        nonlocal checked
+        commit(game, record)
+        patch = manager.history[game.code][-1]
+        assert patch["version"] == game.version
+        for viewer in viewers:
+            if viewer not in clients:
+                clients[viewer] = wire(player_view(game, viewer))
+                continue
+            apply_delta(clients[viewer], wire(redact_patch(patch, viewer)))
+            assert clients[viewer] == wire(player_view(game, viewer))
+        checked += 1
+
+    manager._commit = checked_commit
+    play_game(21, ["random"] * 4, manager=manager)
+    assert manager.get_game("SIM").phase == "end"
+    assert checked > 20